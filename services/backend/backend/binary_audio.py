@@ -0,0 +1,29 @@
+"""Opt-in mode where audio travels as binary websocket frames instead of base64 JSON.
+
+The client enables it by offering the `BINARY_AUDIO_SUBPROTOCOL` subprotocol, which
+the server then selects instead of "realtime". Control events stay JSON text frames.
+Each binary frame starts with a one byte kind:
+    - `INPUT_AUDIO`, from the client: followed by Ogg/Opus bytes, like the `audio` of
+      `InputAudioBufferAppend`.
+    - `OUTPUT_AUDIO`, from the server: followed by the 16 bytes of the response id and
+      the Ogg/Opus bytes, like `ResponseAudioDelta`.
+
+Keep in sync with the frontend, see `src/utils/binaryAudio.ts`.
+"""
+
+import uuid
+
+BINARY_AUDIO_SUBPROTOCOL = "realtime.binary-audio"
+
+INPUT_AUDIO = 0x01
+OUTPUT_AUDIO = 0x02
+
+
+def decode_input_audio(frame: bytes) -> bytes:
+    if len(frame) < 2 or frame[0] != INPUT_AUDIO:
+        raise ValueError("Expected an input audio binary frame")
+    return frame[1:]
+
+
+def encode_output_audio(response_id: uuid.UUID, opus_bytes: bytes) -> bytes:
+    return bytes([OUTPUT_AUDIO]) + response_id.bytes + opus_bytes
@@ -24,15 +24,24 @@ TTS_IS_GRADIUM = is_env_true("TTS_IS_GRADIUM")
 TTS_SERVER = os.environ["TTS_SERVER"]
 
 KYUTAI_API_KEY = os.environ.get("KYUTAI_API_KEY")
+# E.g. a local stand-in of the Gradium API, for tests and benchmarks.
+GRADIUM_BASE_URL = os.getenv("GRADIUM_BASE_URL", "https://eu.api.gradium.ai/api/")
+# Connections kept open to the TTS server and to the Gradium API, shared by all the
+# requests of the process. See backend/libs/http_clients.py
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_KEEPALIVE_SEC = float(os.getenv("HTTP_KEEPALIVE_SEC", "30"))
 
 LLM_API_KEY = os.environ["KYUTAI_LLM_API_KEY"]
 LLM_URL = os.environ["KYUTAI_LLM_URL"]
 LLM_MODEL = os.environ["KYUTAI_LLM_MODEL"]
-# If None, a dict-based cache will be used instead of Redis
 
 # Redis Configuration for Locking
-REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
+# If unset, the locks are kept in memory, which only works with a single backend
+# process. See backend/libs/redis_lock.py
+REDIS_HOST = os.getenv("REDIS_HOST")
 REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
+# Connections shared by all the Redis locks of the process.
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
 TTS_LOCK_TTL_SECONDS = int(os.getenv("TTS_LOCK_TTL_SECONDS", "30"))
 STT_LOCK_TTL_SECONDS = int(os.getenv("STT_LOCK_TTL_SECONDS", "600"))
 
@@ -45,11 +54,58 @@ SAMPLES_PER_FRAME = 1920
 FRAME_TIME_SEC = SAMPLES_PER_FRAME / SAMPLE_RATE  # 0.08
 # TODO: make it so that we can read this from the ASR server?
 STT_DELAY_SEC = 2
+# A session is lagging when the STT is this many seconds behind the audio we sent.
+STT_LAG_ALARM_SEC = float(os.getenv("STT_LAG_ALARM_SEC", "1.0"))
+# The health check reports the STT as down, so that new sessions are refused, when
+# more than this fraction of the sessions are lagging.
+STT_LAG_MAX_LAGGING_FRACTION = float(os.getenv("STT_LAG_MAX_LAGGING_FRACTION", "0.5"))
+# See backend/stt/pause_detection.py, e.g. "server_vad" or "server_vad+energy"
+PAUSE_DETECTOR = os.environ.get("PAUSE_DETECTOR", "server_vad")
+# If set, the pause detection inputs of every session are saved there, to be replayed
+# by backend/stt/pause_detection_eval.py
+PAUSE_TIMELINES_DIR = os.environ.get("PAUSE_TIMELINES_DIR")
+# How long a session is kept after its websocket disconnected, waiting for the client
+# to resume it. 0 disables resuming.
+SESSION_RESUME_GRACE_SEC = float(os.getenv("SESSION_RESUME_GRACE_SEC", "20"))
+# The events buffered for a detached session, it is closed if there are more.
+SESSION_RESUME_MAX_BACKLOG = int(os.getenv("SESSION_RESUME_MAX_BACKLOG", "500"))
+# Synchronous work blocking the event loop longer than this is reported, and its stack
+# logged if LOG_SLOW_CALLBACK_STACKS is set. See backend/libs/loop_monitor.py
+SLOW_CALLBACK_SEC = float(os.getenv("SLOW_CALLBACK_SEC", "0.1"))
+LOG_SLOW_CALLBACK_STACKS = is_value_true(
+    os.environ.get("LOG_SLOW_CALLBACK_STACKS", "false"), "LOG_SLOW_CALLBACK_STACKS"
+)
+# Exposes /v1/debug/tasks, without authentication: the task names include the emails
+# of the users. Only for debugging, never in production.
+DEBUG_TASKS_ROUTE = is_value_true(
+    os.environ.get("DEBUG_TASKS_ROUTE", "false"), "DEBUG_TASKS_ROUTE"
+)
 
 USERS_DATA_DIR = AnyPath(os.environ["KYUTAI_USERS_DATA_PATH"])
 
 USERS_AUDIO_DIR = USERS_DATA_DIR / "user_audio"
 USERS_AUDIO_DIR.mkdir(parents=True, exist_ok=True)
+# Synthesized audio is cached there, see backend/libs/tts_cache.py. 0 disables it.
+TTS_CACHE_DIR = USERS_AUDIO_DIR / "tts_cache"
+TTS_CACHE_MAX_MB = float(os.getenv("TTS_CACHE_MAX_MB", "1024"))
+TTS_CACHE_MAX_MB_PER_USER = float(os.getenv("TTS_CACHE_MAX_MB_PER_USER", "128"))
+# The small entries are also kept in memory, up to this size in total.
+TTS_CACHE_HOT_MAX_MB = float(os.getenv("TTS_CACHE_HOT_MAX_MB", "32"))
+# Longer texts are synthesized in chunks, see backend/tts/chunking.py
+TTS_FIRST_CHUNK_MAX_CHARS = int(os.getenv("TTS_FIRST_CHUNK_MAX_CHARS", "80"))
+TTS_CHUNK_MAX_CHARS = int(os.getenv("TTS_CHUNK_MAX_CHARS", "250"))
+# Synthesize the next chunk of a text while the current one streams. Off by default,
+# since it is a second request to the provider under the per-user TTS lock, counted
+# against the concurrency quota of the provider.
+TTS_PREFETCH_NEXT_CHUNK = is_value_true(
+    os.getenv("TTS_PREFETCH_NEXT_CHUNK", "false"), "TTS_PREFETCH_NEXT_CHUNK"
+)
+# Synthesize this many suggested answers of each generation before the user picks one,
+# see backend/tts/speculation.py. 0 disables it. They don't take the per-user TTS lock.
+TTS_SPECULATION_TOP_N = int(os.getenv("TTS_SPECULATION_TOP_N", "0"))
+TTS_SPECULATION_MAX_PER_SESSION = int(os.getenv("TTS_SPECULATION_MAX_PER_SESSION", "2"))
+TTS_SPECULATION_MAX_GLOBAL = int(os.getenv("TTS_SPECULATION_MAX_GLOBAL", "32"))
+TTS_SPECULATION_TTL_SEC = float(os.getenv("TTS_SPECULATION_TTL_SEC", "60"))
 
 USERS_SETTINGS_AND_HISTORY_DIR = USERS_DATA_DIR / "user_settings_and_history"
 USERS_SETTINGS_AND_HISTORY_DIR.mkdir(parents=True, exist_ok=True)
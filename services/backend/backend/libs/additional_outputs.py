@@ -0,0 +1,105 @@
+"""The debug state sent to the clients about once per second, as additional outputs.
+
+Sending everything every time costs more and more as the conversation grows, so most
+updates only carry what changed since the previous one. A full snapshot is sent
+regularly, so that a client that missed an update gets back in sync.
+"""
+
+import copy
+from collections.abc import Sequence
+from typing import Any
+
+from pydantic import BaseModel
+
+from backend.libs.debug_telemetry import DebugPlotBuffer
+
+# About 30s between snapshots, with one update per second of audio.
+SNAPSHOT_EVERY_N_UPDATES = 30
+
+
+class GradioUpdate(BaseModel):
+    # When False, only the changes since the previous update are included.
+    snapshot: bool = True
+    # The messages before this index didn't change, `chat_history` replaces the rest.
+    chat_history_start: int = 0
+    chat_history: list[dict[str, str]]
+    # Top-level keys, replacing the previous values.
+    debug_dict: dict[str, Any]
+    removed_debug_keys: list[str] = []
+    debug_plot_data: list[dict]
+
+
+class AdditionalOutputsTracker:
+    def __init__(self, snapshot_every_n_updates: int = SNAPSHOT_EVERY_N_UPDATES):
+        """Remembers what was sent to a client, to only send the changes next time."""
+        self.snapshot_every_n_updates = snapshot_every_n_updates
+        self.n_updates = 0
+        self.n_sent_messages = 0
+        self.last_sent_message: dict | None = None
+        self.sent_debug_dict: dict[str, Any] = {}
+        self.last_plot_time: float | None = None
+
+    def make_update(
+        self,
+        messages: Sequence[BaseModel],
+        debug_dict: dict[str, Any],
+        debug_plot_data: DebugPlotBuffer | None,
+    ) -> GradioUpdate:
+        """Build the next update.
+
+        Args:
+            messages: The conversation. Only its last message can change, apart from
+                new messages being appended.
+            debug_dict: Nested values can be modified in place between updates.
+            debug_plot_data: Only for the sessions that record it.
+        """
+        snapshot = self.n_updates % self.snapshot_every_n_updates == 0
+        self.n_updates += 1
+
+        if snapshot or len(messages) < self.n_sent_messages:
+            start = 0
+        else:
+            # The last message we sent may have grown since.
+            start = max(0, self.n_sent_messages - 1)
+        chat_history = [m.model_dump(mode="json") for m in messages[start:]]
+        if (
+            not snapshot
+            and start == self.n_sent_messages - 1
+            and chat_history
+            and chat_history[0] == self.last_sent_message
+        ):
+            chat_history = chat_history[1:]
+            start += 1
+        self.n_sent_messages = len(messages)
+        if chat_history:
+            self.last_sent_message = chat_history[-1]
+
+        if snapshot:
+            changed_debug = dict(debug_dict)
+            removed_debug_keys = []
+        else:
+            changed_debug = {
+                key: value
+                for key, value in debug_dict.items()
+                if key not in self.sent_debug_dict or self.sent_debug_dict[key] != value
+            }
+            removed_debug_keys = [
+                k for k in self.sent_debug_dict if k not in debug_dict
+            ]
+        self.sent_debug_dict = copy.deepcopy(debug_dict)
+
+        plot_records = []
+        if debug_plot_data is not None:
+            since = None if snapshot else self.last_plot_time
+            plot_records = debug_plot_data.to_records(since=since)
+            if plot_records:
+                self.last_plot_time = plot_records[-1]["t"]
+
+        return GradioUpdate(
+            snapshot=snapshot,
+            chat_history_start=start,
+            chat_history=chat_history,
+            debug_dict=changed_debug,
+            removed_debug_keys=removed_debug_keys,
+            debug_plot_data=plot_records,
+        )
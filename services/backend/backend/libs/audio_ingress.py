@@ -0,0 +1,92 @@
+"""Decoding of the Opus audio sent by the clients.
+
+A 20ms packet takes tens of microseconds to decode, less than a round trip through the
+default executor, so we decode those inline on the event loop. Only unusually large
+payloads, e.g. a backlog of pages flushed by the client, go to a dedicated thread pool
+that is bounded so that a burst can't queue unlimited work.
+"""
+
+import asyncio
+import base64
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import sphn
+
+from backend import metrics as mt
+
+# Above this size, the payload holds many packets and is decoded in the pool.
+INLINE_DECODE_MAX_BYTES = 4096
+DECODER_POOL_THREADS = 4
+# Decode jobs that can be submitted to the pool at once, across all sessions. When
+# reached, the receive loops wait, which applies backpressure to the clients.
+DECODER_POOL_MAX_PENDING = 4 * DECODER_POOL_THREADS
+
+_AUDIO_APPEND_TYPE = "input_audio_buffer.append"
+# The flag of the header type of the first page of an Ogg stream.
+_OGG_BEGINNING_OF_STREAM = 0x02
+
+_decoder_pool = ThreadPoolExecutor(
+    max_workers=DECODER_POOL_THREADS, thread_name_prefix="opus_decoder"
+)
+_decoder_pool_slots = asyncio.Semaphore(DECODER_POOL_MAX_PENDING)
+
+
+class OpusDecoder:
+    def __init__(self, sample_rate: int):
+        """Decodes an Ogg/Opus stream to PCM, one instance per session."""
+        self.reader = sphn.OpusStreamReader(sample_rate)
+
+    def _decode_timed(self, opus_bytes: bytes, submit_time: float) -> np.ndarray:
+        start = time.perf_counter()
+        mt.OPUS_DECODE_QUEUE_WAIT.observe(start - submit_time)
+        pcm = self.reader.append_bytes(opus_bytes)
+        mt.OPUS_DECODE_TIME.observe(time.perf_counter() - start)
+        return pcm
+
+    async def decode(self, opus_bytes: bytes) -> np.ndarray:
+        if len(opus_bytes) <= INLINE_DECODE_MAX_BYTES:
+            start = time.perf_counter()
+            pcm = self.reader.append_bytes(opus_bytes)
+            mt.OPUS_DECODE_TIME.observe(time.perf_counter() - start)
+            return pcm
+
+        mt.OPUS_DECODE_OFFLOADED.inc()
+        async with _decoder_pool_slots:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                _decoder_pool, self._decode_timed, opus_bytes, time.perf_counter()
+            )
+
+
+def parse_audio_append(text: str) -> bytes | None:
+    """Opus bytes of an `input_audio_buffer.append` event, None for any other message.
+
+    Audio events arrive 50 times per second per session, and building a pydantic model
+    for each of them, with a fresh event id, costs more than the JSON parsing. Anything
+    this doesn't recognize goes through the full validation, including invalid input.
+    """
+    if _AUDIO_APPEND_TYPE not in text:
+        return None
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return None
+    if not isinstance(data, dict) or data.get("type") != _AUDIO_APPEND_TYPE:
+        return None
+    audio = data.get("audio")
+    if not isinstance(audio, str):
+        return None
+    return base64.b64decode(audio)
+
+
+def starts_ogg_stream(opus_bytes: bytes) -> bool:
+    """Whether the audio starts with the first page of an Ogg stream.
+
+    Raises a ValueError if it doesn't start with an Ogg page, e.g. a truncated frame.
+    """
+    if len(opus_bytes) <= 5 or not opus_bytes.startswith(b"OggS"):
+        raise ValueError("Expected Ogg/Opus audio")
+    return bool(opus_bytes[5] & _OGG_BEGINNING_OF_STREAM)
@@ -0,0 +1,73 @@
+"""Per-frame debug telemetry of a session, for plotting the audio level and the VAD.
+
+Only kept for the sessions that ask for it, in fixed-size arrays so that long sessions
+don't grow their memory.
+"""
+
+import numpy as np
+
+# The clients send 20ms of audio per message.
+FRAME_SEC = 0.02
+
+
+def rms_amplitude(audio: np.ndarray) -> float:
+    """RMS of float audio, without allocating a squared copy."""
+    if audio.size == 0:
+        return 0.0
+    return float(np.sqrt(np.dot(audio, audio) / audio.size))
+
+
+class DebugPlotBuffer:
+    def __init__(self, history_sec: float, frame_sec: float = FRAME_SEC):
+        """The last `history_sec` seconds of telemetry, one entry per audio frame.
+
+        Args:
+            history_sec: Entries older than this, relative to the latest one, are
+                dropped.
+            frame_sec: Expected duration of a frame, to size the buffer. With shorter
+                frames, less than `history_sec` is kept.
+        """
+        self.history_sec = history_sec
+        self.capacity = max(1, int(np.ceil(history_sec / frame_sec)))
+        self.t = np.zeros(self.capacity, dtype=np.float64)
+        self.amplitude = np.zeros(self.capacity, dtype=np.float32)
+        self.pause_prediction = np.zeros(self.capacity, dtype=np.float32)
+        self.total_written = 0
+
+    def __len__(self) -> int:
+        return min(self.total_written, self.capacity)
+
+    def append(self, t: float, amplitude: float, pause_prediction: float) -> None:
+        pos = self.total_written % self.capacity
+        self.t[pos] = t
+        self.amplitude[pos] = amplitude
+        self.pause_prediction[pos] = pause_prediction
+        self.total_written += 1
+
+    def _ordered(self, values: np.ndarray) -> np.ndarray:
+        if self.total_written <= self.capacity:
+            return values[: self.total_written]
+        pos = self.total_written % self.capacity
+        return np.concatenate([values[pos:], values[:pos]])
+
+    def to_records(self, since: float | None = None) -> list[dict]:
+        """Entries of the last `history_sec` seconds, oldest first.
+
+        Args:
+            since: Only return the entries more recent than this time.
+        """
+        if self.total_written == 0:
+            return []
+        t = self._ordered(self.t)
+        keep = t >= t[-1] - self.history_sec
+        if since is not None:
+            keep &= t > since
+        return [
+            {"t": t_i, "amplitude": amplitude, "pause_prediction": pause_prediction}
+            for t_i, amplitude, pause_prediction in zip(
+                t[keep].tolist(),
+                self._ordered(self.amplitude)[keep].tolist(),
+                self._ordered(self.pause_prediction)[keep].tolist(),
+                strict=True,
+            )
+        ]
@@ -1,8 +1,11 @@
+from backend.kyutai_constants import STT_LAG_MAX_LAGGING_FRACTION
+from backend.stt.stt_lag import lagging_sessions_fraction
 from backend.typing import HealthStatus
 
 
 async def get_health():
     return HealthStatus(
-        stt_up=True,
+        # Refuse new sessions while the STT can't keep up with the current ones.
+        stt_up=lagging_sessions_fraction() <= STT_LAG_MAX_LAGGING_FRACTION,
         llm_up=True,
     )
@@ -0,0 +1,136 @@
+"""HTTP clients shared by the whole process, so that requests reuse connections.
+
+Creating a client per request meant paying DNS, TCP and TLS setup every time. The
+clients are created on first use, or in the app lifespan, and closed at shutdown.
+Connection reuse is measured with the `worker_http_client_*` metrics: the reuse rate
+is 1 - new connections / requests.
+"""
+
+import urllib.parse
+
+import aiohttp
+import gradium
+import httpx
+
+from backend import metrics as mt
+
+_httpx_client: httpx.AsyncClient | None = None
+_aiohttp_session: aiohttp.ClientSession | None = None
+
+
+class PooledGradiumClient(gradium.GradiumClient):
+    """A Gradium client whose HTTP requests share a connection pool.
+
+    The SDK opens a new aiohttp session, so a new connection, for every request.
+    Only the HTTP requests are changed, e.g. for the voices. The TTS streams are
+    websockets, which can't be reused anyway.
+    """
+
+    def __init__(
+        self, session: aiohttp.ClientSession, base_url: str, api_key: str | None = None
+    ):
+        super().__init__(base_url=base_url, api_key=api_key)
+        self._session = session
+
+    async def _fetch(self, method: str, route, parse_response: bool = True, **kwargs):
+        # Same as the SDK, with our session.
+        url = urllib.parse.urljoin(self._base_url, route)
+        response = await self._session.request(
+            method, url, headers=self.headers, **kwargs
+        )
+        if not response.ok:
+            async with response:
+                msg = await response.json()
+                if (reason := msg.get("detail")) is not None:
+                    response.reason = reason
+                response.raise_for_status()
+        if not parse_response:
+            return response
+        async with response:
+            return await response.json()
+
+
+def get_httpx_client(max_connections: int, keepalive_sec: float) -> httpx.AsyncClient:
+    """The client for the Kyutai TTS server.
+
+    Args:
+        max_connections: Size of the pool, only used when creating the client.
+        keepalive_sec: Idle connections are closed after this long.
+    """
+    global _httpx_client
+    if _httpx_client is None or _httpx_client.is_closed:
+
+        async def count_new_connections(event_name: str, info: dict):
+            if event_name == "connection.connect_tcp.complete":
+                mt.HTTP_CLIENT_NEW_CONNECTIONS.labels(client="httpx").inc()
+
+        async def trace_request(request: httpx.Request):
+            mt.HTTP_CLIENT_REQUESTS.labels(client="httpx").inc()
+            request.extensions["trace"] = count_new_connections
+
+        _httpx_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=keepalive_sec,
+            ),
+            # The default 5s is too short for a long synthesis.
+            timeout=httpx.Timeout(60.0, connect=5.0),
+            event_hooks={"request": [trace_request]},
+        )
+    return _httpx_client
+
+
+def get_aiohttp_session(
+    max_connections: int, keepalive_sec: float
+) -> aiohttp.ClientSession:
+    """The session for the Gradium API.
+
+    Args:
+        max_connections: Size of the pool, only used when creating the session.
+        keepalive_sec: Idle connections are closed after this long.
+    """
+    global _aiohttp_session
+    if _aiohttp_session is None or _aiohttp_session.closed:
+
+        async def on_request_start(session, context, params):
+            mt.HTTP_CLIENT_REQUESTS.labels(client="gradium").inc()
+
+        async def on_connection_create_end(session, context, params):
+            mt.HTTP_CLIENT_NEW_CONNECTIONS.labels(client="gradium").inc()
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        _aiohttp_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=max_connections, keepalive_timeout=keepalive_sec
+            ),
+            trace_configs=[trace_config],
+        )
+    return _aiohttp_session
+
+
+def get_gradium_client(
+    base_url: str, max_connections: int, keepalive_sec: float
+) -> PooledGradiumClient:
+    """A Gradium client on the shared aiohttp session.
+
+    Args:
+        base_url: Of the Gradium API, e.g. to use a local stand-in.
+        max_connections: Size of the pool, only used when creating the session.
+        keepalive_sec: Idle connections are closed after this long.
+    """
+    session = get_aiohttp_session(max_connections, keepalive_sec)
+    return PooledGradiumClient(session, base_url)
+
+
+async def close_http_clients():
+    """Close the shared clients, when the app shuts down."""
+    global _httpx_client, _aiohttp_session
+    if _httpx_client is not None:
+        await _httpx_client.aclose()
+        _httpx_client = None
+    if _aiohttp_session is not None:
+        await _aiohttp_session.close()
+        _aiohttp_session = None
@@ -0,0 +1,142 @@
+"""Detect when the event loop is blocked, and by what.
+
+All the sessions share one event loop, so any synchronous work that takes long, like
+saving the user data or decoding a large message, delays all of them. A sampler task
+measures how late the loop wakes it up. A watchdog thread notices when the loop hasn't
+woken the sampler for too long, and looks at the stack of the loop thread to find the
+coroutine or callback that is blocking it.
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from types import FrameType
+
+from backend import metrics as mt
+
+logger = logging.getLogger(__name__)
+
+LOOP_LAG_SAMPLE_INTERVAL_SEC = 0.05
+
+# Frames of these packages are skipped to find what runs inside the loop.
+_LOOP_MACHINERY = {
+    "anyio",
+    "asyncio",
+    "fastapi",
+    "prometheus_fastapi_instrumentator",
+    "starlette",
+    "uvicorn",
+    "uvloop",
+}
+
+
+def _package(frame: FrameType) -> str:
+    return frame.f_globals.get("__name__", "").partition(".")[0]
+
+
+def blocking_frame(frame: FrameType) -> FrameType:
+    """The outermost frame of the application code the loop is running.
+
+    That's the first frame under `asyncio.run()` that isn't part of asyncio or of the
+    web framework, e.g. the coroutine of a task or the route handling a request.
+
+    Args:
+        frame: The current frame of the loop thread.
+    """
+    frames = []
+    current: FrameType | None = frame
+    while current is not None:
+        frames.append(current)
+        current = current.f_back
+
+    in_loop = False
+    for f in reversed(frames):
+        package = _package(f)
+        in_loop = in_loop or package == "asyncio"
+        if in_loop and package not in _LOOP_MACHINERY:
+            return f
+    return frame
+
+
+def frame_name(frame: FrameType) -> str:
+    return f"{frame.f_globals.get('__name__', '?')}.{frame.f_code.co_qualname}"
+
+
+class LoopMonitor:
+    def __init__(
+        self,
+        slow_callback_sec: float,
+        log_stacks: bool = False,
+        sample_interval_sec: float = LOOP_LAG_SAMPLE_INTERVAL_SEC,
+    ):
+        """Measure the lag of the event loop it is started in.
+
+        Args:
+            slow_callback_sec: A callback blocking the loop longer than this is
+                reported.
+            log_stacks: Also log the stack of the loop thread for every slow callback.
+            sample_interval_sec: How often the sampler task wakes up.
+        """
+        self.slow_callback_sec = slow_callback_sec
+        self.log_stacks = log_stacks
+        self.sample_interval_sec = sample_interval_sec
+        # How many times each callback was caught blocking the loop.
+        self.slow_callbacks: Counter[str] = Counter()
+        self._last_tick = time.monotonic()
+        # What the watchdog found blocking the loop since the last tick.
+        self._blocking: str | None = None
+        self._stopped = threading.Event()
+
+    async def run(self):
+        """Sample the loop lag until cancelled, with the watchdog in a thread."""
+        self._last_tick = time.monotonic()
+        self._stopped.clear()
+        watchdog = threading.Thread(
+            target=self._watchdog,
+            args=(threading.get_ident(),),
+            name="loop_monitor_watchdog",
+            daemon=True,
+        )
+        watchdog.start()
+        try:
+            while True:
+                expected = time.monotonic() + self.sample_interval_sec
+                await asyncio.sleep(self.sample_interval_sec)
+                self._tick(time.monotonic() - expected)
+        finally:
+            self._stopped.set()
+
+    def _tick(self, lag: float):
+        self._last_tick = time.monotonic()
+        mt.EVENT_LOOP_LAG.observe(max(0.0, lag))
+        if self._blocking is not None:
+            logger.warning(f"Event loop blocked for {lag:.3f}s by {self._blocking}")
+            self._blocking = None
+
+    def _watchdog(self, loop_thread_id: int):
+        check_interval = self.slow_callback_sec / 2
+        reported_tick = None
+        while not self._stopped.wait(check_interval):
+            last_tick = self._last_tick
+            stalled = time.monotonic() - last_tick - self.sample_interval_sec
+            if stalled < self.slow_callback_sec or reported_tick == last_tick:
+                continue
+            frame = sys._current_frames().get(loop_thread_id)
+            if frame is None:
+                continue
+            reported_tick = last_tick
+            self._report(frame)
+
+    def _report(self, frame: FrameType):
+        name = frame_name(blocking_frame(frame))
+        self.slow_callbacks[name] += 1
+        mt.SLOW_CALLBACKS.labels(callback=name).inc()
+        where = f"{frame.f_code.co_filename}:{frame.f_lineno}"
+        self._blocking = f"{name}, in {frame_name(frame)} at {where}"
+        if self.log_stacks:
+            stack = "".join(traceback.format_stack(frame))
+            logger.warning(f"Event loop blocked by {name}, stack:\n{stack}")
@@ -1,33 +1,112 @@
 import asyncio
+import contextlib
 import logging
+import secrets
+import time
 from contextlib import asynccontextmanager
 
 import redis.asyncio as aioredis
 from fastapi import HTTPException, status
 
+from backend import metrics as mt
+
 logger = logging.getLogger(__name__)
 
+# Waiters are woken up by a message with the lock key on this channel.
+LOCK_RELEASED_CHANNEL = "lock_released"
+# Locks can also be freed without a message, when their TTL expires, and pub/sub
+# messages can be lost, e.g. on a reconnection. Waiters retry at least this often.
+LOCK_RETRY_INTERVAL_SEC = 1.0
+
+# Only delete or extend the lock if it is still ours: after its TTL expired, someone
+# else may have acquired it.
+RELEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    redis.call("del", KEYS[1])
+    redis.call("publish", ARGV[2], KEYS[1])
+    return 1
+end
+return 0
+"""
+RENEW_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("pexpire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_clients: dict[tuple[str, int], aioredis.Redis] = {}
+
+
+def get_redis_client(host: str, port: int, max_connections: int) -> aioredis.Redis:
+    """The Redis client of this process for a server, shared by all the lock managers.
+
+    Requests wait for a free connection of the pool rather than opening more.
+
+    Args:
+        host: Host of the Redis server.
+        port: Port of the Redis server.
+        max_connections: Size of the pool, only used by the first call for a server.
+    """
+    if (host, port) not in _clients:
+        pool = aioredis.BlockingConnectionPool(
+            host=host, port=port, max_connections=max_connections
+        )
+        _clients[host, port] = aioredis.Redis(connection_pool=pool)
+    return _clients[host, port]
+
+
+async def close_redis_clients():
+    """Close the connections of the shared clients, when the app shuts down.
+
+    The clients stay usable, they reconnect when needed.
+    """
+    for client in _clients.values():
+        await client.aclose(close_connection_pool=True)
+
+
+def _lock_timeout(lock_key: str, lock_name: str, start: float) -> HTTPException:
+    mt.LOCK_WAIT_TIME.labels(lock=lock_name).observe(time.monotonic() - start)
+    mt.LOCK_TIMEOUTS.labels(lock=lock_name).inc()
+    logger.warning(
+        f"Could not acquire {lock_key} after {time.monotonic() - start:.1f}s"
+    )
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail=f"Another {lock_name.upper()} operation is currently in progress. Please wait.",
+    )
+
 
 class RedisLockManager:
-    """Manages Redis locks for TTS calls on a per-user basis."""
+    """Manages Redis locks for TTS and STT calls on a per-user basis."""
 
-    def __init__(self, host: str, port: int, lock_ttl_seconds: int = 300):
-        self.host = host
-        self.port = port
-        self.lock_ttl_seconds = lock_ttl_seconds
-        self._client: aioredis.Redis | None = None
+    def __init__(
+        self,
+        client: aioredis.Redis,
+        lock_ttl_seconds: float = 300,
+        acquire_timeout_sec: float = 10.0,
+    ):
+        """Per-user locks, renewed while held so that they outlive their TTL.
 
-    async def get_client(self) -> aioredis.Redis:
-        """Get or create the Redis client."""
-        if self._client is None:
-            self._client = await aioredis.from_url(f"redis://{self.host}:{self.port}")
-        return self._client
+        Args:
+            client: Usually the shared client from `get_redis_client()`.
+            lock_ttl_seconds: A lock that isn't renewed, e.g. because its holder
+                crashed, expires after this long.
+            acquire_timeout_sec: How long to wait for a lock held by someone else.
+        """
+        self.client = client
+        self.lock_ttl_seconds = lock_ttl_seconds
+        self.acquire_timeout_sec = acquire_timeout_sec
+        self._release_script = self.client.register_script(RELEASE_SCRIPT)
+        self._renew_script = self.client.register_script(RENEW_SCRIPT)
+        # The waiters of this process, by lock key.
+        self._waiters: dict[str, set[asyncio.Event]] = {}
+        self._listener: asyncio.Task | None = None
+        self._subscribed = asyncio.Event()
 
-    async def close(self):
-        """Close the Redis connection."""
-        if self._client:
-            await self._client.close()
-            self._client = None
+    @property
+    def _ttl_ms(self) -> int:
+        return int(self.lock_ttl_seconds * 1000)
 
     @asynccontextmanager
     async def acquire_lock(self, user_id: str, lock_name: str):
@@ -36,41 +115,186 @@ class RedisLockManager:
         The lock is released when the context manager exits.
         """
         lock_key = f"{lock_name}:lock:{user_id}"
-        client = await self.get_client()
-
-        # Try to acquire the lock with exponential backoff
-        max_retries = 7
-        base_delay = 0.1  # 100ms
-        max_delay = 4.0  # 4 seconds
+        # Identifies this holder, so that we never release someone else's lock.
+        token = secrets.token_hex(16)
+        await self._wait_for_lock(lock_key, token, lock_name)
+        logger.info(f"Acquired {lock_name} lock for user {user_id}")
 
-        for attempt in range(max_retries):
-            acquired = await client.set(
-                lock_key, "1", nx=True, ex=self.lock_ttl_seconds
-            )
+        renewal = asyncio.create_task(
+            self._renew_lock(lock_key, token, lock_name),
+            name=f"renew_lock({lock_name})",
+        )
+        try:
+            yield
+        finally:
+            renewal.cancel()
+            try:
+                released = await self._release_script(
+                    keys=[lock_key], args=[token, LOCK_RELEASED_CHANNEL]
+                )
+            except aioredis.RedisError as e:
+                # It expires on its own after its TTL.
+                logger.warning(f"Could not release {lock_name} lock: {e!r}")
+            else:
+                if released:
+                    logger.info(f"Released {lock_name} lock for user {user_id}")
+                else:
+                    mt.LOCK_LOST.labels(lock=lock_name).inc()
+                    logger.warning(
+                        f"The {lock_name} lock of user {user_id} expired while held"
+                    )
 
-            if acquired:
-                try:
-                    logger.info(f"Acquired {lock_name} lock for user {user_id}")
-                    yield
+    async def _wait_for_lock(self, lock_key: str, token: str, lock_name: str):
+        start = time.monotonic()
+        deadline = start + self.acquire_timeout_sec
+        released = asyncio.Event()
+        # Registered before trying, so that a release right after a failed attempt
+        # isn't missed.
+        self._waiters.setdefault(lock_key, set()).add(released)
+        try:
+            await self._listen_for_releases()
+            attempt = 0
+            while True:
+                released.clear()
+                acquired = await self.client.set(
+                    lock_key, token, nx=True, px=self._ttl_ms
+                )
+                if acquired:
+                    mt.LOCK_WAIT_TIME.labels(lock=lock_name).observe(
+                        time.monotonic() - start
+                    )
                     return
-                finally:
-                    # Release the lock
-                    await client.delete(lock_key)
-                    logger.info(f"Released {lock_name} lock for user {user_id}")
+                if attempt == 0:
+                    mt.LOCK_CONTENDED.labels(lock=lock_name).inc()
+                attempt += 1
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                logger.debug(f"Waiting for {lock_key}, attempt {attempt}")
+                with contextlib.suppress(TimeoutError):
+                    await asyncio.wait_for(
+                        released.wait(), min(remaining, LOCK_RETRY_INTERVAL_SEC)
+                    )
+        finally:
+            waiters = self._waiters[lock_key]
+            waiters.discard(released)
+            if not waiters:
+                del self._waiters[lock_key]
+
+        raise _lock_timeout(lock_key, lock_name, start)
+
+    async def _listen_for_releases(self):
+        """Start listening for released locks if needed, and wait until subscribed.
 
-            # Lock not acquired, wait and retry with exponential backoff
-            delay = min(base_delay * (2**attempt), max_delay)
-            logger.debug(
-                f"Failed to acquire {lock_name} lock for user {user_id}, "
-                f"attempt {attempt + 1}/{max_retries}, retrying in {delay:.2f}s"
+        If Redis is unreachable, waiters still retry every LOCK_RETRY_INTERVAL_SEC.
+        """
+        listener = self._listener
+        if (
+            listener is None
+            or listener.done()
+            or listener.get_loop() is not asyncio.get_running_loop()
+        ):
+            self._subscribed = asyncio.Event()
+            self._listener = asyncio.create_task(
+                self._dispatch_releases(), name="RedisLockManager._dispatch_releases()"
             )
-            await asyncio.sleep(delay)
+        with contextlib.suppress(TimeoutError):
+            await asyncio.wait_for(self._subscribed.wait(), LOCK_RETRY_INTERVAL_SEC)
 
-        # Max retries reached - lock is still held
-        logger.warning(
-            f"Could not acquire {lock_name} lock for user {user_id} after {max_retries} attempts"
-        )
-        raise HTTPException(
-            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-            detail=f"Another {lock_name.upper()} operation is currently in progress. Please wait.",
-        )
+    async def _dispatch_releases(self):
+        """Wake up the waiters of this process when a lock is released.
+
+        A single subscription for all the locks, rather than a connection per waiter.
+        """
+        try:
+            async with self.client.pubsub() as pubsub:
+                await pubsub.subscribe(LOCK_RELEASED_CHANNEL)
+                self._subscribed.set()
+                async for message in pubsub.listen():
+                    if message["type"] != "message":
+                        continue
+                    for released in self._waiters.get(message["data"].decode(), ()):
+                        released.set()
+        except aioredis.RedisError as e:
+            logger.warning(f"Stopped listening for released locks: {e!r}")
+        finally:
+            self._subscribed.clear()
+
+    async def _renew_lock(self, lock_key: str, token: str, lock_name: str):
+        """Extend the TTL of a held lock until cancelled, e.g. for long STT sessions."""
+        while True:
+            await asyncio.sleep(self.lock_ttl_seconds / 3)
+            try:
+                renewed = await self._renew_script(
+                    keys=[lock_key], args=[token, self._ttl_ms]
+                )
+            except aioredis.RedisError as e:
+                # Retried at the next renewal, the TTL leaves time for two more.
+                logger.warning(f"Could not renew {lock_key}: {e!r}")
+                continue
+            if not renewed:
+                mt.LOCK_LOST.labels(lock=lock_name).inc()
+                logger.warning(f"Lost {lock_key}, it expired before being renewed")
+                return
+
+
+class InMemoryLockManager:
+    """The same locks as `RedisLockManager`, for a single backend process.
+
+    No network round trip and no Redis to run, but the locks aren't shared with other
+    processes. They have no TTL, since they can't outlive the process holding them.
+    """
+
+    def __init__(self, acquire_timeout_sec: float = 10.0):
+        """Per-user locks of this process.
+
+        Args:
+            acquire_timeout_sec: How long to wait for a lock held by someone else.
+        """
+        self.acquire_timeout_sec = acquire_timeout_sec
+        # Held locks, with the event set when they are released.
+        self._held: dict[str, asyncio.Event] = {}
+
+    @asynccontextmanager
+    async def acquire_lock(self, user_id: str, lock_name: str):
+        """Acquire a lock for a given user and operation.
+
+        The lock is released when the context manager exits.
+        """
+        lock_key = f"{lock_name}:lock:{user_id}"
+        start = time.monotonic()
+        if lock_key in self._held:
+            mt.LOCK_CONTENDED.labels(lock=lock_name).inc()
+        # Another waiter may get it first when it is released, hence the loop.
+        while (released := self._held.get(lock_key)) is not None:
+            remaining = start + self.acquire_timeout_sec - time.monotonic()
+            try:
+                await asyncio.wait_for(released.wait(), max(0.0, remaining))
+            except TimeoutError:
+                raise _lock_timeout(lock_key, lock_name, start) from None
+        self._held[lock_key] = asyncio.Event()
+        mt.LOCK_WAIT_TIME.labels(lock=lock_name).observe(time.monotonic() - start)
+        logger.info(f"Acquired {lock_name} lock for user {user_id}")
+        try:
+            yield
+        finally:
+            self._held.pop(lock_key).set()
+            logger.info(f"Released {lock_name} lock for user {user_id}")
+
+
+LockManager = RedisLockManager | InMemoryLockManager
+
+
+def make_lock_manager(
+    redis_host: str | None,
+    redis_port: int,
+    max_connections: int,
+    lock_ttl_seconds: float,
+) -> LockManager:
+    """Locks shared through Redis, or in memory when there is no Redis host."""
+    if redis_host is None:
+        return InMemoryLockManager()
+    return RedisLockManager(
+        get_redis_client(redis_host, redis_port, max_connections), lock_ttl_seconds
+    )
@@ -0,0 +1,177 @@
+"""Sessions that survive a dropped websocket for a short while.
+
+On a flaky network the websocket can drop in the middle of a conversation. Instead of
+closing everything, the session is detached for a grace period: the handler keeps its
+conversation, and its output is buffered, without the audio and up to
+SESSION_RESUME_MAX_BACKLOG events. A client reconnecting with the resume token it
+received gets the same session back, with the buffered events.
+
+The per-user STT lock is released on detach and taken again on resume, and the STT
+stream it limits is closed and opened again with it. The detached sessions are only
+known to their process, so a client reconnecting to another one starts a new session,
+which must not wait for the lock until the grace period ends.
+"""
+
+import asyncio
+import contextlib
+import logging
+import secrets
+
+from backend import metrics as mt
+from backend.kyutai_constants import SAMPLE_RATE, SESSION_RESUME_MAX_BACKLOG
+from backend.libs.audio_ingress import OpusDecoder
+from backend.unmute_handler import CloseStream, HandlerOutput, UnmuteHandler
+
+logger = logging.getLogger(__name__)
+
+
+class Session:
+    def __init__(self, handler: UnmuteHandler, user_email: str):
+        """What outlives a single websocket connection.
+
+        Args:
+            handler: Not entered yet, see `enter()`.
+            user_email: Only this user can resume the session.
+        """
+        self.handler = handler
+        self.user_email = user_email
+        self.resume_token = secrets.token_urlsafe(32)
+        # Not secret, unlike the resume token. For logs and the task monitor.
+        self.id = secrets.token_hex(4)
+        self.opus_decoder = OpusDecoder(SAMPLE_RATE)
+        # Whether we got the first page of the client's Ogg stream.
+        self.opus_stream_started = False
+        # Outputs taken from the handler but not sent when the connection dropped.
+        self.unsent_outputs: list[HandlerOutput] = []
+        # Set when the session must not be resumed, e.g. the server closed it.
+        self.ended = False
+        self.closed = False
+        self._exit_stack = contextlib.AsyncExitStack()
+        # Held while a websocket is attached, see `attach()`.
+        self._connection_lock: contextlib.AbstractAsyncContextManager | None = None
+
+    async def enter(self):
+        """Enter the handler's context, until the session closes."""
+        await self._exit_stack.enter_async_context(self.handler)
+
+    async def attach(self, lock: contextlib.AbstractAsyncContextManager) -> None:
+        """Hold the lock while a websocket is attached, until `detach()`.
+
+        Args:
+            lock: Not acquired yet, e.g. the per-user STT lock.
+        """
+        assert self._connection_lock is None
+        await lock.__aenter__()
+        self._connection_lock = lock
+
+    async def detach(self) -> None:
+        """Close the STT stream and release the lock of the connection, see `attach()`.
+
+        The handler opens a new STT stream with `start_up_stt()` once attached again.
+        """
+        lock, self._connection_lock = self._connection_lock, None
+        if lock is None:
+            return
+        try:
+            await self.handler.shutdown_stt()
+        finally:
+            await lock.__aexit__(None, None, None)
+
+    async def buffer_outputs(self) -> None:
+        """While detached, keep the outputs of the handler for when it is resumed.
+
+        Returns when the session can't be resumed anymore: the backlog is full, or the
+        handler closed the stream. Audio is dropped, see `emit_loop()`.
+        """
+        while True:
+            output = await self.handler.emit()
+            if isinstance(output, tuple):
+                continue
+            if isinstance(output, CloseStream):
+                self.ended = True
+                return
+            if len(self.unsent_outputs) >= SESSION_RESUME_MAX_BACKLOG:
+                logger.warning("Too many events buffered for the detached session")
+                self.ended = True
+                return
+            self.unsent_outputs.append(output)
+
+    def restart_opus_stream(self) -> None:
+        """The client started a new Ogg stream, e.g. its recorder restarted."""
+        self.opus_decoder = OpusDecoder(SAMPLE_RATE)
+
+    async def close(self) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            await self.handler.cleanup()
+        finally:
+            try:
+                await self._exit_stack.aclose()
+            finally:
+                await self.detach()
+
+
+class SessionRegistry:
+    def __init__(self, grace_sec: float):
+        """The detached sessions of this process, waiting to be resumed.
+
+        Args:
+            grace_sec: Detached sessions are closed after this long. With 0, sessions
+                are closed as soon as their websocket disconnects.
+        """
+        self.grace_sec = grace_sec
+        self.detached: dict[str, Session] = {}
+        self._expiry_tasks: dict[str, asyncio.Task] = {}
+
+    async def detach(self, session: Session) -> None:
+        """To call when the websocket of the session disconnected."""
+        if self.grace_sec <= 0 or session.ended:
+            await session.close()
+            return
+        await session.detach()
+        token = session.resume_token
+        self.detached[token] = session
+        self._expiry_tasks[token] = asyncio.create_task(
+            self._expire(session), name="expire_session()"
+        )
+        mt.DETACHED_SESSIONS.inc()
+        logger.info("Session detached, can be resumed for %.0fs", self.grace_sec)
+
+    def resume(self, resume_token: str, user_email: str) -> Session | None:
+        """Take back a detached session, None if it expired or isn't this user's."""
+        session = self.detached.get(resume_token)
+        if session is None or session.user_email != user_email:
+            mt.SESSION_RESUME_MISSES.inc()
+            return None
+        self._remove(resume_token).cancel()
+        mt.SESSION_RESUMES.inc()
+        logger.info("Session resumed")
+        return session
+
+    async def close_user_sessions(self, user_email: str) -> None:
+        """Close the detached sessions of a user who is starting a new one."""
+        for token, session in list(self.detached.items()):
+            if session.user_email == user_email:
+                self._remove(token).cancel()
+                await session.close()
+
+    def _remove(self, token: str) -> asyncio.Task:
+        del self.detached[token]
+        mt.DETACHED_SESSIONS.dec()
+        return self._expiry_tasks.pop(token)
+
+    async def _expire(self, session: Session) -> None:
+        try:
+            await asyncio.wait_for(session.buffer_outputs(), self.grace_sec)
+        except TimeoutError:
+            logger.info("Detached session expired")
+        else:
+            logger.info("Detached session can't be resumed anymore")
+        self._remove(session.resume_token)
+        mt.SESSION_RESUME_EXPIRED.inc()
+        try:
+            await session.close()
+        except Exception:
+            logger.exception("Error closing an expired session")
@@ -0,0 +1,116 @@
+"""A view of the asyncio tasks of the whole process, for debugging leaks and stalls.
+
+Tasks are grouped by name, or by coroutine when they have the default "Task-N" name,
+and by the session that created them. Computed on demand for the debug endpoint, only
+registered with DEBUG_TASKS_ROUTE, and periodically by a single monitor task for the
+Prometheus gauges.
+"""
+
+import asyncio
+import contextvars
+import re
+import time
+import weakref
+from collections import Counter
+
+from pydantic import BaseModel
+
+from backend import metrics as mt
+
+TASK_MONITOR_INTERVAL_SEC = 5.0
+
+# The session of the code that creates a task, inherited by the tasks it creates.
+SESSION_ID: contextvars.ContextVar[str | None] = contextvars.ContextVar(
+    "SESSION_ID", default=None
+)
+
+_DEFAULT_TASK_NAME = re.compile(r"Task-\d+")
+_task_creation_times: "weakref.WeakKeyDictionary[asyncio.Future, float]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+class TaskGroupStats(BaseModel):
+    count: int
+    # None for tasks created before the task factory was installed.
+    oldest_age_sec: float | None
+
+
+class TasksSnapshot(BaseModel):
+    total: int
+    by_name: dict[str, TaskGroupStats]
+    by_session: dict[str, int]
+
+
+def install_task_factory(loop: asyncio.AbstractEventLoop) -> None:
+    """Record the creation time of the tasks of this loop, to report their ages."""
+    previous_factory = loop.get_task_factory()
+
+    def factory(loop, coro, **kwargs):
+        if previous_factory is None:
+            task = asyncio.Task(coro, loop=loop, **kwargs)
+        else:
+            task = previous_factory(loop, coro, **kwargs)
+        _task_creation_times[task] = time.monotonic()
+        return task
+
+    loop.set_task_factory(factory)
+
+
+def task_group_name(task: asyncio.Task) -> str:
+    name = task.get_name()
+    if _DEFAULT_TASK_NAME.fullmatch(name):
+        coro = task.get_coro()
+        return getattr(coro, "__qualname__", type(coro).__name__)
+    return name
+
+
+def snapshot_tasks() -> TasksSnapshot:
+    """Must be called from the event loop thread."""
+    now = time.monotonic()
+    counts: Counter[str] = Counter()
+    oldest: dict[str, float] = {}
+    by_session: Counter[str] = Counter()
+
+    tasks = asyncio.all_tasks()
+    for task in tasks:
+        name = task_group_name(task)
+        counts[name] += 1
+        created = _task_creation_times.get(task)
+        if created is not None:
+            oldest[name] = min(oldest.get(name, created), created)
+        session_id = task.get_context().get(SESSION_ID)
+        if session_id is not None:
+            by_session[session_id] += 1
+
+    return TasksSnapshot(
+        total=len(tasks),
+        by_name={
+            name: TaskGroupStats(
+                count=count,
+                oldest_age_sec=now - oldest[name] if name in oldest else None,
+            )
+            for name, count in counts.most_common()
+        },
+        by_session=dict(by_session.most_common()),
+    )
+
+
+async def monitor_tasks(interval_sec: float = TASK_MONITOR_INTERVAL_SEC):
+    """Update the task gauges until cancelled. Only one per process is needed."""
+    reported_names: set[str] = set()
+    while True:
+        snapshot = snapshot_tasks()
+        mt.ASYNCIO_TASKS_TOTAL.set(snapshot.total)
+        for name, stats in snapshot.by_name.items():
+            mt.ASYNCIO_TASKS.labels(name=name).set(stats.count)
+            mt.ASYNCIO_OLDEST_TASK_AGE.labels(name=name).set(stats.oldest_age_sec or 0)
+        # Names without tasks anymore are reported as 0 rather than left stale.
+        for name in reported_names - snapshot.by_name.keys():
+            mt.ASYNCIO_TASKS.labels(name=name).set(0)
+            mt.ASYNCIO_OLDEST_TASK_AGE.labels(name=name).set(0)
+        reported_names |= snapshot.by_name.keys()
+        mt.ASYNCIO_MAX_TASKS_PER_SESSION.set(
+            max(snapshot.by_session.values(), default=0)
+        )
+        await asyncio.sleep(interval_sec)
@@ -0,0 +1,273 @@
+"""Cache of the synthesized TTS audio, to not synthesize the same phrase twice.
+
+AAC users replay the same phrases all the time: "yes", "thank you", their frequent
+answers. The audio is stored on disk, under a hash of everything that determines it,
+with a size-bounded LRU eviction. Each user can only take up part of the cache, so that
+one user can't evict the phrases of everyone else. Small entries are also kept in
+memory, the larger ones are streamed from disk.
+"""
+
+import asyncio
+import dataclasses
+import hashlib
+import json
+import logging
+import unicodedata
+from collections import Counter, OrderedDict
+from collections.abc import AsyncGenerator
+from pathlib import Path
+from typing import BinaryIO
+
+from cloudpathlib import CloudPath
+
+from backend import metrics as mt
+
+logger = logging.getLogger(__name__)
+
+READ_CHUNK_BYTES = 64 * 1024
+# About 2.5s of 48kHz 16-bit PCM, enough for the short phrases replayed the most.
+HOT_MAX_ENTRY_BYTES = 256 * 1024
+
+
+def normalize_text(text: str) -> str:
+    """Only what doesn't change the speech: case and punctuation do."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def tts_cache_key(
+    voice_id: str, text: str, sample_rate: int, output_format: str
+) -> str:
+    payload = json.dumps([voice_id, normalize_text(text), sample_rate, output_format])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+@dataclasses.dataclass
+class CacheEntry:
+    size: int
+    # Who synthesized it first, the entry counts towards their quota.
+    user: str
+
+
+class TTSCache:
+    def __init__(
+        self,
+        directory: Path | CloudPath,
+        max_bytes: int,
+        max_bytes_per_user: int,
+        hot_max_bytes: int,
+        hot_max_entry_bytes: int = HOT_MAX_ENTRY_BYTES,
+    ):
+        """Disk-backed LRU cache of audio, with an in-memory tier for small entries.
+
+        Args:
+            directory: Where the audio files are stored. Entries already there are
+                loaded on first use, so the cache survives restarts.
+            max_bytes: Total size of the audio on disk. 0 disables the cache.
+            max_bytes_per_user: Size of the entries counted towards a single user.
+            hot_max_bytes: Total size of the entries also kept in memory.
+            hot_max_entry_bytes: Larger entries are only on disk.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_bytes_per_user = max_bytes_per_user
+        self.hot_max_bytes = hot_max_bytes
+        self.hot_max_entry_bytes = hot_max_entry_bytes
+
+        # Least recently used first.
+        self.entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self.total_bytes = 0
+        self.bytes_by_user: Counter[str] = Counter()
+        self.hot: OrderedDict[str, bytes] = OrderedDict()
+        self.hot_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+        self._loaded = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    async def get(self, key: str) -> AsyncGenerator[bytes, None] | None:
+        """The cached audio, or None on a miss."""
+        if not self.enabled:
+            return None
+        await self._ensure_loaded()
+
+        entry = self.entries.get(key)
+        if entry is None:
+            return self._miss()
+        if (audio := self.hot.get(key)) is not None:
+            self.hot.move_to_end(key)
+            self.entries.move_to_end(key)
+            self._hit(entry, "memory")
+            return _iter_bytes(audio)
+
+        try:
+            if entry.size > self.hot_max_entry_bytes:
+                file = await asyncio.to_thread(self._open_audio, key)
+                self._disk_hit(key, entry)
+                return _stream_file(file)
+            audio = await asyncio.to_thread(self._audio_path(key).read_bytes)
+        except OSError as e:
+            logger.warning(f"Dropping unreadable TTS cache entry {key}: {e!r}")
+            self._forget(key)
+            return self._miss()
+
+        if self._disk_hit(key, entry):
+            self._add_hot(key, audio)
+        return _iter_bytes(audio)
+
+    async def put(self, key: str, audio: bytes, user: str) -> None:
+        """Store the audio synthesized for a user, evicting older entries if needed."""
+        if not self.enabled or len(audio) > self.max_bytes_per_user:
+            return
+        await self._ensure_loaded()
+        if key in self.entries:
+            return
+
+        await asyncio.to_thread(self._write, key, audio, user)
+        # Another request may have stored it meanwhile.
+        if key in self.entries:
+            return
+        self.entries[key] = CacheEntry(size=len(audio), user=user)
+        self.total_bytes += len(audio)
+        self.bytes_by_user[user] += len(audio)
+        if len(audio) <= self.hot_max_entry_bytes:
+            self._add_hot(key, audio)
+
+        evicted = self._pick_evictions(user)
+        for evicted_key in evicted:
+            self._forget(evicted_key)
+        if evicted:
+            mt.TTS_CACHE_EVICTIONS.inc(len(evicted))
+            await asyncio.to_thread(self._delete_files, evicted)
+        mt.TTS_CACHE_SIZE.set(self.total_bytes)
+
+    def _hit(self, entry: CacheEntry, tier: str) -> None:
+        self.hits += 1
+        self.bytes_saved += entry.size
+        mt.TTS_CACHE_HITS.labels(tier=tier).inc()
+        mt.TTS_CACHE_BYTES_SAVED.inc(entry.size)
+
+    def _disk_hit(self, key: str, entry: CacheEntry) -> bool:
+        """Whether the entry is still cached, it can be evicted while it is read."""
+        self._hit(entry, "disk")
+        if key not in self.entries:
+            return False
+        self.entries.move_to_end(key)
+        return True
+
+    def _miss(self) -> None:
+        self.misses += 1
+        mt.TTS_CACHE_MISSES.inc()
+
+    def _pick_evictions(self, user: str) -> list[str]:
+        """Least recently used entries of the user over quota, then of everyone."""
+        evicted = []
+        user_excess = self.bytes_by_user[user] - self.max_bytes_per_user
+        total_excess = self.total_bytes - self.max_bytes
+        for key, entry in self.entries.items():
+            if user_excess > 0 and entry.user == user:
+                user_excess -= entry.size
+            elif total_excess <= 0:
+                continue
+            evicted.append(key)
+            total_excess -= entry.size
+            if user_excess <= 0 and total_excess <= 0:
+                break
+        return evicted
+
+    def _add_hot(self, key: str, audio: bytes) -> None:
+        if key in self.hot:
+            return
+        self.hot[key] = audio
+        self.hot_bytes += len(audio)
+        while self.hot_bytes > self.hot_max_bytes:
+            _, dropped = self.hot.popitem(last=False)
+            self.hot_bytes -= len(dropped)
+
+    def _forget(self, key: str) -> None:
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            # E.g. evicted by a `put()` while a `get()` was reading it.
+            return
+        self.total_bytes -= entry.size
+        self.bytes_by_user[entry.user] -= entry.size
+        if self.bytes_by_user[entry.user] <= 0:
+            del self.bytes_by_user[entry.user]
+        if (audio := self.hot.pop(key, None)) is not None:
+            self.hot_bytes -= len(audio)
+
+    def _audio_path(self, key: str) -> Path | CloudPath:
+        return self.directory / f"{key}.audio"
+
+    def _open_audio(self, key: str) -> BinaryIO:
+        return self._audio_path(key).open("rb")
+
+    def _metadata_path(self, key: str) -> Path | CloudPath:
+        return self.directory / f"{key}.json"
+
+    def _write(self, key: str, audio: bytes, user: str) -> None:
+        # The metadata is written last, entries without it are ignored when loading.
+        self._audio_path(key).write_bytes(audio)
+        self._metadata_path(key).write_text(json.dumps({"user": user}))
+
+    def _delete_files(self, keys: list[str]) -> None:
+        for key in keys:
+            for path in [self._metadata_path(key), self._audio_path(key)]:
+                try:
+                    path.unlink()
+                except FileNotFoundError:
+                    pass
+
+    async def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        found = await asyncio.to_thread(self._scan)
+        for key, entry in found:
+            if key in self.entries:
+                continue
+            self.entries[key] = entry
+            # Put before the entries added while scanning, which are more recent.
+            self.entries.move_to_end(key, last=False)
+            self.total_bytes += entry.size
+            self.bytes_by_user[entry.user] += entry.size
+        mt.TTS_CACHE_SIZE.set(self.total_bytes)
+        logger.info(
+            f"Loaded {len(found)} TTS cache entries, {self.total_bytes / 1e6:.1f}MB"
+        )
+
+    def _scan(self) -> list[tuple[str, CacheEntry]]:
+        """The entries on disk, most recently written first."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        found = []
+        for metadata_path in self.directory.glob("*.json"):
+            key = metadata_path.stem
+            try:
+                user = json.loads(metadata_path.read_text())["user"]
+                stat = self._audio_path(key).stat()
+            except (OSError, ValueError, KeyError):
+                continue
+            found.append((stat.st_mtime, key, CacheEntry(size=stat.st_size, user=user)))
+        found.sort(reverse=True)
+        return [(key, entry) for _, key, entry in found]
+
+
+async def _iter_bytes(audio: bytes) -> AsyncGenerator[bytes, None]:
+    yield audio
+
+
+async def _stream_file(file: BinaryIO) -> AsyncGenerator[bytes, None]:
+    try:
+        while chunk := await asyncio.to_thread(file.read, READ_CHUNK_BYTES):
+            yield chunk
+    finally:
+        file.close()
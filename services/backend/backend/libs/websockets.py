@@ -1,5 +1,6 @@
 import asyncio
 import base64
+import collections
 import json
 import logging
 from typing import Annotated
@@ -13,6 +14,7 @@ from pydantic import Field, TypeAdapter, ValidationError
 
 import backend.openai_realtime_api_events as ora
 from backend import metrics as mt
+from backend.binary_audio import decode_input_audio, encode_output_audio
 from backend.exceptions import (
     MissingServiceAtCapacity,
     MissingServiceTimeout,
@@ -20,7 +22,10 @@ from backend.exceptions import (
     make_ora_error,
 )
 from backend.kyutai_constants import SAMPLE_RATE
+from backend.libs.audio_ingress import parse_audio_append, starts_ogg_stream
 from backend.libs.health import get_health
+from backend.libs.sessions import Session
+from backend.timer import get_time
 from backend.unmute_handler import UnmuteHandler
 
 logger = logging.getLogger(__name__)
@@ -34,13 +39,11 @@ ClientEventAdapter = TypeAdapter(
     Annotated[ora.ClientEvent, Field(discriminator="type")]
 )
 
-
-async def debug_running_tasks():
-    while True:
-        logger.debug(f"Running tasks: {len(asyncio.all_tasks())}")
-        for task in asyncio.all_tasks():
-            logger.debug(f"  Task: {task.get_name()} - {task.get_coro()}")
-        await asyncio.sleep(5)
+# With batching, events produced at most this far apart are sent in the same frame,
+# as a JSON array. The first event of a batch is never delayed more than the max delay.
+EVENT_BATCH_WINDOW_SEC = 0.005
+EVENT_BATCH_MAX_DELAY_SEC = 0.02
+EVENT_BATCH_MAX_SIZE = 32
 
 
 async def report_websocket_exception(websocket: WebSocket, exc: Exception):
@@ -81,7 +84,25 @@ async def report_websocket_exception(websocket: WebSocket, exc: Exception):
             logger.warning("Socket already closed.")
 
 
-async def run_route(websocket: WebSocket, handler: UnmuteHandler):
+async def run_route(
+    websocket: WebSocket,
+    session: Session,
+    binary_audio: bool = False,
+    batch_events: bool = False,
+):
+    """Run the session until the websocket disconnects.
+
+    The session isn't closed here, since the client may resume it.
+
+    Args:
+        websocket: The accepted websocket.
+        session: Already started, or resumed.
+        binary_audio: Whether the client negotiated binary audio frames, see
+            `backend.binary_audio`. Only changes how audio is sent, binary audio from
+            the client is always accepted.
+        batch_events: Send the server events in JSON arrays, grouping those produced
+            within a few milliseconds of each other in the same frame.
+    """
     health = await get_health()
     if not health.ok:
         logger.info("Health check failed, closing WebSocket connection.")
@@ -91,36 +112,38 @@ async def run_route(websocket: WebSocket, handler: UnmuteHandler):
         )
         return
 
-    emit_queue: asyncio.Queue[ora.ServerEvent] = asyncio.Queue()
+    handler = session.handler
     try:
         async with asyncio.TaskGroup() as tg:
+            tg.create_task(receive_loop(websocket, session), name="receive_loop()")
             tg.create_task(
-                receive_loop(websocket, handler, emit_queue), name="receive_loop()"
-            )
-            tg.create_task(
-                emit_loop(websocket, handler, emit_queue), name="emit_loop()"
+                emit_loop(websocket, session, binary_audio, batch_events),
+                name="emit_loop()",
             )
             tg.create_task(handler.quest_manager.wait(), name="quest_manager.wait()")
-            tg.create_task(debug_running_tasks(), name="debug_running_tasks()")
     finally:
-        await handler.cleanup()
         logger.info("websocket_route() finished")
 
 
-async def receive_loop(
-    websocket: WebSocket,
-    handler: UnmuteHandler,
-    emit_queue: asyncio.Queue[ora.ServerEvent],
-):
+def is_disconnection(exc: BaseException) -> bool:
+    """Whether the session stopped only because the client went away."""
+    if isinstance(exc, BaseExceptionGroup):
+        return all(is_disconnection(e) for e in exc.exceptions)
+    return isinstance(exc, WebSocketClosedError)
+
+
+async def receive_loop(websocket: WebSocket, session: Session):
     """Receive messages from the WebSocket.
 
-    Can decide to send messages via `emit_queue`.
+    Errors are sent back through the handler's output queue, the only outbound channel
+    of the session.
     """
-    opus_reader = sphn.OpusStreamReader(SAMPLE_RATE)
-    wait_for_first_opus = True
+    handler = session.handler
     while True:
         try:
-            message_raw = await websocket.receive_text()
+            received = await websocket.receive()
+            if received["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(received["code"], received.get("reason"))
         except WebSocketDisconnect as e:
             logger.info(
                 "receive_loop() stopped because WebSocket disconnected: "
@@ -135,54 +158,91 @@ async def receive_loop(
             logger.info("receive_loop() stopped because WebSocket disconnected.")
             raise WebSocketClosedError() from e
 
-        try:
-            message: ora.ClientEvent = ClientEventAdapter.validate_json(message_raw)
-        except json.JSONDecodeError as e:
-            await emit_queue.put(
-                ora.Error(
-                    error=ora.ErrorDetails(
-                        type="invalid_request_error",
-                        message=f"Invalid JSON: {e}",
+        if received.get("bytes") is not None:
+            try:
+                opus_bytes = decode_input_audio(received["bytes"])
+            except ValueError as e:
+                await handler.output_queue.put(
+                    ora.Error(
+                        error=ora.ErrorDetails(
+                            type="invalid_request_error", message=str(e)
+                        )
                     )
                 )
-            )
-            continue
-        except ValidationError as e:
-            await emit_queue.put(
-                ora.Error(
-                    error=ora.ErrorDetails(
-                        type="invalid_request_error",
-                        message="Invalid message",
-                        details=json.loads(e.json()),
+                continue
+        elif (opus_bytes := parse_audio_append(received["text"])) is None:
+            try:
+                message: ora.ClientEvent = ClientEventAdapter.validate_json(
+                    received["text"]
+                )
+            except json.JSONDecodeError as e:
+                await handler.output_queue.put(
+                    ora.Error(
+                        error=ora.ErrorDetails(
+                            type="invalid_request_error",
+                            message=f"Invalid JSON: {e}",
+                        )
+                    )
+                )
+                continue
+            except ValidationError as e:
+                await handler.output_queue.put(
+                    ora.Error(
+                        error=ora.ErrorDetails(
+                            type="invalid_request_error",
+                            message="Invalid message",
+                            details=json.loads(e.json()),
+                        )
                     )
                 )
+                continue
+
+            if isinstance(message, ora.InputAudioBufferAppend):
+                opus_bytes = base64.b64decode(message.audio)
+            else:
+                await handle_client_event(handler, message)
+                continue
+
+        try:
+            starts_stream = starts_ogg_stream(opus_bytes)
+        except ValueError as e:
+            await handler.output_queue.put(
+                ora.Error(
+                    error=ora.ErrorDetails(type="invalid_request_error", message=str(e))
+                )
             )
             continue
+        if starts_stream:
+            # First page of an Ogg stream. A client resuming the session can either
+            # continue its stream or start a new one.
+            if session.opus_stream_started:
+                session.restart_opus_stream()
+            session.opus_stream_started = True
+        elif not session.opus_stream_started:
+            # Somehow the UI is sending us potentially old messages from a previous
+            # connection on reconnect, so that we might get some old OGG packets,
+            # waiting for the bit set for first packet to feed to the decoder.
+            continue
+        pcm = await session.opus_decoder.decode(opus_bytes)
 
-        if isinstance(message, ora.InputAudioBufferAppend):
-            opus_bytes = base64.b64decode(message.audio)
-            if wait_for_first_opus:
-                # Somehow the UI is sending us potentially old messages from a previous
-                # connection on reconnect, so that we might get some old OGG packets,
-                # waiting for the bit set for first packet to feed to the decoder.
-                if opus_bytes[5] & 2:
-                    wait_for_first_opus = False
-                else:
-                    continue
-            pcm = await asyncio.to_thread(opus_reader.append_bytes, opus_bytes)
+        if pcm.size:
+            await handler.receive((SAMPLE_RATE, pcm[np.newaxis, :]))
 
-            if pcm.size:
-                await handler.receive((SAMPLE_RATE, pcm[np.newaxis, :]))
-        elif isinstance(message, ora.CurrentKeywords):
-            await handler.add_keywords(message)
-        elif isinstance(message, ora.DesiredResponsesLenght):
-            await handler.set_desired_responses_length(message)
 
-        elif isinstance(message, ora.ResponseSelectedByWriter):
-            await handler.select_response(message.text, message.id)
+async def handle_client_event(handler: UnmuteHandler, message: ora.ClientEvent):
+    """Handle the client events other than audio."""
+    if isinstance(message, ora.CurrentKeywords):
+        await handler.add_keywords(message)
+    elif isinstance(message, ora.DesiredResponsesLenght):
+        await handler.set_desired_responses_length(message)
 
-        else:
-            logger.info("Ignoring message:", str(message)[:100])
+    elif isinstance(message, ora.ResponseSelectedByWriter):
+        await handler.select_response(message.text, message.id)
+    elif isinstance(message, ora.TTSRequest):
+        await handler.speak(message)
+
+    else:
+        logger.info("Ignoring message:", str(message)[:100])
 
 
 class EmitDebugLogger:
@@ -205,35 +265,74 @@ class EmitDebugLogger:
 
 async def emit_loop(
     websocket: WebSocket,
-    handler: UnmuteHandler,
-    emit_queue: asyncio.Queue[ora.ServerEvent],
+    session: Session,
+    binary_audio: bool = False,
+    batch_events: bool = False,
 ):
-    """Send messages to the WebSocket."""
+    """Send messages to the WebSocket.
+
+    Only wakes up when the handler has something to send. When the client disconnects,
+    the receive loop stops, which cancels this one. The events that weren't sent are
+    kept in the session, for when the client resumes it.
+    """
+    handler = session.handler
     emit_debug_logger = EmitDebugLogger()
 
     opus_writer = sphn.OpusStreamWriter(SAMPLE_RATE)
 
-    while True:
-        if (
-            websocket.application_state == WebSocketState.DISCONNECTED
-            or websocket.client_state == WebSocketState.DISCONNECTED
-        ):
-            logger.info("emit_loop() stopped because WebSocket disconnected")
-            raise WebSocketClosedError()
+    batch: list[ora.ServerEvent] = []
+    batch_deadline = 0.0
+    pending = collections.deque(session.unsent_outputs)
+    session.unsent_outputs = []
 
+    async def send_events(events: list[ora.ServerEvent], frame: str):
         try:
-            to_emit = emit_queue.get_nowait()
-        except asyncio.QueueEmpty:
-            emitted_by_handler = await handler.emit()
+            await send_frame(websocket, frame)
+        except BaseException:
+            # Including a cancellation, the events are already out of the batch.
+            session.unsent_outputs.extend(events)
+            raise
+
+    async def send_batch():
+        mt.EVENT_BATCH_SIZE.observe(len(batch))
+        mt.EVENT_BATCH_FRAMES_SAVED.inc(len(batch) - 1)
+        events = batch.copy()
+        batch.clear()
+        frame = "[" + ",".join(event.model_dump_json() for event in events) + "]"
+        await send_events(events, frame)
 
-            if emitted_by_handler is None:
-                continue
-            elif isinstance(emitted_by_handler, AdditionalOutputs):
+    try:
+        while True:
+            if pending:
+                emitted_by_handler = pending.popleft()
+            elif not batch:
+                emitted_by_handler = await handler.emit()
+            else:
+                timeout = min(EVENT_BATCH_WINDOW_SEC, batch_deadline - get_time())
+                try:
+                    emitted_by_handler = await asyncio.wait_for(handler.emit(), timeout)
+                except TimeoutError:
+                    await send_batch()
+                    continue
+
+            if (
+                websocket.application_state == WebSocketState.DISCONNECTED
+                or websocket.client_state == WebSocketState.DISCONNECTED
+            ):
+                logger.info("emit_loop() stopped because WebSocket disconnected")
+                pending.appendleft(emitted_by_handler)
+                raise WebSocketClosedError()
+
+            to_emit: ora.ServerEvent | bytes
+            if isinstance(emitted_by_handler, AdditionalOutputs):
                 assert len(emitted_by_handler.args) == 1
                 to_emit = ora.UnmuteAdditionalOutputs(
                     args=emitted_by_handler.args[0],
                 )
             elif isinstance(emitted_by_handler, CloseStream):
+                session.ended = True
+                if batch:
+                    await send_batch()
                 # Close here explicitly so that the receive loop stops too
                 await websocket.close()
                 break
@@ -244,7 +343,9 @@ async def emit_loop(
                 audio = audio_to_float32(audio)
                 opus_bytes = await asyncio.to_thread(opus_writer.append_pcm, audio)
                 # Due to buffering/chunking, Opus doesn't necessarily output something on every PCM added
-                if opus_bytes:
+                if opus_bytes and binary_audio:
+                    to_emit = encode_output_audio(response_id, opus_bytes)
+                elif opus_bytes:
                     to_emit = ora.ResponseAudioDelta(
                         delta=base64.b64encode(opus_bytes).decode("utf-8"),
                         response_id=response_id,
@@ -252,22 +353,49 @@ async def emit_loop(
                 else:
                     continue
 
-        emit_debug_logger.on_emit(to_emit)
+            if isinstance(to_emit, bytes):
+                # Binary frames can't be batched, keep the order of the events.
+                if batch:
+                    await send_batch()
+                await send_frame(websocket, to_emit)
+                continue
+
+            emit_debug_logger.on_emit(to_emit)
+            if not batch_events:
+                await send_events([to_emit], to_emit.model_dump_json())
+                continue
 
-        try:
-            await websocket.send_text(to_emit.model_dump_json())
-        except (WebSocketDisconnect, RuntimeError) as e:
-            if isinstance(e, RuntimeError):
-                if "Unexpected ASGI message 'websocket.send'" in str(e):
-                    # This is expected when the client disconnects
-                    message = f"emit_loop() stopped because WebSocket disconnected: {e}"
-                else:
-                    raise
+            if not batch:
+                batch_deadline = get_time() + EVENT_BATCH_MAX_DELAY_SEC
+            batch.append(to_emit)
+            if len(batch) >= EVENT_BATCH_MAX_SIZE:
+                await send_batch()
+    finally:
+        # Audio isn't replayed: it belongs to an Opus stream of this connection.
+        session.unsent_outputs.extend(batch)
+        session.unsent_outputs.extend(
+            output for output in pending if not isinstance(output, tuple)
+        )
+
+
+async def send_frame(websocket: WebSocket, frame: str | bytes):
+    try:
+        if isinstance(frame, bytes):
+            await websocket.send_bytes(frame)
+        else:
+            await websocket.send_text(frame)
+    except (WebSocketDisconnect, RuntimeError) as e:
+        if isinstance(e, RuntimeError):
+            if "Unexpected ASGI message 'websocket.send'" in str(e):
+                # This is expected when the client disconnects
+                message = f"emit_loop() stopped because WebSocket disconnected: {e}"
             else:
-                message = (
-                    "emit_loop() stopped because WebSocket disconnected: "
-                    f"{e.code=} {e.reason=}"
-                )
+                raise
+        else:
+            message = (
+                "emit_loop() stopped because WebSocket disconnected: "
+                f"{e.code=} {e.reason=}"
+            )
 
-            logger.info(message)
-            raise WebSocketClosedError() from e
+        logger.info(message)
+        raise WebSocketClosedError() from e
@@ -1,3 +1,5 @@
+import asyncio
+import contextlib
 import logging
 from typing import Annotated
 
@@ -11,13 +13,54 @@ from starlette.requests import Request
 import backend.openai_realtime_api_events as ora
 from backend import metrics as mt
 from backend.kyutai_constants import (
+    DEBUG_TASKS_ROUTE,
+    HTTP_KEEPALIVE_SEC,
+    HTTP_MAX_CONNECTIONS,
+    LOG_SLOW_CALLBACK_STACKS,
     MAX_VOICE_FILE_SIZE_MB,
+    SLOW_CALLBACK_SEC,
 )
 from backend.libs.files import LimitUploadSizeForPath
 from backend.libs.health import get_health
+from backend.libs.http_clients import (
+    close_http_clients,
+    get_aiohttp_session,
+    get_httpx_client,
+)
+from backend.libs.loop_monitor import LoopMonitor
+from backend.libs.redis_lock import close_redis_clients
+from backend.libs.task_monitor import (
+    TasksSnapshot,
+    install_task_factory,
+    monitor_tasks,
+    snapshot_tasks,
+)
 from backend.routes import auth_router, tts_router, user_router, voices_router
 
-app = FastAPI(openapi_prefix="/api")
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    install_task_factory(asyncio.get_running_loop())
+    # Created here rather than on first use, so that they're bound to this loop.
+    get_httpx_client(HTTP_MAX_CONNECTIONS, HTTP_KEEPALIVE_SEC)
+    get_aiohttp_session(HTTP_MAX_CONNECTIONS, HTTP_KEEPALIVE_SEC)
+    monitors = [
+        asyncio.create_task(monitor_tasks(), name="monitor_tasks()"),
+        asyncio.create_task(
+            LoopMonitor(SLOW_CALLBACK_SEC, LOG_SLOW_CALLBACK_STACKS).run(),
+            name="LoopMonitor.run()",
+        ),
+    ]
+    try:
+        yield
+    finally:
+        for monitor in monitors:
+            monitor.cancel()
+        await close_redis_clients()
+        await close_http_clients()
+
+
+app = FastAPI(openapi_prefix="/api", lifespan=lifespan)
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -67,6 +110,14 @@ async def health():
     return health
 
 
+if DEBUG_TASKS_ROUTE:
+
+    @app.get("/v1/debug/tasks")
+    async def debug_tasks() -> TasksSnapshot:
+        """The asyncio tasks of this process, by name and by session."""
+        return snapshot_tasks()
+
+
 def _cors_headers_for_error(request: Request):
     origin = request.headers.get("origin")
     allow_origin = origin if origin in CORS_ALLOW_ORIGINS else None
@@ -32,6 +32,8 @@ TTFT_BINS_VLLM_MS = [
     1000.0,
 ]
 TTFT_BINS_VLLM = [x / 1000 for x in TTFT_BINS_VLLM_MS]
+TTS_TTFB_BINS = [0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 2.0, 5.0, 10.0]
+TTS_CHUNKS_BINS = [1, 2, 3, 4, 6, 8, 12]
 
 NUM_WORDS_REQUEST_BINS = [
     50.0,
@@ -47,6 +49,16 @@ NUM_WORDS_REQUEST_BINS = [
 NUM_WORDS_STT_BINS = [0.0, 50.0, 100.0, 200.0, 500.0, 1000.0, 2000.0, 4000.0]
 NUM_WORDS_REPLY_BINS = [5.0, 10.0, 25.0, 50.0, 100.0, 200.0]
 
+RECONNECT_GAP_BINS = [0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0]
+STT_LAG_BINS = [0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0]
+RTF_BINS = [0.5, 0.75, 0.9, 0.95, 1.0, 1.05, 1.1, 1.25, 1.5, 2.0, 5.0]
+DECODE_TIME_BINS_MS = [0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 25.0]
+DECODE_TIME_BINS = [x / 1000 for x in DECODE_TIME_BINS_MS]
+EVENT_BATCH_SIZE_BINS = [1.0, 2.0, 4.0, 8.0, 16.0, 32.0]
+LOCK_WAIT_TIME_BINS = [0.001, 0.01, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0]
+EVENT_LOOP_LAG_BINS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5]
+TURN_PHASE_BINS = [0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 10.0]
+
 SESSIONS = Counter("worker_sessions", "")
 SERVICE_MISSES = Counter("worker_service_misses", "")
 HARD_SERVICE_MISSES = Counter("worker_hard_service_misses", "")
@@ -59,6 +71,35 @@ SESSION_DURATION = Histogram(
 )
 HEALTH_OK = Summary("worker_health_ok", "")
 
+# Sessions kept after a disconnection, see libs/sessions.py
+DETACHED_SESSIONS = Gauge("worker_detached_sessions", "")
+SESSION_RESUMES = Counter("worker_session_resumes", "")
+SESSION_RESUME_MISSES = Counter("worker_session_resume_misses", "")
+SESSION_RESUME_EXPIRED = Counter("worker_session_resume_expired", "")
+
+# Per-user Redis locks, see libs/redis_lock.py. The lock label is "stt" or "tts".
+LOCK_WAIT_TIME = Histogram(
+    "worker_lock_wait_time", "", ["lock"], buckets=LOCK_WAIT_TIME_BINS
+)
+# Not acquired at the first attempt.
+LOCK_CONTENDED = Counter("worker_lock_contended", "", ["lock"])
+LOCK_TIMEOUTS = Counter("worker_lock_timeouts", "", ["lock"])
+# Expired while held, so possibly acquired by someone else.
+LOCK_LOST = Counter("worker_lock_lost", "", ["lock"])
+
+# Decoding of the audio sent by the clients, see libs/audio_ingress.py
+OPUS_DECODE_TIME = Histogram("worker_opus_decode_time", "", buckets=DECODE_TIME_BINS)
+OPUS_DECODE_QUEUE_WAIT = Histogram(
+    "worker_opus_decode_queue_wait", "", buckets=DECODE_TIME_BINS
+)
+OPUS_DECODE_OFFLOADED = Counter("worker_opus_decode_offloaded", "")
+
+# Events sent to the clients that enabled batching, see libs/websockets.py
+EVENT_BATCH_SIZE = Histogram(
+    "worker_event_batch_size", "", buckets=EVENT_BATCH_SIZE_BINS
+)
+EVENT_BATCH_FRAMES_SAVED = Counter("worker_event_batch_frames_saved", "")
+
 STT_SESSIONS = Counter("worker_stt_sessions", "")
 STT_ACTIVE_SESSIONS = Gauge("worker_stt_active_sessions", "")
 STT_MISSES = Counter("worker_stt_misses", "")
@@ -76,6 +117,15 @@ STT_AUDIO_DURATION = Histogram(
 )
 STT_NUM_WORDS = Histogram("worker_stt_num_words", "", buckets=NUM_WORDS_STT_BINS)
 STT_TTFT = Histogram("worker_stt_ttft", "", buckets=TTFT_BINS_STT)
+STT_RECONNECTS = Counter("worker_stt_reconnects", "")
+STT_RECONNECT_FAILURES = Counter("worker_stt_reconnect_failures", "")
+STT_RECONNECT_GAP = Histogram(
+    "worker_stt_reconnect_gap", "", buckets=RECONNECT_GAP_BINS
+)
+# How far the STT steps trail the audio we sent, see stt/stt_lag.py
+STT_LAG = Histogram("worker_stt_lag", "", buckets=STT_LAG_BINS)
+STT_RTF = Histogram("worker_stt_rtf", "", buckets=RTF_BINS)
+STT_LAGGING_SESSIONS = Gauge("worker_stt_lagging_sessions", "")
 
 
 VLLM_SESSIONS = Counter("worker_vllm_sessions", "")
@@ -94,3 +144,58 @@ VLLM_REPLY_LENGTH = Histogram(
 VLLM_GEN_DURATION = Histogram(
     "worker_vllm_gen_duration", "", buckets=GENERATION_DURATION_BINS
 )
+
+# Per-turn latency breakdown, the phase label is the phase that just ended, and the
+# value the time since the previous phase. See TURN_PHASES in unmute_handler.py.
+TURN_PHASE_DURATION = Histogram(
+    "worker_turn_phase_duration", "", ["phase"], buckets=TURN_PHASE_BINS
+)
+# From the last word of the user to the first suggested answer.
+TURN_LATENCY = Histogram("worker_turn_latency", "", buckets=TURN_PHASE_BINS)
+
+# All the asyncio tasks of the process, see libs/task_monitor.py
+ASYNCIO_TASKS_TOTAL = Gauge("worker_asyncio_tasks_total", "")
+ASYNCIO_TASKS = Gauge("worker_asyncio_tasks", "", ["name"])
+ASYNCIO_OLDEST_TASK_AGE = Gauge("worker_asyncio_oldest_task_age", "", ["name"])
+ASYNCIO_MAX_TASKS_PER_SESSION = Gauge("worker_asyncio_max_tasks_per_session", "")
+
+# How late the event loop runs what it scheduled, see libs/loop_monitor.py
+EVENT_LOOP_LAG = Histogram("worker_event_loop_lag", "", buckets=EVENT_LOOP_LAG_BINS)
+SLOW_CALLBACKS = Counter("worker_slow_callbacks", "", ["callback"])
+
+# From the TTS request, of the /v1/tts/ route or of a session, to the first byte of
+# synthesized audio, by provider.
+TTS_TIME_TO_FIRST_BYTE = Histogram(
+    "worker_tts_time_to_first_byte", "", ["provider"], buckets=TTS_TTFB_BINS
+)
+# How many chunks the texts are synthesized in, see tts/chunking.py
+TTS_CHUNKS = Histogram("worker_tts_chunks", "", buckets=TTS_CHUNKS_BINS)
+# Encoding of the synthesized audio in the format asked by the client, see
+# tts/encoding.py. The encode seconds / audio seconds is the CPU cost of a format.
+TTS_OUTPUT_FORMATS = Counter("worker_tts_output_formats", "", ["format"])
+TTS_ENCODE_SECONDS = Counter("worker_tts_encode_seconds", "", ["format"])
+TTS_ENCODE_QUEUE_WAIT = Histogram(
+    "worker_tts_encode_queue_wait", "", buckets=DECODE_TIME_BINS
+)
+# Synthesized audio served from the cache, see libs/tts_cache.py. The hit rate is
+# hits / (hits + misses).
+TTS_CACHE_HITS = Counter("worker_tts_cache_hits", "", ["tier"])
+TTS_CACHE_MISSES = Counter("worker_tts_cache_misses", "")
+TTS_CACHE_BYTES_SAVED = Counter("worker_tts_cache_bytes_saved", "")
+TTS_CACHE_EVICTIONS = Counter("worker_tts_cache_evictions", "")
+TTS_CACHE_SIZE = Gauge("worker_tts_cache_size_bytes", "")
+
+# Requests of the shared HTTP clients, see libs/http_clients.py. The client label is
+# "httpx" or "gradium". The connection reuse rate is 1 - new connections / requests.
+HTTP_CLIENT_REQUESTS = Counter("worker_http_client_requests", "", ["client"])
+HTTP_CLIENT_NEW_CONNECTIONS = Counter(
+    "worker_http_client_new_connections", "", ["client"]
+)
+
+# Suggested answers synthesized before being picked, see tts/speculation.py. The
+# outcome label is "used", "unused" (expired), "failed" (or cancelled) or "skipped"
+# (over budget). The hit rate is hits / lookups, of the /v1/tts/ requests.
+TTS_SPECULATIONS = Counter("worker_tts_speculations", "", ["outcome"])
+TTS_SPECULATION_LOOKUPS = Counter("worker_tts_speculation_lookups", "", ["result"])
+# The `tts.request` events of the sessions, the other syntheses go through /v1/tts/.
+TTS_SESSION_REQUESTS = Counter("worker_tts_session_requests", "")
@@ -128,7 +128,19 @@ class DesiredResponsesLenght(BaseEvent[Literal["desired.responses.length"]]):
 
 
 class ResponseAudioDone(BaseEvent[Literal["response.audio.done"]]):
-    pass
+    response_id: UUID | None = None  # Unmute extension, set for `TTSRequest`
+
+
+class TTSRequest(BaseEvent[Literal["tts.request"]]):
+    """Say a text, like `/v1/tts/` but with the user and voice of the session.
+
+    Its audio is sent as `ResponseAudioDelta`, with the message id as response id, then
+    `ResponseAudioDone`, also sent when a newer request stops this one.
+    """
+
+    text: str
+    message_id: UUID
+    voice_name: str | None = None
 
 
 class TranscriptLogprob(BaseModel):
@@ -165,6 +177,14 @@ class UnmuteInterruptedByVAD(BaseEvent[Literal["unmute.interrupted_by_vad"]]):
     """The VAD interrupted the response generation."""
 
 
+class UnmuteSessionResumable(BaseEvent[Literal["unmute.session.resumable"]]):
+    """After a disconnection, reconnect with this token to resume the session."""
+
+    resume_token: str
+    # Whether this connection resumed a previous session, or started a new one.
+    resumed: bool
+
+
 # Server events (from OpenAI to client)
 ServerEvent = Union[
     Error,
@@ -181,6 +201,7 @@ ServerEvent = Union[
     UnmuteResponseTextDeltaReady,
     UnmuteResponseAudioDeltaReady,
     UnmuteInterruptedByVAD,
+    UnmuteSessionResumable,
 ]
 
 # Client events (from client to OpenAI)
@@ -189,6 +210,7 @@ ClientEvent = Union[
     ResponseSelectedByWriter,
     CurrentKeywords,
     DesiredResponsesLenght,
+    TTSRequest,
 ]
 
 Event = ClientEvent | ServerEvent
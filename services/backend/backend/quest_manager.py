@@ -109,8 +109,13 @@ class QuestManager:
         self._future: asyncio.Future | None = None
 
     async def wait(self):
+        """Raise the first error of a quest.
+
+        Can be cancelled and called again, e.g. by each route of a resumed session.
+        """
         assert self._future is not None
-        await self._future
+        # Cancelling the waiter must not cancel the future shared by all the waiters.
+        await asyncio.shield(self._future)
 
     async def add(self, quest: Quest[T]) -> Quest[T]:
         assert self._future is not None
@@ -11,17 +11,34 @@ from fastapi import (
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from typing_extensions import Annotated
 
+import backend.openai_realtime_api_events as ora
 from backend import metrics as mt
-from backend.kyutai_constants import REDIS_HOST, REDIS_PORT, STT_LOCK_TTL_SECONDS
-from backend.libs.redis_lock import RedisLockManager
-from backend.libs.websockets import report_websocket_exception, run_route
+from backend.binary_audio import BINARY_AUDIO_SUBPROTOCOL
+from backend.kyutai_constants import (
+    REDIS_HOST,
+    REDIS_MAX_CONNECTIONS,
+    REDIS_PORT,
+    SESSION_RESUME_GRACE_SEC,
+    STT_LOCK_TTL_SECONDS,
+)
+from backend.libs.redis_lock import make_lock_manager
+from backend.libs.sessions import Session, SessionRegistry
+from backend.libs.task_monitor import SESSION_ID
+from backend.libs.websockets import (
+    is_disconnection,
+    report_websocket_exception,
+    run_route,
+)
 from backend.security import decode_access_token
 from backend.storage import UserData, get_user_data_from_storage
 from backend.timer import Stopwatch
 from backend.typing import UserSettings
 from backend.unmute_handler import UnmuteHandler
 
-_stt_lock_manager = RedisLockManager(REDIS_HOST, REDIS_PORT, STT_LOCK_TTL_SECONDS)
+_stt_lock_manager = make_lock_manager(
+    REDIS_HOST, REDIS_PORT, REDIS_MAX_CONNECTIONS, STT_LOCK_TTL_SECONDS
+)
+_session_registry = SessionRegistry(SESSION_RESUME_GRACE_SEC)
 
 _current_profile = None
 
@@ -101,6 +118,10 @@ def delete_conversation(
 async def websocket_route(
     websocket: WebSocket,
     local_time: dt.datetime,
+    batch_events: bool = False,
+    debug_plot: bool = False,
+    additional_outputs: bool = True,
+    resume_token: str | None = None,
 ):
     user = None
     for protocol in websocket.scope["subprotocols"]:
@@ -121,8 +142,38 @@ async def websocket_route(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="local_time must be timezone-aware",
         )
+
+    email = str(user.email)
+    session = None
+    if resume_token is not None:
+        session = _session_registry.resume(resume_token, email)
+    resumed = session is not None
+    if session is None:
+        # A new conversation replaces the one the user may have left.
+        await _session_registry.close_user_sessions(email)
+        session = Session(
+            UnmuteHandler(
+                email,
+                local_time,
+                debug_plot=debug_plot,
+                additional_outputs=additional_outputs,
+            ),
+            email,
+        )
+    # Tags the tasks of the session, including those started by the handler.
+    SESSION_ID.set(session.id)
+    try:
+        # Held while connected, released if the session is detached.
+        await session.attach(_stt_lock_manager.acquire_lock(email, "stt"))
+        if not resumed:
+            await session.enter()
+    except BaseException:
+        await session.detach()
+        if resumed:
+            await session.close()
+        raise
+
     global _last_profile, _current_profile
-    mt.SESSIONS.inc()
     mt.ACTIVE_SESSIONS.inc()
     session_watch = Stopwatch()
     if PROFILE_ACTIVE and _current_profile is None:
@@ -137,27 +188,53 @@ async def websocket_route(
             frame = frame.f_back
         _current_profile.start(caller_frame=frame)
 
-    async with _stt_lock_manager.acquire_lock(str(user.email), "stt"):
-        try:
-            # The `subprotocol` argument is important because the client specifies what
-            # protocol(s) it supports and OpenAI uses "realtime" as the value. If we
-            # don't set this, the client will think this is not the right endpoint and
-            # will not connect.
-            await websocket.accept(subprotocol="realtime")
+    detached = False
+    try:
+        # The `subprotocol` argument is important because the client specifies what
+        # protocol(s) it supports and OpenAI uses "realtime" as the value. If we
+        # don't set this, the client will think this is not the right endpoint and
+        # will not connect.
+        # Clients supporting binary audio frames offer an additional subprotocol,
+        # which we select instead, see backend/binary_audio.py
+        binary_audio = BINARY_AUDIO_SUBPROTOCOL in websocket.scope["subprotocols"]
+        await websocket.accept(
+            subprotocol=BINARY_AUDIO_SUBPROTOCOL if binary_audio else "realtime"
+        )
 
-            handler = UnmuteHandler(str(user.email), local_time)
-            async with handler:
-                await handler.start_up()
-                await run_route(websocket, handler)
+        if not resumed:
+            mt.SESSIONS.inc()
+            await session.handler.start_up()
+        else:
+            # Closed when the session was detached, see `Session.detach()`.
+            await session.handler.start_up_stt()
+        # Sent before the events queued while the client was away.
+        session.unsent_outputs.insert(
+            0,
+            ora.UnmuteSessionResumable(
+                resume_token=session.resume_token, resumed=resumed
+            ),
+        )
+        await run_route(
+            websocket,
+            session,
+            binary_audio=binary_audio,
+            batch_events=batch_events,
+        )
 
-        except Exception as exc:
+    except Exception as exc:
+        if is_disconnection(exc):
+            await _session_registry.detach(session)
+            detached = True
+        else:
             await report_websocket_exception(websocket, exc)
-        finally:
-            if _current_profile is not None:
-                _current_profile.stop()
-                logger.info("Profiler saved.")
-                _last_profile = _current_profile
-                _current_profile = None
-
-            mt.ACTIVE_SESSIONS.dec()
-            mt.SESSION_DURATION.observe(session_watch.time())
+    finally:
+        if not detached:
+            await session.close()
+        if _current_profile is not None:
+            _current_profile.stop()
+            logger.info("Profiler saved.")
+            _last_profile = _current_profile
+            _current_profile = None
+
+        mt.ACTIVE_SESSIONS.dec()
+        mt.SESSION_DURATION.observe(session_watch.time())
@@ -6,9 +6,10 @@ from typing import Annotated
 import gradium
 from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile
 
-from backend.kyutai_constants import TTS_IS_GRADIUM, TTS_VOICE_ID
+from backend.kyutai_constants import TTS_IS_GRADIUM
 from backend.routes.user import get_current_user
 from backend.storage import UserData
+from backend.tts.text_to_speech import get_available_voices, gradium_client
 
 logger = getLogger(__name__)
 
@@ -18,9 +19,7 @@ async def _get_voice_uid(voice_name: str, user_email: str) -> str:
     if not TTS_IS_GRADIUM:
         return voice_name
 
-    client = gradium.GradiumClient(
-        base_url="https://eu.api.gradium.ai/api/",
-    )
+    client = gradium_client()
 
     voices = await client.voice_get(include_catalog=True)
     for voice in voices:
@@ -57,9 +56,7 @@ async def delete_voice(
     # Get the UID for the voice
     voice_uid = await _get_voice_uid(voice_name, user.email)
 
-    client = gradium.GradiumClient(
-        base_url="https://eu.api.gradium.ai/api/",
-    )
+    client = gradium_client()
 
     result = await gradium.voices.delete(client, voice_uid=voice_uid)
     logger.info(f"{result}")
@@ -74,37 +71,6 @@ async def delete_voice(
     return {"message": "Voice deleted successfully", "name": voice_name}
 
 
-async def _get_available_voices(user_name: str) -> dict[str, tuple[str, str]]:
-    """Get available voices based on the TTS provider."""
-    if not TTS_IS_GRADIUM:
-        # For Kyutai TTS, return the configured voice with unknown language
-        return {TTS_VOICE_ID: (TTS_VOICE_ID, "unknown")}
-
-    client = gradium.GradiumClient(
-        base_url="https://eu.api.gradium.ai/api/",
-    )
-    if "/" in user_name:
-        # Just as a safety precaution. I don't know if that can happen, but I don't
-        # want security issues and having custom voices leaking.
-        raise HTTPException(
-            status_code=400, detail="Username cannot contain '/' character"
-        )
-
-    voices = await client.voice_get(include_catalog=True)
-    # Return only catalog voices (built-in), format as {name: language}
-    result = {}
-    for voice in voices:
-        if voice.get("is_catalog", False):
-            if "de Gaulle" in voice["name"]:
-                continue
-            result[voice["name"]] = (voice["uid"], voice.get("language") or "unknown")
-        else:
-            # For custome voices, it's username/voice_name
-            if voice["name"].startswith(f"{user_name}/"):
-                result[voice["name"]] = (voice["uid"], "Custom voice")
-    return result
-
-
 @voices_router.post("/voices/create")
 async def create_voice(
     audio_file: Annotated[UploadFile, File(description="Audio file for voice cloning")],
@@ -120,9 +86,7 @@ async def create_voice(
             status_code=400, detail="Voice creation is only supported with Gradium TTS"
         )
 
-    client = gradium.GradiumClient(
-        base_url="https://eu.api.gradium.ai/api/",
-    )
+    client = gradium_client()
 
     # Save uploaded file to a temporary file since gradium.voices.create requires a file path
     # Preserve the original file extension for proper format handling
@@ -153,5 +117,5 @@ async def list_voices(
     Returns a dictionary where the key is the voice name and the value is the language.
     For Kyutai TTS, returns {TTS_VOICE_ID: "unknown"}.
     """
-    list_of_voices = await _get_available_voices(user.email)
+    list_of_voices = await get_available_voices(user.email)
     return {name: lang for name, (_, lang) in list_of_voices.items()}
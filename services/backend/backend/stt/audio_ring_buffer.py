@@ -0,0 +1,48 @@
+import numpy as np
+
+
+class AudioRingBuffer:
+    def __init__(self, capacity: int):
+        """A fixed-capacity buffer keeping the most recent audio samples.
+
+        Samples are addressed by their absolute index since the start of the stream,
+        so that callers can ask for "everything since sample N" without caring about
+        wrap-around.
+
+        Args:
+            capacity: Maximum number of samples kept. Older samples are overwritten.
+        """
+        self.capacity = capacity
+        self.buffer = np.zeros(capacity, dtype=np.float32)
+        self.total_written = 0
+
+    @property
+    def start_index(self) -> int:
+        """Absolute index of the oldest sample still available."""
+        return max(0, self.total_written - self.capacity)
+
+    def write(self, audio: np.ndarray) -> None:
+        if len(audio) >= self.capacity:
+            self.total_written += len(audio) - self.capacity
+            audio = audio[-self.capacity :]
+
+        pos = self.total_written % self.capacity
+        first = min(len(audio), self.capacity - pos)
+        self.buffer[pos : pos + first] = audio[:first]
+        self.buffer[: len(audio) - first] = audio[first:]
+        self.total_written += len(audio)
+
+    def read_from(self, index: int) -> np.ndarray:
+        """Return a copy of the samples from absolute `index` up to the latest one.
+
+        If `index` is older than what the buffer still holds, the returned audio starts
+        at `start_index` instead.
+        """
+        index = min(max(index, self.start_index), self.total_written)
+        n = self.total_written - index
+        pos = index % self.capacity
+        if pos + n <= self.capacity:
+            return self.buffer[pos : pos + n].copy()
+        return np.concatenate(
+            [self.buffer[pos:], self.buffer[: pos + n - self.capacity]]
+        )
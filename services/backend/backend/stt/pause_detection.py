@@ -0,0 +1,168 @@
+"""Decide when the user stopped talking, so that we can start generating responses.
+
+The detectors trade end-of-turn latency against false triggers, see
+`backend.stt.pause_detection_eval` to measure them on recorded sessions.
+"""
+
+import abc
+from dataclasses import dataclass
+
+import numpy as np
+
+
+@dataclass(slots=True)
+class PauseObservation:
+    # Duration of audio this observation covers, in seconds.
+    dt: float
+    # Audio time since the start time of the last word we got from the STT. Includes
+    # the STT delay.
+    time_since_last_word: float
+    # Smoothed pause prediction from the STT server VAD.
+    pause_prediction: float
+    # RMS amplitude of the audio, used when `audio` isn't available (e.g. recordings).
+    rms: float
+    audio: np.ndarray | None = None
+
+
+class PauseDetector(abc.ABC):
+    @abc.abstractmethod
+    def update(self, observation: PauseObservation) -> bool:
+        """Feed a new observation, returns True if the user is done talking."""
+
+    def reset(self) -> None:  # noqa: B027 - optional, only for stateful detectors
+        """Called once a pause was detected, before the user talks again."""
+
+
+class ServerVADPauseDetector(PauseDetector):
+    def __init__(self, silence_timeout: float = 2.5, threshold: float = 0.6):
+        """Pause detection based on the STT server VAD signal.
+
+        Args:
+            silence_timeout: Pause if no word was received for this long, in seconds.
+                Note that this includes the STT delay.
+            threshold: Pause if the smoothed pause prediction is above this value.
+        """
+        self.silence_timeout = silence_timeout
+        self.threshold = threshold
+
+    def update(self, observation: PauseObservation) -> bool:
+        return (
+            observation.time_since_last_word > self.silence_timeout
+            or observation.pause_prediction > self.threshold
+        )
+
+
+def windowed_rms_db(audio: np.ndarray, window_size: int) -> np.ndarray:
+    """RMS of each full window of `audio`, in dBFS."""
+    n_windows = len(audio) // window_size
+    windows = audio[: n_windows * window_size].reshape(n_windows, window_size)
+    rms = np.sqrt(np.mean(np.square(windows, dtype=np.float32), axis=1))
+    return 20 * np.log10(rms + 1e-9)
+
+
+class EnergyPauseDetector(PauseDetector):
+    def __init__(
+        self,
+        silence_sec: float = 0.8,
+        margin_db: float = 12.0,
+        min_speech_db: float = -50.0,
+        noise_floor_rise_db_per_sec: float = 3.0,
+        window_sec: float = 0.01,
+        sample_rate: int = 24000,
+    ):
+        """Local energy-based VAD, independent of the STT server.
+
+        The audio is cut in short windows whose energy is compared to a running
+        estimate of the noise floor. Since the decision doesn't wait for the STT, this
+        can react faster than `ServerVADPauseDetector`, but it's fooled by background
+        noise more easily.
+
+        Args:
+            silence_sec: Pause after this much audio without speech, in seconds.
+            margin_db: A window is speech if it is this much above the noise floor.
+            min_speech_db: A window is never speech below this level, in dBFS.
+            noise_floor_rise_db_per_sec: How fast the noise floor estimate can rise.
+                It drops instantly to the quietest window.
+            window_sec: Duration of the analysis windows, in seconds.
+            sample_rate: Sample rate of the audio.
+        """
+        self.silence_sec = silence_sec
+        self.margin_db = margin_db
+        self.min_speech_db = min_speech_db
+        self.noise_floor_rise_db_per_sec = noise_floor_rise_db_per_sec
+        self.window_size = max(1, int(window_sec * sample_rate))
+        self.window_sec = self.window_size / sample_rate
+        self.noise_floor_db = min_speech_db
+        self.silence_duration = 0.0
+
+    def update(self, observation: PauseObservation) -> bool:
+        if observation.audio is not None and len(observation.audio) >= self.window_size:
+            levels_db = windowed_rms_db(observation.audio, self.window_size)
+            window_sec = self.window_sec
+        else:
+            levels_db = np.array([20 * np.log10(observation.rms + 1e-9)])
+            window_sec = observation.dt
+
+        self.noise_floor_db = min(
+            self.noise_floor_db + self.noise_floor_rise_db_per_sec * observation.dt,
+            float(levels_db.min()),
+        )
+        threshold_db = max(self.noise_floor_db + self.margin_db, self.min_speech_db)
+        (speech,) = np.nonzero(levels_db > threshold_db)
+
+        if speech.size:
+            self.silence_duration = (len(levels_db) - 1 - speech[-1]) * window_sec
+        else:
+            self.silence_duration += len(levels_db) * window_sec
+
+        return self.silence_duration >= self.silence_sec
+
+    def reset(self) -> None:
+        self.silence_duration = 0.0
+
+
+class AnyPauseDetector(PauseDetector):
+    def __init__(self, detectors: list[PauseDetector]):
+        """Pause as soon as any of the detectors says so."""
+        self.detectors = detectors
+
+    def update(self, observation: PauseObservation) -> bool:
+        # No short-circuit, every detector has to see every observation.
+        results = [detector.update(observation) for detector in self.detectors]
+        return any(results)
+
+    def reset(self) -> None:
+        for detector in self.detectors:
+            detector.reset()
+
+
+PAUSE_DETECTORS: dict[str, type[PauseDetector]] = {
+    "server_vad": ServerVADPauseDetector,
+    "energy": EnergyPauseDetector,
+}
+
+
+def make_pause_detector(spec: str, **params: float) -> PauseDetector:
+    """Build a pause detector from a spec like "server_vad" or "server_vad+energy".
+
+    Parameters are passed to the detectors' constructors. With several detectors,
+    prefix them with the detector name, e.g. `energy.silence_sec`.
+    """
+    names = spec.split("+")
+    detectors = []
+    for name in names:
+        if name not in PAUSE_DETECTORS:
+            raise ValueError(
+                f"Unknown pause detector {name}. Valid: {list(PAUSE_DETECTORS)}"
+            )
+        own_params = {}
+        for key, value in params.items():
+            if key.startswith(f"{name}."):
+                own_params[key.removeprefix(f"{name}.")] = value
+            elif len(names) == 1 and "." not in key:
+                own_params[key] = value
+        detectors.append(PAUSE_DETECTORS[name](**own_params))  # type: ignore
+
+    if len(detectors) == 1:
+        return detectors[0]
+    return AnyPauseDetector(detectors)
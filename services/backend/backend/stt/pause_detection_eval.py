@@ -0,0 +1,240 @@
+"""Offline evaluation of the pause detectors on recorded sessions.
+
+Sessions are recorded by the backend when `PAUSE_TIMELINES_DIR` is set. Replay them
+with different detectors and parameters, faster than real time:
+
+    uv run python -m backend.stt.pause_detection_eval recordings/*.json \\
+        --detector server_vad --param threshold=0.4,0.5,0.6 \\
+        --param silence_timeout=1.5,2.5
+"""
+
+import argparse
+import itertools
+import json
+import pathlib
+import time
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from backend.stt.pause_detection import (
+    PauseDetector,
+    PauseObservation,
+    make_pause_detector,
+)
+
+# Without labels, a turn ends when the user doesn't say anything for this long.
+DEFAULT_TURN_GAP_SEC = 3.0
+
+
+@dataclass
+class Timeline:
+    """What a pause detector saw during a session, one entry per audio frame."""
+
+    t: np.ndarray  # Audio time at the end of the frame, in seconds
+    dt: np.ndarray
+    rms: np.ndarray
+    pause_prediction: np.ndarray
+    # When each word was received (audio time), and when it was spoken.
+    word_arrival_t: np.ndarray
+    word_start_time: np.ndarray
+    # Ground truth, when the user finished each turn. Derived from the words if None.
+    turn_ends: np.ndarray | None = None
+
+    @staticmethod
+    def load(path: pathlib.Path) -> "Timeline":
+        data = json.loads(path.read_text())
+        frames, words = data["frames"], data["words"]
+        return Timeline(
+            t=np.asarray(frames["t"], dtype=np.float64),
+            dt=np.asarray(frames["dt"], dtype=np.float64),
+            rms=np.asarray(frames["rms"], dtype=np.float64),
+            pause_prediction=np.asarray(frames["pause_prediction"], dtype=np.float64),
+            word_arrival_t=np.asarray(words["arrival_t"], dtype=np.float64),
+            word_start_time=np.asarray(words["start_time"], dtype=np.float64),
+            turn_ends=(
+                np.asarray(data["turn_ends"], dtype=np.float64)
+                if data.get("turn_ends") is not None
+                else None
+            ),
+        )
+
+    def get_turn_ends(self, turn_gap_sec: float = DEFAULT_TURN_GAP_SEC) -> np.ndarray:
+        if self.turn_ends is not None:
+            return self.turn_ends
+        starts = np.sort(self.word_start_time)
+        if starts.size == 0:
+            return starts
+        # The last word of each group of words separated by at least `turn_gap_sec`
+        is_last = np.append(np.diff(starts) >= turn_gap_sec, True)
+        return starts[is_last]
+
+
+@dataclass
+class TimelineRecorder:
+    """Records a session as a `Timeline`, for later evaluation."""
+
+    frames: dict[str, list[float]] = field(
+        default_factory=lambda: {"t": [], "dt": [], "rms": [], "pause_prediction": []}
+    )
+    words: dict[str, list] = field(
+        default_factory=lambda: {"arrival_t": [], "start_time": [], "text": []}
+    )
+
+    def add_frame(self, t: float, dt: float, rms: float, pause_prediction: float):
+        self.frames["t"].append(t)
+        self.frames["dt"].append(dt)
+        self.frames["rms"].append(rms)
+        self.frames["pause_prediction"].append(pause_prediction)
+
+    def add_word(self, arrival_t: float, start_time: float, text: str):
+        self.words["arrival_t"].append(arrival_t)
+        self.words["start_time"].append(start_time)
+        self.words["text"].append(text)
+
+    def save(self, path: pathlib.Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps({"frames": self.frames, "words": self.words}))
+
+
+def replay(timeline: Timeline, detector: PauseDetector) -> np.ndarray:
+    """Feed the timeline to the detector, returns the times at which it triggered.
+
+    Mimics `UnmuteHandler`: the detector only runs while the user is speaking, i.e.
+    after a word was received and until a pause is detected.
+    """
+    triggers = []
+    user_speaking = False
+    last_word_start = 0.0
+    word_i = 0
+    n_words = len(timeline.word_arrival_t)
+
+    for i in range(len(timeline.t)):
+        t = timeline.t[i]
+        while word_i < n_words and timeline.word_arrival_t[word_i] <= t:
+            last_word_start = timeline.word_start_time[word_i]
+            user_speaking = True
+            word_i += 1
+
+        if not user_speaking:
+            continue
+
+        observation = PauseObservation(
+            dt=float(timeline.dt[i]),
+            time_since_last_word=float(t - last_word_start),
+            pause_prediction=float(timeline.pause_prediction[i]),
+            rms=float(timeline.rms[i]),
+        )
+        if detector.update(observation):
+            triggers.append(t)
+            detector.reset()
+            user_speaking = False
+
+    return np.asarray(triggers, dtype=np.float64)
+
+
+@dataclass
+class EvaluationReport:
+    n_turns: int = 0
+    n_false_triggers: int = 0
+    latencies: list[float] = field(default_factory=list)
+    audio_sec: float = 0.0
+    wall_sec: float = 0.0
+
+    @property
+    def n_missed(self) -> int:
+        return self.n_turns - len(self.latencies)
+
+    @property
+    def false_trigger_rate(self) -> float:
+        """Fraction of the triggers that cut the user mid-turn."""
+        n_triggers = len(self.latencies) + self.n_false_triggers
+        return self.n_false_triggers / n_triggers if n_triggers else 0.0
+
+    def latency_percentile(self, q: float) -> float:
+        return float(np.percentile(self.latencies, q)) if self.latencies else np.nan
+
+    def summary(self) -> str:
+        return (
+            f"turns={self.n_turns} missed={self.n_missed} "
+            f"false_triggers={self.n_false_triggers} "
+            f"false_trigger_rate={self.false_trigger_rate:.1%} "
+            f"latency_p50={self.latency_percentile(50):.2f}s "
+            f"latency_p90={self.latency_percentile(90):.2f}s "
+            f"speed={self.audio_sec / max(self.wall_sec, 1e-9):.0f}x real time"
+        )
+
+
+def score(
+    timeline: Timeline,
+    triggers: np.ndarray,
+    report: EvaluationReport,
+    turn_gap_sec: float = DEFAULT_TURN_GAP_SEC,
+) -> None:
+    """Classify each trigger as a detected turn end or a false trigger."""
+    turn_ends = timeline.get_turn_ends(turn_gap_sec)
+    word_starts = np.sort(timeline.word_start_time)
+    report.n_turns += len(turn_ends)
+
+    claimed = np.zeros(len(turn_ends), dtype=bool)
+    for trigger in triggers:
+        # The latest turn end before the trigger, if the user hasn't resumed since.
+        turn_i = int(np.searchsorted(turn_ends, trigger, side="right")) - 1
+        if turn_i >= 0 and not claimed[turn_i]:
+            next_word_i = np.searchsorted(word_starts, turn_ends[turn_i], side="right")
+            resumed = (
+                next_word_i < len(word_starts) and word_starts[next_word_i] <= trigger
+            )
+            if not resumed:
+                claimed[turn_i] = True
+                report.latencies.append(float(trigger - turn_ends[turn_i]))
+                continue
+        report.n_false_triggers += 1
+
+
+def evaluate(
+    timelines: list[Timeline],
+    detector_spec: str,
+    turn_gap_sec: float = DEFAULT_TURN_GAP_SEC,
+    **params: float,
+) -> EvaluationReport:
+    report = EvaluationReport()
+    for timeline in timelines:
+        detector = make_pause_detector(detector_spec, **params)
+        start = time.perf_counter()
+        triggers = replay(timeline, detector)
+        report.wall_sec += time.perf_counter() - start
+        report.audio_sec += float(timeline.dt.sum())
+        score(timeline, triggers, report, turn_gap_sec)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("timelines", nargs="+", type=pathlib.Path)
+    parser.add_argument("--detector", default="server_vad")
+    parser.add_argument(
+        "--param",
+        action="append",
+        default=[],
+        help="name=value1,value2,... can be repeated, every combination is evaluated",
+    )
+    parser.add_argument("--turn-gap-sec", type=float, default=DEFAULT_TURN_GAP_SEC)
+    args = parser.parse_args()
+
+    timelines = [Timeline.load(path) for path in args.timelines]
+
+    names, values = [], []
+    for param in args.param:
+        name, _, raw_values = param.partition("=")
+        names.append(name)
+        values.append([float(v) for v in raw_values.split(",")])
+
+    for combination in itertools.product(*values):
+        params = dict(zip(names, combination, strict=True))
+        report = evaluate(timelines, args.detector, args.turn_gap_sec, **params)
+        print(f"{args.detector} {params}: {report.summary()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,8 +4,9 @@ import json
 import os
 import random
 import traceback
+from dataclasses import dataclass
 from logging import getLogger
-from typing import AsyncIterator, Literal, Union
+from typing import Any, AsyncIterator, Literal, Union
 
 import msgpack
 import numpy as np
@@ -19,15 +20,25 @@ from backend.kyutai_constants import (
     FRAME_TIME_SEC,
     KYUTAI_STT_URL,
     SAMPLE_RATE,
+    SAMPLES_PER_FRAME,
     STT_DELAY_SEC,
     STT_IS_GRADIUM,
+    STT_LAG_ALARM_SEC,
 )
+from backend.stt.audio_ring_buffer import AudioRingBuffer
 from backend.stt.exponential_moving_average import ExponentialMovingAverage
+from backend.stt.stt_lag import STTLagMonitor
 from backend.timer import Stopwatch
 from backend.websocket_utils import WebsocketState
 
 logger = getLogger(__name__)
 
+# How much of the recently sent audio we keep around to replay it after a reconnection.
+# Needs to be larger than the STT delay, plus however much the STT may lag behind.
+REPLAY_BUFFER_SEC = 10.0
+MAX_RECONNECT_ATTEMPTS = 3
+RECONNECT_BASE_DELAY_SEC = 0.25
+
 
 # Gradium STT Message Models
 
@@ -150,6 +161,77 @@ STTMessageAdapter = TypeAdapter(STTMessage)
 GradiumSTTMessageAdapter = TypeAdapter(GradiumSTTMessage)
 
 
+# Lightweight structures for the hot messages. Steps arrive 12.5 times per second per
+# session and words once per transcribed word, so we dispatch on the `type` tag and
+# skip pydantic validation for those. Rare messages still go through the adapters.
+
+
+@dataclass(slots=True)
+class FastWordMessage:
+    text: str
+    start_time: float
+
+
+@dataclass(slots=True)
+class FastEndWordMessage:
+    stop_time: float
+
+
+@dataclass(slots=True)
+class FastStepMessage:
+    step_idx: int
+    # Value to feed to the pause prediction, None if the step doesn't carry one.
+    pause_value: float | None
+
+
+FastSTTMessage = FastWordMessage | FastEndWordMessage | FastStepMessage
+
+
+def decode_kyutai_stt_message(data: Any) -> FastSTTMessage | STTMessage:
+    """Decode an unpacked Kyutai STT message, fast path for Step/Word/EndWord."""
+    try:
+        match data["type"]:
+            case "Step":
+                return FastStepMessage(
+                    step_idx=data["step_idx"], pause_value=float(data["prs"][2])
+                )
+            case "Word":
+                return FastWordMessage(
+                    text=data["text"], start_time=float(data["start_time"])
+                )
+            case "EndWord":
+                return FastEndWordMessage(stop_time=float(data["stop_time"]))
+    except (KeyError, IndexError, TypeError, ValueError):
+        # Malformed message, let pydantic produce a proper validation error.
+        pass
+    return STTMessageAdapter.validate_python(data)
+
+
+def decode_gradium_stt_message(data: Any) -> FastSTTMessage | GradiumSTTMessage:
+    """Decode a parsed Gradium STT message, fast path for step/text/end_text."""
+    try:
+        match data.get("type"):
+            case "step":
+                vad = data["vad"]
+                # Use VAD inactivity probability for pause prediction
+                pause_value = (
+                    1.0 - float(vad[-1]["inactivity_prob"]) if len(vad) >= 3 else None
+                )
+                return FastStepMessage(
+                    step_idx=data["step_idx"], pause_value=pause_value
+                )
+            case "text":
+                return FastWordMessage(
+                    text=data["text"], start_time=float(data["start_s"])
+                )
+            case "end_text":
+                return FastEndWordMessage(stop_time=float(data["stop_s"]))
+    except (AttributeError, KeyError, IndexError, TypeError, ValueError):
+        # Malformed message, let pydantic produce a proper validation error.
+        pass
+    return GradiumSTTMessageAdapter.validate_python(data)
+
+
 class SpeechToText:
     def __init__(self, expected_language: str | None):
         self.stt_instance = KYUTAI_STT_URL
@@ -162,6 +244,19 @@ class SpeechToText:
         self.waiting_first_step: bool = True
         self.expected_language = expected_language
 
+        # Used to recover from the STT connection dropping mid-conversation: we replay
+        # the audio the server hasn't processed yet on a fresh connection.
+        self.replay_buffer = AudioRingBuffer(int(REPLAY_BUFFER_SEC * SAMPLE_RATE))
+        # Absolute sample index at which the current upstream stream starts. The
+        # timestamps sent by the server are relative to it.
+        self.stream_start_sample = 0
+        self.steps_in_stream = 0
+        self.last_word_start_time = float("-inf")
+        self.reconnecting = False
+        self.shutting_down = False
+        self.end_of_stream = False
+        self.lag_monitor = STTLagMonitor(SAMPLE_RATE, alarm_sec=STT_LAG_ALARM_SEC)
+
         # In our case, attack  = from speaking to not speaking
         #              release = from not speaking to speaking
         self.pause_prediction = ExponentialMovingAverage(
@@ -192,7 +287,20 @@ class SpeechToText:
         self.sent_samples += len(audio)
         self.time_since_first_audio_sent.start_if_not_started()
         mt.STT_SENT_FRAMES.inc()
+        self.replay_buffer.write(audio)
+
+        if self.reconnecting:
+            # Will be sent as part of the replay once we're connected again.
+            return
+
+        try:
+            await self._send_pcm(audio)
+        except websockets.ConnectionClosed:
+            # The receiving side notices it too and takes care of reconnecting, the
+            # audio is in the replay buffer.
+            logger.warning("STT connection closed while sending audio.")
 
+    async def _send_pcm(self, audio: np.ndarray) -> None:
         if STT_IS_GRADIUM:
             # Send audio in chunks for Gradium (recommended 1920 samples per chunk = 80ms at 24kHz)
             chunk_size = 1920
@@ -239,6 +347,10 @@ class SpeechToText:
                 raise ValueError(f"Expected dict for Kyutai, got {type(data)}")
 
     async def start_up(self):
+        await self._connect()
+        mt.STT_ACTIVE_SESSIONS.inc()
+
+    async def _connect(self):
         if STT_IS_GRADIUM:
             logger.info(f"Connecting to Gradium STT {self.stt_instance}...")
 
@@ -276,7 +388,6 @@ class SpeechToText:
 
                 if isinstance(message, GradiumReadyMessage):
                     logger.info("Gradium STT service is ready")
-                    mt.STT_ACTIVE_SESSIONS.inc()
                     return
                 elif isinstance(message, GradiumErrorMessage):
                     logger.error(f"Error from Gradium STT service: {message.message}")
@@ -313,7 +424,6 @@ class SpeechToText:
                 message_dict = msgpack.unpackb(message_bytes)  # type: ignore
                 message = STTMessageAdapter.validate_python(message_dict)
                 if isinstance(message, STTReadyMessage):
-                    mt.STT_ACTIVE_SESSIONS.inc()
                     return
                 elif isinstance(message, STTErrorMessage):
                     raise MissingServiceAtCapacity("stt")
@@ -333,8 +443,10 @@ class SpeechToText:
         logger.info("Shutting down STT, receiving last messages")
         if self.shutdown_complete.is_set():
             return
+        self.shutting_down = True
 
         mt.STT_ACTIVE_SESSIONS.dec()
+        self.lag_monitor.close()
         if self.time_since_first_audio_sent.started:
             mt.STT_SESSION_DURATION.observe(self.time_since_first_audio_sent.time())
             mt.STT_AUDIO_DURATION.observe(self.sent_samples / SAMPLE_RATE)
@@ -359,142 +471,217 @@ class SpeechToText:
         await self.shutdown_complete.wait()
         logger.info("STT shutdown() finished")
 
+    @property
+    def processed_samples(self) -> int:
+        """How many of the samples we sent the server acknowledged with a step."""
+        return self.stream_start_sample + self.steps_in_stream * SAMPLES_PER_FRAME
+
+    def _on_step(self, message: FastStepMessage, n_steps_to_wait: int) -> int:
+        """Update timing and pause prediction, returns the new `n_steps_to_wait`."""
+        self.current_time += FRAME_TIME_SEC
+        self.steps_in_stream += 1
+        mt.STT_RECV_FRAMES.inc()
+        self.lag_monitor.update(self.sent_samples, self.processed_samples)
+
+        if self.waiting_first_step and self.time_since_first_audio_sent.started:
+            self.waiting_first_step = False
+            mt.STT_TTFT.observe(self.time_since_first_audio_sent.time())
+
+        if n_steps_to_wait > 0:
+            return n_steps_to_wait - 1
+
+        if message.pause_value is not None:
+            self.pause_prediction.update(
+                dt=FRAME_TIME_SEC, new_value=message.pause_value
+            )
+        return 0
+
+    def _on_word(self, message: FastWordMessage) -> bool:
+        """Fix the word timestamp in place, returns False if it was already emitted."""
+        message.start_time += self.stream_start_sample / SAMPLE_RATE
+        if message.start_time <= self.last_word_start_time:
+            # Already received before a reconnection, part of the replayed audio.
+            return False
+        self.last_word_start_time = message.start_time
+
+        num_words = len(message.text.split())
+        mt.STT_RECV_WORDS.inc(num_words)
+        self.received_words += 1
+        return True
+
     async def __aiter__(
         self,
-    ) -> AsyncIterator[STTWordMessage | STTMarkerMessage]:
+    ) -> AsyncIterator[FastWordMessage | STTMarkerMessage]:
         if not self.websocket:
             raise RuntimeError("STT websocket not connected")
 
+        stt_name = "Gradium" if STT_IS_GRADIUM else "Kyutai"
+        try:
+            while True:
+                if self.shutting_down:
+                    logger.info(f"{stt_name} STT stopped: shutting down")
+                    return
+                try:
+                    async for message in self._iter_stream():
+                        yield message
+                    closed_reason = "connection closed normally"
+                except websockets.ConnectionClosed as e:
+                    closed_reason = str(e)
+
+                if self.shutting_down or self.end_of_stream:
+                    # The server closes the connection once we send \0 or the end of
+                    # stream, this can show up as a ConnectionClosedError.
+                    logger.info(f"{stt_name} STT stopped: {closed_reason}")
+                    return
+                logger.error(f"{stt_name} STT closed unexpectedly: {closed_reason}")
+
+                await self._reconnect()
+        finally:
+            self.shutdown_complete.set()
+
+    async def _iter_stream(
+        self,
+    ) -> AsyncIterator[FastWordMessage | STTMarkerMessage]:
+        """Iterate over the messages of the current upstream connection."""
+        assert self.websocket is not None
         my_id = random.randint(1, int(1e9))
 
         # The pause prediction is all over the place in the first few steps, so ignore.
         n_steps_to_wait = 12
 
-        try:
-            if STT_IS_GRADIUM:
-                # Gradium STT message handling
-                async for response in self.websocket:
-                    message_dict = json.loads(response)
+        if STT_IS_GRADIUM:
+            # Gradium STT message handling
+            async for response in self.websocket:
+                message_dict = json.loads(response)
+                logger.debug(
+                    "%d %s got %s", my_id, self.pause_prediction.value, message_dict
+                )
+
+                try:
+                    message = decode_gradium_stt_message(message_dict)
+                except Exception as e:
+                    logger.warning(f"Failed to validate Gradium STT message: {e}")
+                    continue
+
+                if isinstance(message, FastStepMessage):
+                    n_steps_to_wait = self._on_step(message, n_steps_to_wait)
+
+                elif isinstance(message, FastWordMessage):
                     logger.debug(
-                        f"{my_id} {self.pause_prediction.value} got {message_dict}"
+                        "📝 Transcription: '%s' (start: %.2fs)",
+                        message.text,
+                        message.start_time,
                     )
+                    if self._on_word(message):
+                        yield message
 
-                    try:
-                        message = GradiumSTTMessageAdapter.validate_python(message_dict)
-                    except Exception as e:
-                        logger.warning(f"Failed to validate Gradium STT message: {e}")
-                        continue
+                elif isinstance(message, FastEndWordMessage):
+                    logger.debug("⏹️  Text segment ended at: %.2fs", message.stop_time)
 
-                    if isinstance(message, GradiumTextMessage):
-                        logger.debug(
-                            f"📝 Transcription: '{message.text}' (start: {message.start_s:.2f}s)"
-                        )
-
-                        # Convert to compatible format
-                        word_msg = STTWordMessage(
-                            type="Word", text=message.text, start_time=message.start_s
-                        )
-                        num_words = len(message.text.split())
-                        mt.STT_RECV_WORDS.inc(num_words)
-                        self.received_words += 1
-                        yield word_msg
-
-                    elif isinstance(message, GradiumEndTextMessage):
-                        logger.debug(f"⏹️  Text segment ended at: {message.stop_s:.2f}s")
-
-                    elif isinstance(message, GradiumStepMessage):
-                        self.current_time += FRAME_TIME_SEC
-                        mt.STT_RECV_FRAMES.inc()
-
-                        if (
-                            self.waiting_first_step
-                            and self.time_since_first_audio_sent.started
-                        ):
-                            self.waiting_first_step = False
-                            mt.STT_TTFT.observe(self.time_since_first_audio_sent.time())
-
-                        if n_steps_to_wait > 0:
-                            n_steps_to_wait -= 1
-                        else:
-                            # Use VAD inactivity probability for pause prediction
-                            if len(message.vad) >= 3:
-                                inactivity_prob = message.vad[-1].inactivity_prob
-                                self.pause_prediction.update(
-                                    dt=FRAME_TIME_SEC, new_value=1.0 - inactivity_prob
-                                )
-
-                        logger.debug(
-                            f"⏱️  Step {message.step_idx}: duration={message.total_duration_s:.2f}s, vad={message.vad}"
-                        )
-
-                    elif isinstance(message, GradiumEndOfStreamMessage):
-                        logger.info("✓ Received end_of_stream - transcription complete")
-                        break
-
-                    elif isinstance(message, GradiumErrorMessage):
-                        logger.error(
-                            f"✗ Error from Gradium STT: {message.message} (code: {message.code})"
-                        )
-                        break
-
-                    else:
-                        logger.warning(
-                            f"Unknown Gradium STT message type: {type(message)}"
-                        )
-            else:
-                # Kyutai STT message handling
-                async for message_bytes in self.websocket:
-                    data = msgpack.unpackb(message_bytes)  # type: ignore
-                    logger.debug(f"{my_id} {self.pause_prediction.value} got {data}")
-                    message: STTMessage = STTMessageAdapter.validate_python(data)
-
-                    match message:
-                        case STTWordMessage():
-                            num_words = len(message.text.split())
-                            mt.STT_RECV_WORDS.inc(num_words)
-                            self.received_words += 1
-                            yield message
-                        case STTEndWordMessage():
-                            continue
-                        case STTStepMessage():
-                            self.current_time += FRAME_TIME_SEC
-                            mt.STT_RECV_FRAMES.inc()
-                            if (
-                                self.waiting_first_step
-                                and self.time_since_first_audio_sent.started
-                            ):
-                                self.waiting_first_step = False
-                                mt.STT_TTFT.observe(
-                                    self.time_since_first_audio_sent.time()
-                                )
-                            if n_steps_to_wait > 0:
-                                n_steps_to_wait -= 1
-                            else:
-                                self.pause_prediction.update(
-                                    dt=FRAME_TIME_SEC, new_value=message.prs[2]
-                                )
-                        case STTMarkerMessage():
+                elif isinstance(message, GradiumEndOfStreamMessage):
+                    logger.info("✓ Received end_of_stream - transcription complete")
+                    self.end_of_stream = True
+                    break
+
+                elif isinstance(message, GradiumErrorMessage):
+                    logger.error(
+                        f"✗ Error from Gradium STT: {message.message} (code: {message.code})"
+                    )
+                    self.end_of_stream = True
+                    break
+
+                else:
+                    logger.warning(f"Unknown Gradium STT message type: {type(message)}")
+        else:
+            # Kyutai STT message handling
+            async for message_bytes in self.websocket:
+                data = msgpack.unpackb(message_bytes)  # type: ignore
+                logger.debug("%d %s got %s", my_id, self.pause_prediction.value, data)
+                message = decode_kyutai_stt_message(data)
+
+                match message:
+                    case FastStepMessage():
+                        n_steps_to_wait = self._on_step(message, n_steps_to_wait)
+                    case FastWordMessage():
+                        if self._on_word(message):
                             yield message
-                        case STTReadyMessage():
-                            continue
-                        case _:
-                            # Not sure why Pyright complains about non-exhaustive match
-                            raise ValueError(f"Unknown message: {message}")
+                    case FastEndWordMessage():
+                        continue
+                    case STTMarkerMessage():
+                        yield message
+                    case STTReadyMessage():
+                        continue
+                    case STTWordMessage() | STTStepMessage() | STTEndWordMessage():
+                        # Valid but not usable by the fast path, e.g. a step
+                        # without enough pause predictions.
+                        logger.warning(f"Ignoring STT message: {message}")
+                        continue
+                    case _:
+                        # Not sure why Pyright complains about non-exhaustive match
+                        raise ValueError(f"Unknown message: {message}")
 
-        except websockets.ConnectionClosedOK:
-            if STT_IS_GRADIUM:
-                logger.info("Gradium STT connection closed normally")
-            else:
-                # The server closes the connection once we send \0, and this actually shows
-                # up as a websockets.ConnectionClosedError.
-                pass
-        except websockets.ConnectionClosedError as e:
-            if STT_IS_GRADIUM:
-                logger.error(f"Gradium STT connection closed with error: {e}")
-            else:
-                logger.error(f"Kyutai STT connection closed with error: {e}")
-        finally:
-            self.shutdown_complete.set()
+    async def _reconnect(self) -> None:
+        """Open a new STT connection and replay the audio it hasn't processed yet.
+
+        Audio sent in the meantime is only stored in the replay buffer, and sent once
+        the replay has caught up. Raises if we can't reconnect.
+        """
+        self.reconnecting = True
+        gap_stopwatch = Stopwatch()
+        mt.STT_RECONNECTS.inc()
+
+        for attempt in range(MAX_RECONNECT_ATTEMPTS):
+            try:
+                await self._connect()
+                break
+            except Exception as e:
+                if attempt == MAX_RECONNECT_ATTEMPTS - 1 or self.shutting_down:
+                    mt.STT_RECONNECT_FAILURES.inc()
+                    raise
+                delay = RECONNECT_BASE_DELAY_SEC * (2**attempt)
+                logger.warning(
+                    f"Failed to reconnect to the STT ({e!r}), "
+                    f"attempt {attempt + 1}/{MAX_RECONNECT_ATTEMPTS}, "
+                    f"retrying in {delay:.2f}s"
+                )
+                await asyncio.sleep(delay)
+
+        if self.shutting_down:
+            # `shutdown()` started during the connection, and didn't close this one.
+            assert self.websocket is not None
+            await self.websocket.close()
+            self.reconnecting = False
+            return
+
+        # The words for the last `delay_sec` of processed audio may not have been sent
+        # yet, so start the replay a bit before what the server acknowledged. The words
+        # we already got are filtered out using their timestamps.
+        replay_start = max(
+            self.processed_samples - int(self.delay_sec * SAMPLE_RATE),
+            self.replay_buffer.start_index,
+        )
+        replay_start = min(replay_start, self.replay_buffer.total_written)
+        self.stream_start_sample = replay_start
+        self.steps_in_stream = 0
+        self.current_time = replay_start / SAMPLE_RATE - self.delay_sec
+
+        sent_until = replay_start
+        while sent_until < self.replay_buffer.total_written:
+            if sent_until < self.replay_buffer.start_index:
+                logger.warning("STT replay fell behind, some audio was lost.")
+                sent_until = self.replay_buffer.start_index
+            audio = self.replay_buffer.read_from(sent_until)
+            sent_until += len(audio)
+            for i in range(0, len(audio), SAMPLES_PER_FRAME):
+                await self._send_pcm(audio[i : i + SAMPLES_PER_FRAME])
+
+        self.reconnecting = False
+        gap = gap_stopwatch.time()
+        mt.STT_RECONNECT_GAP.observe(gap)
+        logger.info(
+            f"Reconnected to the STT after {gap:.2f}s, replayed "
+            f"{(sent_until - replay_start) / SAMPLE_RATE:.2f}s of audio"
+        )
 
     def audio_to_base64_pcm(self, audio: np.ndarray) -> str:
         """Convert numpy audio array to base64-encoded PCM data for Gradium."""
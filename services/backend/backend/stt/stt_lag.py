@@ -0,0 +1,86 @@
+"""Track how far behind the STT server is, compared to the audio we sent it.
+
+Each step from the server means one more frame was processed, so the difference with
+what we sent is how much audio is waiting in the network or the server queue. When the
+STT doesn't keep up, words arrive late, which looks like silence to pause detection.
+"""
+
+import logging
+
+from backend import metrics as mt
+from backend.timer import get_time
+
+logger = logging.getLogger(__name__)
+
+# Observe the lag about once per second, steps arrive 12.5 times per second.
+OBSERVE_EVERY_STEPS = 12
+
+_active_monitors: set["STTLagMonitor"] = set()
+
+
+class STTLagMonitor:
+    def __init__(
+        self, sample_rate: int, alarm_sec: float = 1.0, normal_lag_sec: float = 0.2
+    ):
+        """Per-session estimate of the STT lag.
+
+        Args:
+            sample_rate: Sample rate of the audio sent to the STT.
+            alarm_sec: The session counts as lagging above this lag. It stops counting
+                once the lag goes back under half of it.
+            normal_lag_sec: Lag expected even with a healthy STT, because of the
+                network and of the audio buffered until a full frame is available.
+        """
+        self.sample_rate = sample_rate
+        self.alarm_sec = alarm_sec
+        self.normal_lag_sec = normal_lag_sec
+        self.lag_sec = 0.0
+        self.lagging = False
+        self.n_steps = 0
+        self.window_start_time: float | None = None
+        self.window_start_samples = 0
+
+    @property
+    def excess_lag_sec(self) -> float:
+        """How much later than usual the STT messages arrive."""
+        return max(0.0, self.lag_sec - self.normal_lag_sec)
+
+    def update(self, sent_samples: int, processed_samples: int) -> None:
+        """To call on every step received from the STT."""
+        _active_monitors.add(self)
+        self.lag_sec = max(0, sent_samples - processed_samples) / self.sample_rate
+        self.n_steps += 1
+
+        if not self.lagging and self.lag_sec > self.alarm_sec:
+            self.lagging = True
+            mt.STT_LAGGING_SESSIONS.inc()
+            logger.warning(f"STT is lagging behind by {self.lag_sec:.2f}s")
+        elif self.lagging and self.lag_sec < self.alarm_sec / 2:
+            self.lagging = False
+            mt.STT_LAGGING_SESSIONS.dec()
+            logger.info(f"STT caught up, lag is {self.lag_sec:.2f}s")
+
+        if self.n_steps % OBSERVE_EVERY_STEPS == 0:
+            mt.STT_LAG.observe(self.lag_sec)
+            now = get_time()
+            if self.window_start_time is not None and now > self.window_start_time:
+                # Real time factor: audio processed per second of wall time.
+                processed = processed_samples - self.window_start_samples
+                rtf = processed / self.sample_rate / (now - self.window_start_time)
+                mt.STT_RTF.observe(rtf)
+            self.window_start_time = now
+            self.window_start_samples = processed_samples
+
+    def close(self) -> None:
+        _active_monitors.discard(self)
+        if self.lagging:
+            self.lagging = False
+            mt.STT_LAGGING_SESSIONS.dec()
+
+
+def lagging_sessions_fraction() -> float:
+    """Fraction of the active STT sessions of this process that are lagging."""
+    if not _active_monitors:
+        return 0.0
+    n_lagging = sum(monitor.lagging for monitor in _active_monitors)
+    return n_lagging / len(_active_monitors)
@@ -93,5 +93,27 @@ class PhasesStopwatch:
     def phase_dict_partial(self) -> dict[str, float | None]:
         return {phase: self.times[i] for i, phase in enumerate(self.phases)}
 
+    def phase_durations(self) -> dict[str, float]:
+        """For each timed phase but the first, the time since the previous timed one."""
+        durations = {}
+        previous: float | None = None
+        for phase, t in zip(self.phases, self.times, strict=True):
+            if t is None:
+                continue
+            if previous is not None:
+                durations[phase] = t - previous
+            previous = t
+        return durations
+
+    def relative_times(self) -> dict[str, float]:
+        """The time of each timed phase, relative to the first timed one."""
+        timed = {
+            p: t for p, t in zip(self.phases, self.times, strict=True) if t is not None
+        }
+        if not timed:
+            return {}
+        start = next(iter(timed.values()))
+        return {phase: t - start for phase, t in timed.items()}
+
     def reset(self):
         self.times = [None for _ in self.phases]
@@ -0,0 +1,193 @@
+"""Synthesize long texts in chunks, so that the first audio doesn't wait for the end.
+
+The TTS starts sending audio only once it has processed the whole text of a request, so
+the time to the first audio grows with the length of the text. Long texts are split at
+sentence and clause boundaries, with a short first chunk. The chunks are synthesized
+one after the other, optionally with the next one prefetched, and their audio is
+streamed back in order.
+"""
+
+import asyncio
+import re
+import struct
+from collections.abc import AsyncGenerator, AsyncIterator, Awaitable, Callable
+
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s+")
+_CLAUSE_END = re.compile(r"(?<=[,;:])\s+")
+
+# Written in the header when the size isn't known, like streaming TTS servers do.
+WAV_UNKNOWN_SIZE = 0xFFFFFFFF
+_WAV_HEADER_MAX_BYTES = 4096
+
+
+async def _aclose(audio: AsyncIterator[bytes]) -> None:
+    """Close a stream not read until the end, e.g. to release its HTTP connection."""
+    if isinstance(audio, AsyncGenerator):
+        await audio.aclose()
+
+
+def _split_long(text: str, max_chars: int) -> list[str]:
+    """Pieces of at most max_chars, at clause boundaries or else between words."""
+    if len(text) <= max_chars:
+        return [text]
+    pieces = []
+    for clause in _CLAUSE_END.split(text):
+        if len(clause) <= max_chars:
+            pieces.append(clause)
+            continue
+        line = ""
+        for word in clause.split():
+            if line and len(line) + 1 + len(word) > max_chars:
+                pieces.append(line)
+                line = word
+            else:
+                line = f"{line} {word}" if line else word
+        pieces.append(line)
+    return pieces
+
+
+def split_text(text: str, first_max_chars: int, max_chars: int) -> list[str]:
+    """Split a text in chunks to synthesize separately, a single one if it is short.
+
+    Chunks end at sentence boundaries when possible, since the TTS gives each chunk the
+    intonation of a complete utterance. Longer sentences are split at clauses.
+
+    Args:
+        text: To synthesize.
+        first_max_chars: Size of the first chunk, which sets the time to first audio.
+        max_chars: Size of the other chunks.
+    """
+    text = text.strip()
+    if len(text) <= first_max_chars:
+        return [text]
+
+    chunks: list[str] = []
+    for sentence in _SENTENCE_END.split(text):
+        for piece in _split_long(sentence, max_chars if chunks else first_max_chars):
+            # Only the first chunk is kept short.
+            limit = first_max_chars if len(chunks) == 1 else max_chars
+            if chunks and len(chunks[-1]) + 1 + len(piece) <= limit:
+                chunks[-1] += " " + piece
+            else:
+                chunks.append(piece)
+    return chunks
+
+
+async def stream_in_order(
+    first: AsyncIterator[bytes],
+    rest: list[Callable[[], Awaitable[AsyncIterator[bytes]]]],
+    max_concurrency: int,
+) -> AsyncIterator[bytes]:
+    """The audio of the chunks in order, each streamed as soon as its turn comes.
+
+    Args:
+        first: Audio of the first chunk, whose request already started, so that its
+            errors are raised to the caller.
+        rest: Start the requests of the other chunks.
+        max_concurrency: Requests running at once, including the first.
+
+    The audio of the chunks is closed when it isn't read until the end, e.g. when the
+    consumer stops or a chunk fails.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    queues: list[asyncio.Queue[bytes | BaseException | None]] = [
+        asyncio.Queue() for _ in range(1 + len(rest))
+    ]
+
+    async def produce(
+        i: int, start: Callable[[], Awaitable[AsyncIterator[bytes]]] | None
+    ):
+        audio = None
+        try:
+            async with semaphore:
+                audio = first if start is None else await start()
+                async for chunk in audio:
+                    queues[i].put_nowait(chunk)
+        except Exception as e:
+            queues[i].put_nowait(e)
+        finally:
+            queues[i].put_nowait(None)
+            if audio is not None:
+                await _aclose(audio)
+
+    # Created in order, and the semaphore wakes up its waiters in order.
+    producers = [
+        asyncio.create_task(produce(i, start), name="stream_in_order.produce()")
+        for i, start in enumerate([None, *rest])
+    ]
+    try:
+        for queue in queues:
+            while (chunk := await queue.get()) is not None:
+                if isinstance(chunk, BaseException):
+                    raise chunk
+                yield chunk
+    finally:
+        for producer in producers:
+            producer.cancel()
+        # They close their audio, the first one may have been cancelled before.
+        await asyncio.gather(*producers, return_exceptions=True)
+        await _aclose(first)
+
+
+def _wav_data_offset(header: bytes) -> int | None:
+    """Where the samples start, None if the header isn't complete yet.
+
+    Raises a ValueError if the samples aren't 16-bit mono PCM, the only format the
+    audio is handled in.
+    """
+    offset = 12
+    while offset + 8 <= len(header):
+        chunk_id = header[offset : offset + 4]
+        (size,) = struct.unpack_from("<I", header, offset + 4)
+        if chunk_id == b"fmt " and offset + 8 + 16 <= len(header):
+            _, channels, _, _, _, bits_per_sample = struct.unpack_from(
+                "<HHIIHH", header, offset + 8
+            )
+            if bits_per_sample != 16 or channels != 1:
+                raise ValueError(
+                    f"Unsupported WAV audio: {bits_per_sample}-bit with {channels} "
+                    "channels, expected 16-bit mono"
+                )
+        if chunk_id == b"data":
+            return offset + 8
+        offset += 8 + size + size % 2
+    return None
+
+
+async def wav_samples(
+    audio: AsyncIterator[bytes], keep_header: bool
+) -> AsyncIterator[bytes]:
+    """Remove the header of a WAV stream, so that streams can be concatenated.
+
+    Args:
+        audio: A WAV stream of 16-bit mono PCM. Passed through if it isn't one. Closed
+            with this one.
+        keep_header: Keep it, with the sizes marked as unknown, e.g. for the first
+            stream of a concatenation.
+    """
+    try:
+        buffer = b""
+        async for chunk in audio:
+            buffer += chunk
+            if len(buffer) < 12:
+                continue
+            if buffer[:4] != b"RIFF" or buffer[8:12] != b"WAVE":
+                break
+            offset = _wav_data_offset(buffer)
+            if offset is None and len(buffer) < _WAV_HEADER_MAX_BYTES:
+                continue
+            if offset is None:
+                break
+            header, buffer = bytearray(buffer[:offset]), buffer[offset:]
+            if keep_header:
+                struct.pack_into("<I", header, 4, WAV_UNKNOWN_SIZE)
+                struct.pack_into("<I", header, offset - 4, WAV_UNKNOWN_SIZE)
+                buffer = bytes(header) + buffer
+            break
+
+        if buffer:
+            yield buffer
+        async for chunk in audio:
+            yield chunk
+    finally:
+        await _aclose(audio)
@@ -0,0 +1,235 @@
+"""Encoding of the synthesized audio in the format the client asked for.
+
+The TTS providers send 16-bit PCM, raw or in a WAV stream: 768 kbit/s at 48kHz, a lot
+for clients on mobile data. Clients can ask for Ogg/Opus instead, about 64 kbit/s. The
+encoding runs in a dedicated thread pool, bounded like the Opus decoding of the audio
+sent by the clients, see libs/audio_ingress.py.
+"""
+
+import asyncio
+import struct
+import time
+from collections.abc import AsyncIterator
+from concurrent.futures import ThreadPoolExecutor
+from typing import Literal
+
+import numpy as np
+import sphn
+
+from backend import metrics as mt
+from backend.tts.chunking import WAV_UNKNOWN_SIZE, wav_samples
+from backend.typing import TTSOutputFormat
+
+MEDIA_TYPES: dict[TTSOutputFormat, str] = {
+    "pcm": "application/octet-stream",
+    "wav": "audio/wav",
+    "opus": "audio/ogg; codecs=opus",
+}
+# What the Accept header can ask for, with the format it means.
+_ACCEPTED_MEDIA_TYPES: dict[str, TTSOutputFormat] = {
+    "application/octet-stream": "pcm",
+    "audio/pcm": "pcm",
+    "audio/l16": "pcm",
+    "audio/wav": "wav",
+    "audio/x-wav": "wav",
+    "audio/wave": "wav",
+    "audio/ogg": "opus",
+    "audio/opus": "opus",
+}
+
+ENCODER_POOL_THREADS = 4
+# Encode jobs submitted to the pool at once, across all the requests.
+ENCODER_POOL_MAX_PENDING = 4 * ENCODER_POOL_THREADS
+# Opus only outputs whole frames, this much silence flushes the last one.
+FLUSH_SEC = 0.04
+
+_encoder_pool = ThreadPoolExecutor(
+    max_workers=ENCODER_POOL_THREADS, thread_name_prefix="opus_encoder"
+)
+_encoder_pool_slots = asyncio.Semaphore(ENCODER_POOL_MAX_PENDING)
+
+
+def negotiate_format(
+    requested: TTSOutputFormat | None, accept: str | None, default: TTSOutputFormat
+) -> TTSOutputFormat:
+    """The format to send, from the request field first, then from the Accept header.
+
+    Args:
+        requested: Explicitly requested in the body of the request.
+        accept: The Accept header, e.g. "audio/ogg, audio/wav;q=0.5".
+        default: When nothing supported is asked for, e.g. "*/*".
+    """
+    if requested is not None:
+        return requested
+    if not accept:
+        return default
+
+    best, best_quality = default, 0.0
+    for item in accept.split(","):
+        media_type, *params = [part.strip() for part in item.split(";")]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        output_format = _ACCEPTED_MEDIA_TYPES.get(media_type.lower())
+        if output_format is not None and quality > best_quality:
+            best, best_quality = output_format, quality
+    return best
+
+
+def wav_header(sample_rate: int) -> bytes:
+    """Of a mono 16-bit stream of unknown length."""
+    fmt = struct.pack("<HHIIHH", 1, 1, sample_rate, 2 * sample_rate, 2, 16)
+    return b"".join(
+        [
+            b"RIFF",
+            struct.pack("<I", WAV_UNKNOWN_SIZE),
+            b"WAVE",
+            b"fmt ",
+            struct.pack("<I", len(fmt)),
+            fmt,
+            b"data",
+            struct.pack("<I", WAV_UNKNOWN_SIZE),
+        ]
+    )
+
+
+def _to_float32(pcm_bytes: bytes) -> tuple[np.ndarray, bytes]:
+    """The samples of 16-bit PCM, and the byte of a sample split with the next chunk."""
+    even = len(pcm_bytes) - len(pcm_bytes) % 2
+    pcm = np.frombuffer(pcm_bytes[:even], dtype="<i2").astype(np.float32) / 32768
+    return pcm, pcm_bytes[even:]
+
+
+class _Downsampler:
+    def __init__(self, factor: int, half_width: int = 16):
+        """Streaming decimation by an integer factor, low-pass filtered against aliasing.
+
+        Args:
+            factor: Ratio of the input and output sample rates.
+            half_width: Of the filter, in output samples.
+        """
+        n = np.arange(-half_width * factor, half_width * factor + 1)
+        taps = np.sinc(n / factor) * np.hamming(len(n))
+        self.taps = (taps / taps.sum()).astype(np.float32)
+        self.factor = factor
+        self._history = np.zeros(len(self.taps) - 1, dtype=np.float32)
+        # Index, in the next chunk, of the next sample to keep.
+        self._phase = 0
+
+    def process(self, pcm: np.ndarray) -> np.ndarray:
+        padded = np.concatenate([self._history, pcm])
+        filtered = np.convolve(padded, self.taps, mode="valid")
+        out = filtered[self._phase :: self.factor]
+        self._phase = (self._phase - len(pcm)) % self.factor
+        self._history = padded[len(padded) - len(self._history) :]
+        return out.astype(np.float32)
+
+
+class OpusEncoder:
+    def __init__(self, sample_rate: int):
+        """Encodes 16-bit PCM to an Ogg/Opus stream, one instance per stream."""
+        self.writer = sphn.OpusStreamWriter(sample_rate)
+        self.sample_rate = sample_rate
+        # A sample split between two chunks.
+        self._odd_byte = b""
+
+    def _encode_timed(self, pcm: np.ndarray, submit_time: float) -> bytes:
+        start = time.perf_counter()
+        mt.TTS_ENCODE_QUEUE_WAIT.observe(start - submit_time)
+        opus_bytes = self.writer.append_pcm(pcm)
+        mt.TTS_ENCODE_SECONDS.labels(format="opus").inc(time.perf_counter() - start)
+        return opus_bytes
+
+    async def _encode(self, pcm: np.ndarray) -> bytes:
+        async with _encoder_pool_slots:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                _encoder_pool, self._encode_timed, pcm, time.perf_counter()
+            )
+
+    async def encode(self, pcm_bytes: bytes) -> bytes:
+        pcm, self._odd_byte = _to_float32(self._odd_byte + pcm_bytes)
+        if not pcm.size:
+            return b""
+        return await self._encode(pcm)
+
+    async def flush(self) -> bytes:
+        silence = np.zeros(int(self.sample_rate * FLUSH_SEC), dtype=np.float32)
+        return await self._encode(silence)
+
+
+async def encode_audio(
+    audio: AsyncIterator[bytes],
+    source_format: Literal["pcm", "wav"],
+    output_format: TTSOutputFormat,
+    sample_rate: int,
+) -> AsyncIterator[bytes]:
+    """Convert the audio of the provider to the format sent to the client.
+
+    Args:
+        audio: 16-bit mono PCM, raw or in a WAV stream.
+        source_format: Whether the audio is raw or in a WAV stream.
+        output_format: Negotiated with the client, see `negotiate_format()`.
+        sample_rate: Of the audio, it isn't resampled.
+    """
+    mt.TTS_OUTPUT_FORMATS.labels(format=output_format).inc()
+    if output_format == source_format:
+        async for chunk in audio:
+            yield chunk
+        return
+
+    samples = audio
+    if source_format == "wav":
+        samples = wav_samples(audio, keep_header=False)
+    if output_format == "pcm":
+        async for chunk in samples:
+            yield chunk
+    elif output_format == "wav":
+        yield wav_header(sample_rate)
+        async for chunk in samples:
+            yield chunk
+    else:
+        encoder = OpusEncoder(sample_rate)
+        async for chunk in samples:
+            if opus_bytes := await encoder.encode(chunk):
+                yield opus_bytes
+        if opus_bytes := await encoder.flush():
+            yield opus_bytes
+
+
+async def pcm_arrays(
+    audio: AsyncIterator[bytes],
+    source_format: Literal["pcm", "wav"],
+    sample_rate: int,
+    output_sample_rate: int,
+) -> AsyncIterator[np.ndarray]:
+    """The audio of the provider as float32 arrays, e.g. for the Opus stream of a session.
+
+    Args:
+        audio: 16-bit mono PCM, raw or in a WAV stream.
+        source_format: Whether the audio is raw or in a WAV stream.
+        sample_rate: Of the audio.
+        output_sample_rate: Of the arrays, sample_rate must be a multiple of it.
+    """
+    if sample_rate % output_sample_rate != 0:
+        raise ValueError(
+            f"Can't resample from {sample_rate}Hz to {output_sample_rate}Hz"
+        )
+    downsampler = None
+    if sample_rate != output_sample_rate:
+        downsampler = _Downsampler(sample_rate // output_sample_rate)
+    if source_format == "wav":
+        audio = wav_samples(audio, keep_header=False)
+
+    odd_byte = b""
+    async for chunk in audio:
+        pcm, odd_byte = _to_float32(odd_byte + chunk)
+        if downsampler is not None:
+            pcm = downsampler.process(pcm)
+        if pcm.size:
+            yield pcm
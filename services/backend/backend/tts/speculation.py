@@ -0,0 +1,207 @@
+"""Synthesize the suggested answers before the user picks one.
+
+Picking an answer only starts its synthesis, so the user waits for the whole TTS
+latency before hearing anything. In this mode, the first suggested answers of each
+generation are synthesized in the background as they stream out of the LLM. The audio
+is kept for a short while, so that the `/v1/tts/` request of the chosen answer is
+served immediately.
+
+Most of this work is wasted, since only one answer is picked, if any. It is bounded per
+session and for the whole process, and a generation that is superseded cancels the
+syntheses it started.
+
+These syntheses don't take the per-user TTS lock of the `/v1/tts/` route: the request
+of the picked answer would wait behind the guesses. With Gradium, a user can have up
+to `max_per_session` of them running besides their own request, which the concurrency
+quota of the provider must allow for.
+"""
+
+import asyncio
+import logging
+import time
+from collections.abc import Awaitable, Callable
+
+from backend import metrics as mt
+
+logger = logging.getLogger(__name__)
+
+
+class SpeculativeTTS:
+    def __init__(
+        self,
+        top_n: int,
+        max_per_session: int,
+        max_global: int,
+        ttl_sec: float,
+    ):
+        """The speculative syntheses of the whole process.
+
+        Args:
+            top_n: How many answers of each generation are synthesized, 0 disables it.
+            max_per_session: Syntheses running at once for a session, the others wait.
+            max_global: Syntheses running at once for the process. Past that, answers
+                aren't synthesized rather than queued, they'd likely be stale.
+            ttl_sec: How long the audio is kept for the user to pick the answer.
+        """
+        self.top_n = top_n
+        self.max_per_session = max_per_session
+        self.max_global = max_global
+        self.ttl_sec = ttl_sec
+        self.running = 0
+        # Audio by TTS cache key, a future while it is being synthesized.
+        self._results: dict[str, asyncio.Future[bytes]] = {}
+        self._expirations: dict[str, float] = {}
+        # Running syntheses that a request is waiting for.
+        self._taken: set[asyncio.Future[bytes]] = set()
+
+        self.hits = 0
+        self.misses = 0
+        self.started = 0
+        # Synthesized but never picked, or stopped before the end.
+        self.wasted = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.top_n > 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    @property
+    def wasted_ratio(self) -> float:
+        return self.wasted / self.started if self.started else 0.0
+
+    def session(self) -> "SpeculationSession":
+        return SpeculationSession(self)
+
+    async def take(self, key: str) -> bytes | None:
+        """The audio synthesized in advance, waiting for it if still running.
+
+        None if the answer wasn't synthesized in advance, or if that failed.
+        """
+        if not self.enabled:
+            return None
+        self._expire()
+        self._expirations.pop(key, None)
+        future = self._results.pop(key, None)
+        audio = None
+        if future is not None:
+            if future.done():
+                mt.TTS_SPECULATIONS.labels(outcome="used").inc()
+            else:
+                # Not cancelled anymore when its generation is superseded.
+                self._taken.add(future)
+            try:
+                audio = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+            except Exception:
+                pass  # Logged by the synthesis, the caller synthesizes it again.
+
+        if audio is None:
+            self.misses += 1
+            mt.TTS_SPECULATION_LOOKUPS.labels(result="miss").inc()
+        else:
+            self.hits += 1
+            mt.TTS_SPECULATION_LOOKUPS.labels(result="hit").inc()
+        return audio
+
+    def _start(self, key: str) -> asyncio.Future[bytes] | None:
+        """Reserve a global slot, None if there are none left or it already exists."""
+        self._expire()
+        if key in self._results or self.running >= self.max_global:
+            mt.TTS_SPECULATIONS.labels(outcome="skipped").inc()
+            return None
+        self.running += 1
+        self.started += 1
+        future = asyncio.get_running_loop().create_future()
+        self._results[key] = future
+        return future
+
+    def _finish(self, key: str, future: asyncio.Future[bytes]) -> None:
+        self.running -= 1
+        taken = future in self._taken
+        self._taken.discard(future)
+        if future.cancelled() or future.exception() is not None:
+            self.wasted += 1
+            mt.TTS_SPECULATIONS.labels(outcome="failed").inc()
+            if self._results.get(key) is future:
+                del self._results[key]
+        elif taken:
+            mt.TTS_SPECULATIONS.labels(outcome="used").inc()
+        else:
+            self._expirations[key] = time.monotonic() + self.ttl_sec
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        expired = [key for key, t in self._expirations.items() if t <= now]
+        for key in expired:
+            del self._expirations[key]
+            del self._results[key]
+            self.wasted += 1
+            mt.TTS_SPECULATIONS.labels(outcome="unused").inc()
+
+
+class SpeculationSession:
+    """The speculative syntheses of one session, see `SpeculativeTTS.session()`."""
+
+    def __init__(self, parent: SpeculativeTTS):
+        self.parent = parent
+        self._semaphore = asyncio.Semaphore(parent.max_per_session)
+        # With the future of their synthesis, once started.
+        self._tasks: dict[asyncio.Task, asyncio.Future[bytes] | None] = {}
+
+    def submit(
+        self, index: int, key: str, synthesize: Callable[[], Awaitable[bytes]]
+    ) -> None:
+        """Synthesize in the background the answer of this index, if among the top N.
+
+        Args:
+            index: Of the answer in its generation.
+            key: TTS cache key of the answer, as computed by the `/v1/tts/` route.
+            synthesize: Returns the whole audio of the answer.
+        """
+        if not self.parent.enabled or index >= self.parent.top_n:
+            return
+        task = asyncio.create_task(
+            self._run(key, synthesize), name="SpeculationSession._run()"
+        )
+        self._tasks[task] = None
+        task.add_done_callback(self._forget)
+
+    def supersede(self) -> None:
+        """Cancel the syntheses that didn't finish, e.g. when a new generation starts.
+
+        The audio already synthesized stays available until it expires, and the
+        syntheses that a request is waiting for continue.
+        """
+        for task, future in self._tasks.items():
+            if future is None or future not in self.parent._taken:
+                task.cancel()
+
+    def _forget(self, task: asyncio.Task) -> None:
+        del self._tasks[task]
+
+    async def _run(self, key: str, synthesize: Callable[[], Awaitable[bytes]]):
+        async with self._semaphore:
+            future = self.parent._start(key)
+            if future is None:
+                return
+            task = asyncio.current_task()
+            assert task is not None
+            self._tasks[task] = future
+            try:
+                future.set_result(await synthesize())
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as e:
+                logger.warning(f"Speculative synthesis failed: {e!r}")
+                future.set_exception(e)
+                # Retrieved here, in case no one takes it.
+                future.exception()
+            finally:
+                self.parent._finish(key, future)
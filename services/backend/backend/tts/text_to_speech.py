@@ -0,0 +1,282 @@
+"""Synthesis with the TTS provider, shared by the `/v1/tts/` route and the sessions."""
+
+import contextlib
+from logging import getLogger
+from typing import AsyncGenerator, AsyncIterator
+
+from fastapi import HTTPException
+
+from backend import metrics as mt
+from backend.kyutai_constants import (
+    GRADIUM_BASE_URL,
+    HTTP_KEEPALIVE_SEC,
+    HTTP_MAX_CONNECTIONS,
+    KYUTAI_API_KEY,
+    REDIS_HOST,
+    REDIS_MAX_CONNECTIONS,
+    REDIS_PORT,
+    TTS_CACHE_DIR,
+    TTS_CACHE_HOT_MAX_MB,
+    TTS_CACHE_MAX_MB,
+    TTS_CACHE_MAX_MB_PER_USER,
+    TTS_CHUNK_MAX_CHARS,
+    TTS_FIRST_CHUNK_MAX_CHARS,
+    TTS_IS_GRADIUM,
+    TTS_LOCK_TTL_SECONDS,
+    TTS_PREFETCH_NEXT_CHUNK,
+    TTS_SERVER,
+    TTS_SPECULATION_MAX_GLOBAL,
+    TTS_SPECULATION_MAX_PER_SESSION,
+    TTS_SPECULATION_TOP_N,
+    TTS_SPECULATION_TTL_SEC,
+    TTS_VOICE_ID,
+)
+from backend.libs.http_clients import (
+    PooledGradiumClient,
+    get_gradium_client,
+    get_httpx_client,
+)
+from backend.libs.redis_lock import make_lock_manager
+from backend.libs.tts_cache import TTSCache, tts_cache_key
+from backend.storage import UserData
+from backend.timer import Stopwatch
+from backend.tts.chunking import split_text, stream_in_order, wav_samples
+from backend.tts.speculation import SpeculativeTTS
+
+logger = getLogger(__name__)
+
+TTS_PROVIDER = "gradium" if TTS_IS_GRADIUM else "kyutai"
+# What the provider sends, it is converted to what the client asks for afterwards.
+if TTS_IS_GRADIUM:
+    TTS_SAMPLE_RATE, TTS_OUTPUT_FORMAT = 48000, "pcm"
+else:
+    TTS_SAMPLE_RATE, TTS_OUTPUT_FORMAT = 24000, "wav"
+
+TTS_MAX_TEXT_CHARS = 1000
+
+_tts_lock_manager = make_lock_manager(
+    REDIS_HOST, REDIS_PORT, REDIS_MAX_CONNECTIONS, TTS_LOCK_TTL_SECONDS
+)
+tts_cache = TTSCache(
+    TTS_CACHE_DIR,
+    max_bytes=int(TTS_CACHE_MAX_MB * 1e6),
+    max_bytes_per_user=int(TTS_CACHE_MAX_MB_PER_USER * 1e6),
+    hot_max_bytes=int(TTS_CACHE_HOT_MAX_MB * 1e6),
+)
+speculative_tts = SpeculativeTTS(
+    TTS_SPECULATION_TOP_N,
+    max_per_session=TTS_SPECULATION_MAX_PER_SESSION,
+    max_global=TTS_SPECULATION_MAX_GLOBAL,
+    ttl_sec=TTS_SPECULATION_TTL_SEC,
+)
+
+
+def gradium_client() -> PooledGradiumClient:
+    return get_gradium_client(
+        GRADIUM_BASE_URL, HTTP_MAX_CONNECTIONS, HTTP_KEEPALIVE_SEC
+    )
+
+
+async def get_available_voices(user_name: str) -> dict[str, tuple[str, str]]:
+    """Get available voices based on the TTS provider."""
+    if not TTS_IS_GRADIUM:
+        # For Kyutai TTS, return the configured voice with unknown language
+        return {TTS_VOICE_ID: (TTS_VOICE_ID, "unknown")}
+
+    client = gradium_client()
+    if "/" in user_name:
+        # Just as a safety precaution. I don't know if that can happen, but I don't
+        # want security issues and having custom voices leaking.
+        raise HTTPException(
+            status_code=400, detail="Username cannot contain '/' character"
+        )
+
+    voices = await client.voice_get(include_catalog=True)
+    # Return only catalog voices (built-in), format as {name: language}
+    result = {}
+    for voice in voices:
+        if voice.get("is_catalog", False):
+            if "de Gaulle" in voice["name"]:
+                continue
+            result[voice["name"]] = (voice["uid"], voice.get("language") or "unknown")
+        else:
+            # For custome voices, it's username/voice_name
+            if voice["name"].startswith(f"{user_name}/"):
+                result[voice["name"]] = (voice["uid"], "Custom voice")
+    return result
+
+
+async def get_voice_id(voice_name: str | None, user: UserData) -> str:
+    """The voice to use for the provider.
+
+    Args:
+        voice_name: Requested explicitly, otherwise the one in the user settings or
+            the default voice is used.
+        user: Whose settings and custom voices are used.
+    """
+    # Use voice from request if provided, otherwise use user's saved voice or default
+    if voice_name is not None:
+        list_of_voices = await get_available_voices(user.email)
+        if voice_name not in list_of_voices:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Voice '{voice_name}' is not available. Available voices: {', '.join(list_of_voices.keys())}",
+            )
+        return list_of_voices[voice_name][0]
+    elif user.user_settings.voice:
+        available_voices = await get_available_voices(user.email)
+        if user.user_settings.voice in available_voices:
+            return available_voices[user.user_settings.voice][0]
+        logger.warning(
+            f"The voice {user.user_settings.voice} does not exist. This should not happen."
+        )
+    return TTS_VOICE_ID
+
+
+def tts_lock(user_email: str) -> contextlib.AbstractAsyncContextManager | None:
+    """For `get_audio()`, Gradium limits the syntheses running at once per user."""
+    if not TTS_IS_GRADIUM:
+        return None
+    return _tts_lock_manager.acquire_lock(user_email, "tts")
+
+
+def validate_text(text: str) -> None:
+    if len(text) == 0:
+        raise HTTPException(status_code=400, detail="Text cannot be empty")
+    if len(text) > TTS_MAX_TEXT_CHARS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Text cannot be longer than {TTS_MAX_TEXT_CHARS} characters",
+        )
+
+
+def get_cache_key(voice_id: str, text: str) -> str:
+    return tts_cache_key(voice_id, text, TTS_SAMPLE_RATE, TTS_OUTPUT_FORMAT)
+
+
+async def start_synthesis(voice_id: str, text: str) -> AsyncIterator[bytes]:
+    """Start the synthesis, and return its audio as it is synthesized.
+
+    Long texts are synthesized in chunks, see tts/chunking.py. Errors of the request
+    of the first chunk are raised here rather than when iterating.
+    """
+    chunks = split_text(text, TTS_FIRST_CHUNK_MAX_CHARS, TTS_CHUNK_MAX_CHARS)
+    mt.TTS_CHUNKS.observe(len(chunks))
+    first = await _start_request(voice_id, chunks[0])
+    if len(chunks) == 1:
+        return first
+
+    def starter(chunk: str):
+        async def start() -> AsyncIterator[bytes]:
+            audio = await _start_request(voice_id, chunk)
+            return audio if TTS_IS_GRADIUM else wav_samples(audio, keep_header=False)
+
+        return start
+
+    if not TTS_IS_GRADIUM:
+        first = wav_samples(first, keep_header=True)
+    # A single request at a time, or the current one and the next.
+    max_concurrency = 2 if TTS_PREFETCH_NEXT_CHUNK else 1
+    return stream_in_order(
+        first, [starter(chunk) for chunk in chunks[1:]], max_concurrency
+    )
+
+
+async def _start_request(voice_id: str, text: str) -> AsyncIterator[bytes]:
+    """Send the request to the provider, and return its audio as it is synthesized."""
+    if TTS_IS_GRADIUM:
+        stream = await gradium_client().tts_stream(
+            {"voice_id": voice_id, "output_format": TTS_OUTPUT_FORMAT}, text=text
+        )
+        return stream.iter_bytes()
+
+    query = {
+        "text": text,
+        "voice": voice_id,
+        "temperature": 0.8,
+    }
+    client = get_httpx_client(HTTP_MAX_CONNECTIONS, HTTP_KEEPALIVE_SEC)
+    response = await client.send(
+        client.build_request(
+            "POST",
+            TTS_SERVER,
+            json=query,
+            headers={"kyutai-api-key": KYUTAI_API_KEY},
+        ),
+        stream=True,
+    )
+    if response.is_error:
+        await response.aread()
+        await response.aclose()
+    response.raise_for_status()
+
+    async def audio_generator() -> AsyncIterator[bytes]:
+        try:
+            async for chunk in response.aiter_bytes():
+                yield chunk
+        finally:
+            # Returns the connection to the pool, if the response was read whole.
+            await response.aclose()
+
+    return audio_generator()
+
+
+async def synthesize(voice_id: str, text: str) -> bytes:
+    """The whole audio of the text."""
+    return b"".join([chunk async for chunk in await start_synthesis(voice_id, text)])
+
+
+async def get_audio(
+    voice_id: str,
+    text: str,
+    user_email: str,
+    lock: contextlib.AbstractAsyncContextManager | None = None,
+) -> AsyncGenerator[bytes, None]:
+    """The audio of the text, from the cache, a speculative synthesis, or synthesized.
+
+    In the format of the provider. A new synthesis is streamed, and cached once complete.
+
+    Args:
+        voice_id: Of the provider, see `get_voice_id()`.
+        text: To synthesize, see `validate_text()`.
+        user_email: Whose cache quota the audio counts against.
+        lock: Held during a new synthesis, until its audio is read whole.
+    """
+    stopwatch = Stopwatch()
+    cache_key = get_cache_key(voice_id, text)
+    cached = await tts_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    speculated = await speculative_tts.take(cache_key)
+    if speculated is not None:
+        await tts_cache.put(cache_key, speculated, user_email)
+        return _iter_bytes(speculated)
+
+    if lock is None:
+        lock = contextlib.nullcontext()
+    await lock.__aenter__()
+    try:
+        chunks = await start_synthesis(voice_id, text)
+    except BaseException:
+        await lock.__aexit__(None, None, None)
+        raise
+
+    async def audio_generator() -> AsyncGenerator[bytes, None]:
+        try:
+            received = []
+            async for chunk in chunks:
+                if not received:
+                    mt.TTS_TIME_TO_FIRST_BYTE.labels(provider=TTS_PROVIDER).observe(
+                        stopwatch.time()
+                    )
+                received.append(chunk)
+                yield chunk
+            await tts_cache.put(cache_key, b"".join(received), user_email)
+        finally:
+            await lock.__aexit__(None, None, None)
+
+    return audio_generator()
+
+
+async def _iter_bytes(audio: bytes) -> AsyncGenerator[bytes, None]:
+    yield audio
@@ -57,10 +57,15 @@ class HealthStatus(pydantic.BaseModel):
         return self.stt_up and self.llm_up
 
 
+TTSOutputFormat = Literal["pcm", "wav", "opus"]
+
+
 class TTSRequest(pydantic.BaseModel):
     text: str
     message_id: uuid.UUID
     voice_name: str | None = None
+    # Takes precedence over the Accept header. By default, the format of the provider.
+    output_format: TTSOutputFormat | None = None
 
 
 class VoiceSelectionRequest(pydantic.BaseModel):
@@ -1,29 +1,36 @@
 import asyncio
+import contextlib
 import datetime as dt
 import math
+import pathlib
 import uuid
+from functools import partial
 from logging import getLogger
 from typing import Any, Literal, cast
 
 import numpy as np
 import pydantic_core
 import websockets
+from fastapi import HTTPException
 from fastrtc import (
     AdditionalOutputs,
     AsyncStreamHandler,
     CloseStream,
     audio_to_float32,
-    wait_for_item,
 )
-from pydantic import BaseModel
 
 import backend.openai_realtime_api_events as ora
 from backend import metrics as mt
+from backend.exceptions import make_ora_error
 from backend.kyutai_constants import (
     FRAME_TIME_SEC,
+    PAUSE_DETECTOR,
+    PAUSE_TIMELINES_DIR,
     SAMPLE_RATE,
     SAMPLES_PER_FRAME,
 )
+from backend.libs.additional_outputs import AdditionalOutputsTracker
+from backend.libs.debug_telemetry import DebugPlotBuffer, rms_amplitude
 from backend.llm.chatbot import Chatbot
 from backend.llm.llm_utils import (
     VLLMStream,
@@ -31,11 +38,25 @@ from backend.llm.llm_utils import (
 )
 from backend.quest_manager import Quest, QuestManager
 from backend.storage import UserData, get_user_data_from_storage
+from backend.stt.pause_detection import PauseObservation, make_pause_detector
+from backend.stt.pause_detection_eval import TimelineRecorder
 from backend.stt.speech_to_text import (
     SpeechToText,
     STTMarkerMessage,
 )
-from backend.timer import Stopwatch
+from backend.timer import PhasesStopwatch, Stopwatch, get_time
+from backend.tts.encoding import FLUSH_SEC, pcm_arrays
+from backend.tts.text_to_speech import (
+    TTS_OUTPUT_FORMAT,
+    TTS_SAMPLE_RATE,
+    get_audio,
+    get_cache_key,
+    get_voice_id,
+    speculative_tts,
+    synthesize,
+    tts_lock,
+    validate_text,
+)
 
 TTS_DEBUGGING_TEXT = None
 DEBUG_PLOT_HISTORY_SEC = 10.0
@@ -50,6 +71,21 @@ FURTHER_MESSAGES_TEMPERATURE = 0.3
 # A word from the ASR can still interrupt the bot.
 UNINTERRUPTIBLE_BY_VAD_TIME_SEC = 3
 
+# The phases of a turn, from the user's last word to the last suggested answer. The last
+# word is the last one received before the pause was detected, words transcribed during
+# the flush are timed by stt_tail, which is skipped if there are none.
+TURN_PHASES = [
+    "last_word",
+    "pause_detected",
+    "stt_tail",
+    "flush_done",
+    "llm_request_sent",
+    "llm_first_token",
+    "first_keyword",
+    "first_answer",
+    "last_answer",
+]
+
 logger = getLogger(__name__)
 
 HandlerOutput = (
@@ -64,15 +100,13 @@ class ErrorFromTTS(Exception):
     pass
 
 
-class GradioUpdate(BaseModel):
-    chat_history: list[dict[str, str]]
-    debug_dict: dict[str, Any]
-    debug_plot_data: list[dict]
-
-
 class UnmuteHandler(AsyncStreamHandler):
     def __init__(
-        self, user_email_or_data: str | UserData, local_time: dt.datetime
+        self,
+        user_email_or_data: str | UserData,
+        local_time: dt.datetime,
+        debug_plot: bool = False,
+        additional_outputs: bool = True,
     ) -> None:
         super().__init__(
             input_sample_rate=SAMPLE_RATE,
@@ -88,8 +122,22 @@ class UnmuteHandler(AsyncStreamHandler):
         self.stt_last_message_time: float = 0
         self.stt_end_of_flush_time: float | None = None
         self.stt_flush_timer = Stopwatch()
+        self.last_word_time: float | None = None
+        self.turn_phases = PhasesStopwatch(TURN_PHASES)
+        # Whether the next generation is the one answering the end of the user's turn,
+        # and not e.g. a regeneration because the keywords changed.
+        self.turn_waiting_for_generation = False
+        self.pause_detector = make_pause_detector(PAUSE_DETECTOR)
+        self.timeline_recorder = TimelineRecorder() if PAUSE_TIMELINES_DIR else None
 
         self.tts_voice: str | None = None  # Stored separately because TTS is restarted
+        # Of the `tts.request` being said, see `speak()`.
+        self.speaking_message_id: uuid.UUID | None = None
+        self.tts_speculation = speculative_tts.session()
+        # Resolved once per generation, by voice name, None for the user's voice.
+        self.tts_voice_ids: dict[str | None, str] = {}
+        # Of the answers synthesized in advance, resolved while the LLM starts.
+        self.speculation_voice: asyncio.Task[str | None] | None = None
         if isinstance(user_email_or_data, str):
             user_data = get_user_data_from_storage(user_email_or_data)
         else:
@@ -105,11 +153,26 @@ class UnmuteHandler(AsyncStreamHandler):
             "connection": {},
             "chatbot": {},
         }
-        self.debug_plot_data: list[dict] = []
+        # Opt-in, most sessions never look at it.
+        self.debug_plot_data = (
+            DebugPlotBuffer(DEBUG_PLOT_HISTORY_SEC) if debug_plot else None
+        )
         self.last_additional_output_update = self.audio_received_sec()
+        # Sent to the client about once per second, only the changes most of the time.
+        self.additional_outputs = (
+            AdditionalOutputsTracker() if additional_outputs else None
+        )
 
     async def cleanup(self):
+        self.tts_speculation.supersede()
+        if self.speculation_voice is not None:
+            self.speculation_voice.cancel()
         self.chatbot.user_data.save()
+        if self.timeline_recorder is not None and PAUSE_TIMELINES_DIR:
+            path = pathlib.Path(PAUSE_TIMELINES_DIR) / f"{uuid.uuid4()}.json"
+            # Can be large, not written on the event loop.
+            await asyncio.to_thread(self.timeline_recorder.save, path)
+            logger.info(f"Pause detection timeline saved to {path}")
 
     @property
     def stt(self) -> SpeechToText | None:
@@ -119,7 +182,7 @@ class UnmuteHandler(AsyncStreamHandler):
             return None
         return cast(Quest[SpeechToText], quest).get_nowait()
 
-    def get_gradio_update(self):
+    def get_gradio_update(self, tracker: AdditionalOutputsTracker):
         self.debug_dict["conversation_state"] = self.chatbot.conversation_state()
         self.debug_dict["connection"]["stt"] = self.stt.state() if self.stt else "none"
         self.debug_dict["connection"]["tts"] = "none"
@@ -129,14 +192,11 @@ class UnmuteHandler(AsyncStreamHandler):
         )
 
         return AdditionalOutputs(
-            GradioUpdate(
-                chat_history=[
-                    # Not trying to hide the system prompt, just making it less verbose
-                    m.model_dump(mode="json")
-                    for m in self.chatbot.current_conversation
-                ],
-                debug_dict=self.debug_dict,
-                debug_plot_data=[],
+            tracker.make_update(
+                # Not trying to hide the system prompt, just making it less verbose
+                self.chatbot.current_conversation,
+                self.debug_dict,
+                self.debug_plot_data,
             )
         )
 
@@ -173,6 +233,65 @@ class UnmuteHandler(AsyncStreamHandler):
         self.chatbot.select_response(message_content, id_)
         await self._generate_response()
 
+    async def speak(self, message: ora.TTSRequest) -> None:
+        """Say a text picked by the user, in the Opus stream of the session.
+
+        Unlike the `/v1/tts/` route, reuses the user data and voices of the session. A
+        new request stops the previous one, and drops its audio not sent yet.
+        """
+        mt.TTS_SESSION_REQUESTS.inc()
+        superseded = self.speaking_message_id
+        quest = Quest.from_run_step("tts", partial(self._speak_task, message))
+        # Cancels the previous request, which can't queue more audio after that.
+        await self.quest_manager.add(quest)
+        self.speaking_message_id = message.message_id
+        if superseded is not None:
+            # Done right away, its audio must not play before the new one.
+            self._drop_queued_audio(superseded)
+            await self.output_queue.put(ora.ResponseAudioDone(response_id=superseded))
+
+    async def _speak_task(self, message: ora.TTSRequest) -> None:
+        # Errors are reported to the client, they must not end the session.
+        try:
+            validate_text(message.text)
+            voice_id = await self._get_voice_id(message.voice_name)
+            email = self.chatbot.user_data.email
+            audio = await get_audio(voice_id, message.text, email, tts_lock(email))
+            # Closed when superseded, to release the lock right away.
+            async with contextlib.aclosing(audio):
+                async for pcm in pcm_arrays(
+                    audio, TTS_OUTPUT_FORMAT, TTS_SAMPLE_RATE, SAMPLE_RATE
+                ):
+                    await self.output_queue.put((SAMPLE_RATE, message.message_id, pcm))
+            # Opus only outputs whole frames, this flushes the last one.
+            silence = np.zeros(int(SAMPLE_RATE * FLUSH_SEC), dtype=np.float32)
+            await self.output_queue.put((SAMPLE_RATE, message.message_id, silence))
+            await self.output_queue.put(
+                ora.ResponseAudioDone(response_id=message.message_id)
+            )
+        except HTTPException as e:
+            await self.output_queue.put(
+                make_ora_error(type="invalid_request_error", message=str(e.detail))
+            )
+        except Exception as e:
+            logger.error(f"Text to speech failed: {e!r}", exc_info=True)
+            await self.output_queue.put(
+                make_ora_error(type="server_error", message="Text to speech failed")
+            )
+        finally:
+            if self.speaking_message_id == message.message_id:
+                self.speaking_message_id = None
+
+    def _drop_queued_audio(self, response_id: uuid.UUID) -> None:
+        """Remove the audio of a response from the output queue, keeping the rest."""
+        kept = []
+        while not self.output_queue.empty():
+            output = self.output_queue.get_nowait()
+            if not (isinstance(output, tuple) and output[1] == response_id):
+                kept.append(output)
+        for output in kept:
+            self.output_queue.put_nowait(output)
+
     async def _generate_response(self):
         # Empty message to signal we've started responding.
         # Do it here in the lock to avoid race conditions
@@ -181,10 +300,110 @@ class UnmuteHandler(AsyncStreamHandler):
         )
         await self.quest_manager.add(quest)
 
+    def _time_turn_phase(
+        self, phases: PhasesStopwatch, phase: str, t: float | None = None
+    ) -> None:
+        phases.time_phase_if_not_started(phase, t=t, check_previous=False)
+        if phases is self.turn_phases:
+            self.debug_dict["turn_phases"] = phases.relative_times()
+
+    def _start_turn_phases(self) -> None:
+        """At the end of the user's turn, when the pause is detected."""
+        self.turn_phases.reset()
+        self.turn_waiting_for_generation = False
+        if self.last_word_time is not None:
+            self._time_turn_phase(self.turn_phases, "last_word", t=self.last_word_time)
+        self._time_turn_phase(self.turn_phases, "pause_detected")
+
+    def _time_flush_done(self) -> None:
+        """When the STT is flushed, the next generation answers the turn."""
+        pause_time = self.turn_phases.phase_dict_partial()["pause_detected"]
+        if (
+            self.last_word_time is not None
+            and pause_time is not None
+            and self.last_word_time > pause_time
+        ):
+            self._time_turn_phase(self.turn_phases, "stt_tail", t=self.last_word_time)
+        self._time_turn_phase(self.turn_phases, "flush_done")
+        self.turn_waiting_for_generation = True
+
+    def _report_turn_phases(self, phases: PhasesStopwatch) -> None:
+        for phase, duration in phases.phase_durations().items():
+            if duration < 0:
+                # Never expected, the phases are timed in order.
+                logger.warning(f"Turn phase {phase} has a negative duration")
+                continue
+            mt.TURN_PHASE_DURATION.labels(phase=phase).observe(duration)
+
+        times = phases.phase_dict_partial()
+        last_word, first_answer = times["last_word"], times["first_answer"]
+        if last_word is not None and first_answer is not None:
+            mt.TURN_LATENCY.observe(first_answer - last_word)
+            logger.info(
+                "Turn latency %.2f sec: %s",
+                first_answer - last_word,
+                ", ".join(
+                    f"{p} +{d * 1000:.0f}ms"
+                    for p, d in phases.phase_durations().items()
+                ),
+            )
+
+    async def _get_voice_id(self, voice_name: str | None) -> str:
+        if voice_name not in self.tts_voice_ids:
+            self.tts_voice_ids[voice_name] = await get_voice_id(
+                voice_name, self.chatbot.user_data
+            )
+        return self.tts_voice_ids[voice_name]
+
+    async def _resolve_speculation_voice(self) -> str | None:
+        try:
+            return await self._get_voice_id(None)
+        except Exception as e:
+            logger.warning(f"Not synthesizing the answers in advance: {e!r}")
+            return None
+
+    def _speculate_tts(self, index: int, text: str) -> None:
+        """Synthesize a suggested answer before the user picks it, see tts/speculation.py
+
+        Doesn't wait for the voice, the answer is submitted once it is resolved.
+        """
+        if index >= speculative_tts.top_n or self.speculation_voice is None:
+            return
+
+        def submit(voice: asyncio.Task[str | None]) -> None:
+            if voice.cancelled() or (voice_id := voice.result()) is None:
+                return
+            self.tts_speculation.submit(
+                index, get_cache_key(voice_id, text), lambda: synthesize(voice_id, text)
+            )
+
+        self.speculation_voice.add_done_callback(submit)
+
     async def _generate_response_task(self):
         # Create timestamp at the start of response generation
         response_generation_timestamp = dt.datetime.now()
 
+        if self.turn_waiting_for_generation:
+            self.turn_waiting_for_generation = False
+            phases = self.turn_phases
+        else:
+            # Not the end of a turn, only the LLM phases will be timed.
+            phases = PhasesStopwatch(TURN_PHASES)
+
+        # The answers of the previous generation won't be shown anymore.
+        self.tts_speculation.supersede()
+        # Resolved again, the user may have changed them.
+        self.tts_voice_ids.clear()
+        if self.speculation_voice is not None:
+            self.speculation_voice.cancel()
+        self.speculation_voice = None
+        if speculative_tts.enabled:
+            # In the background, so that it doesn't delay the answers.
+            self.speculation_voice = asyncio.create_task(
+                self._resolve_speculation_voice(),
+                name="_resolve_speculation_voice()",
+            )
+
         self.chatbot.conversation_state_override = "bot_speaking"
         generating_message_i = len(self.chatbot.current_conversation)
 
@@ -224,7 +443,9 @@ class UnmuteHandler(AsyncStreamHandler):
 
         nb_keywords_sent = 0
         number_of_responses_sent = 0
+        last_answer_time: float | None = None
         logger.info("starting VLLM")
+        self._time_turn_phase(phases, "llm_request_sent")
         try:
             async for delta in llm.chat_completion(messages):
                 if not all_words:
@@ -232,6 +453,8 @@ class UnmuteHandler(AsyncStreamHandler):
                     logger.info(
                         "Got the first word after %.2f sec", llm_stopwatch.time()
                     )
+                    mt.VLLM_TTFT.observe(llm_stopwatch.time())
+                    self._time_turn_phase(phases, "llm_first_token")
 
                 # Logging and monitoring
                 mt.VLLM_RECV_WORDS.inc()
@@ -244,6 +467,7 @@ class UnmuteHandler(AsyncStreamHandler):
                     for i, keyword in enumerate(json_decoded["suggested_keywords"]):
                         if i < nb_keywords_sent:
                             continue
+                        self._time_turn_phase(phases, "first_keyword")
                         await self.output_queue.put(
                             ora.OneKeyword(
                                 content=keyword.strip(),
@@ -257,6 +481,8 @@ class UnmuteHandler(AsyncStreamHandler):
                     for i, answer in enumerate(json_decoded["suggested_answers"]):
                         if i < number_of_responses_sent:
                             continue
+                        self._time_turn_phase(phases, "first_answer")
+                        last_answer_time = get_time()
                         await self.output_queue.put(
                             ora.OneResponse(
                                 content=answer.strip(),
@@ -264,9 +490,13 @@ class UnmuteHandler(AsyncStreamHandler):
                                 index=number_of_responses_sent,
                             )
                         )
+                        self._speculate_tts(number_of_responses_sent, answer.strip())
                         number_of_responses_sent += 1
 
             logger.info("loop done")
+            if last_answer_time is not None:
+                self._time_turn_phase(phases, "last_answer", t=last_answer_time)
+            self._report_turn_phases(phases)
 
         except asyncio.CancelledError:
             mt.VLLM_INTERRUPTS.inc()
@@ -309,16 +539,24 @@ class UnmuteHandler(AsyncStreamHandler):
         # the process is busy with something else, which is bad.
         self.debug_dict["last_receive_time"] = self.audio_received_sec()
         float_audio = audio_to_float32(array)
+        rms = rms_amplitude(float_audio)
         self.debug_dict["chatbot"]["state_override"] = (
             self.chatbot.conversation_state_override
         )
-        self.debug_plot_data.append(
-            {
-                "t": self.audio_received_sec(),
-                "amplitude": float(np.sqrt((float_audio**2).mean())),
-                "pause_prediction": stt.pause_prediction.value,
-            }
-        )
+        if self.debug_plot_data is not None:
+            self.debug_plot_data.append(
+                t=self.audio_received_sec(),
+                amplitude=rms,
+                pause_prediction=stt.pause_prediction.value,
+            )
+
+        if (
+            self.additional_outputs is not None
+            and self.last_additional_output_update < self.audio_received_sec() - 1
+        ):
+            # Don't update the debug dict too often for performance reasons
+            self.last_additional_output_update = self.audio_received_sec()
+            await self.output_queue.put(self.get_gradio_update(self.additional_outputs))
 
         if self.chatbot.conversation_state() == "bot_speaking":
             # Periodically update this not to trigger the "long silence" accidentally.
@@ -328,9 +566,18 @@ class UnmuteHandler(AsyncStreamHandler):
             self.debug_dict["timing"] = {}
 
         await stt.send_audio(array)
+        if self.timeline_recorder is not None:
+            # At the end of the frame, as seen by `determine_pause` below.
+            self.timeline_recorder.add_frame(
+                t=stt.sent_samples / self.input_sample_rate,
+                dt=len(float_audio) / self.input_sample_rate,
+                rms=rms,
+                pause_prediction=stt.pause_prediction.value,
+            )
         if self.stt_end_of_flush_time is None:
-            if self.determine_pause():
+            if self.determine_pause(float_audio, rms):
                 logger.info("Pause detected")
+                self._start_turn_phases()
                 await self.output_queue.put(ora.InputAudioBufferSpeechStopped())
 
                 self.stt_end_of_flush_time = stt.current_time + stt.delay_sec
@@ -354,9 +601,10 @@ class UnmuteHandler(AsyncStreamHandler):
                 logger.info(
                     "Flushing finished, took %.1f ms, RTF: %.1f", elapsed * 1000, rtf
                 )
+                self._time_flush_done()
                 await self._generate_response()
 
-    def determine_pause(self) -> bool:
+    def determine_pause(self, audio: np.ndarray, rms: float) -> bool:
         stt = self.stt
         if stt is None:
             logger.info("No STT instance, not determining pause.")
@@ -370,12 +618,20 @@ class UnmuteHandler(AsyncStreamHandler):
         time_since_last_message = (
             stt.sent_samples / self.input_sample_rate
         ) - self.stt_last_message_time
+        # When the STT lags behind, words arrive late, don't mistake that for silence.
+        time_since_last_message -= stt.lag_monitor.excess_lag_sec
         self.debug_dict["time_since_last_message"] = time_since_last_message
-
-        if time_since_last_message > 2.5:
-            return True
-
-        if stt.pause_prediction.value > 0.6:
+        self.debug_dict["stt_lag"] = stt.lag_monitor.lag_sec
+
+        observation = PauseObservation(
+            dt=len(audio) / self.input_sample_rate,
+            time_since_last_word=time_since_last_message,
+            pause_prediction=stt.pause_prediction.value,
+            rms=rms,
+            audio=audio,
+        )
+        if self.pause_detector.update(observation):
+            self.pause_detector.reset()
             self.debug_dict["timing"]["pause_detection"] = time_since_last_message
             logger.info(
                 f"Pause detected, pause_prediction: {stt.pause_prediction.value:.2f} time since last message: {time_since_last_message:.2f} sec"
@@ -391,23 +647,16 @@ class UnmuteHandler(AsyncStreamHandler):
 
     async def emit(  # pyright: ignore[reportIncompatibleMethodOverride]
         self,
-    ) -> HandlerOutput | None:
-        output_queue_item = await wait_for_item(self.output_queue)
-
-        if output_queue_item is not None:
-            return output_queue_item
-        else:
-            if self.last_additional_output_update < self.audio_received_sec() - 1:
-                # If we have nothing to emit, at least update the debug dict.
-                # Don't update too often for performance reasons
-                self.last_additional_output_update = self.audio_received_sec()
-                return self.get_gradio_update()
-            else:
-                return None
+    ) -> HandlerOutput:
+        """Wait for the next output, there is no timeout so idle sessions cost nothing."""
+        return await self.output_queue.get()
 
     def copy(self):
         return UnmuteHandler(
-            self.chatbot.user_data, self.chatbot.user_data.conversations[-1].start_time
+            self.chatbot.user_data,
+            self.chatbot.user_data.conversations[-1].start_time,
+            debug_plot=self.debug_plot_data is not None,
+            additional_outputs=self.additional_outputs is not None,
         )
 
     async def __aenter__(self) -> None:
@@ -438,6 +687,15 @@ class UnmuteHandler(AsyncStreamHandler):
         # We want to be sure to have the STT before starting anything.
         await quest.get()
 
+    async def shutdown_stt(self):
+        """Close the STT stream, e.g. while detached, `start_up_stt()` opens a new one."""
+        await self.quest_manager.remove("stt")
+        # These are in the time of the closed stream. A flush in progress is dropped,
+        # the words it was waiting for won't come.
+        self.stt_end_of_flush_time = None
+        self.stt_last_message_time = 0
+        self.pause_detector.reset()
+
     async def _stt_loop(self, stt: SpeechToText):
         try:
             async for data in stt:
@@ -459,8 +717,15 @@ class UnmuteHandler(AsyncStreamHandler):
                     continue
 
                 logger.info("Will add stt message to chat")
+                if self.timeline_recorder is not None:
+                    self.timeline_recorder.add_word(
+                        arrival_t=stt.sent_samples / self.input_sample_rate,
+                        start_time=data.start_time,
+                        text=data.text,
+                    )
 
                 self.stt_last_message_time = data.start_time
+                self.last_word_time = get_time()
                 is_new_message = self.add_chat_message_delta(data.text, "user")
                 if self.chatbot.conversation_state_override == "waiting_for_user":
                     self.chatbot.conversation_state_override = None
@@ -483,7 +748,9 @@ class UnmuteHandler(AsyncStreamHandler):
             # Clear any audio queued up by FastRTC's emit().
             # Not sure under what circumstatnces this is None.
             self._clear_queue()
-        self.output_queue = asyncio.Queue()  # Clear our own queue too
+        # Clear our own queue too, in place because the emit loop is waiting on it.
+        while not self.output_queue.empty():
+            self.output_queue.get_nowait()
 
         await self.output_queue.put(ora.UnmuteInterruptedByVAD())
 
@@ -0,0 +1,101 @@
+"""Benchmark of the CPU used by idle sessions, waiting for something to send.
+
+Runs `emit_loop()` for many connected sessions that have nothing to send, and compares
+it with the previous loop, which polled the handler's queue with a timeout.
+
+Run with `uv run python benchmarks/bench_idle_sessions.py --sessions 1000 5000`.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+from fastapi.websockets import WebSocketState
+from fastrtc import wait_for_item
+
+# The backend reads its configuration from the environment at import time.
+os.environ.setdefault("STT_IS_GRADIUM", "false")
+os.environ.setdefault("KYUTAI_STT_URL", "ws://localhost")
+os.environ.setdefault("TTS_IS_GRADIUM", "false")
+os.environ.setdefault("TTS_SERVER", "http://localhost")
+os.environ.setdefault("KYUTAI_LLM_API_KEY", "")
+os.environ.setdefault("KYUTAI_LLM_URL", "http://localhost")
+os.environ.setdefault("KYUTAI_LLM_MODEL", "")
+os.environ.setdefault("KYUTAI_USERS_DATA_PATH", tempfile.mkdtemp())
+
+import backend.libs.websockets as ws  # noqa: E402
+from backend.libs.sessions import Session  # noqa: E402
+from backend.unmute_handler import UnmuteHandler  # noqa: E402
+
+
+class FakeWebSocket:
+    application_state = WebSocketState.CONNECTED
+    client_state = WebSocketState.CONNECTED
+
+
+class IdleHandler:
+    def __init__(self):
+        self.output_queue = asyncio.Queue()
+
+    emit = UnmuteHandler.emit
+
+
+async def polling_emit_loop(websocket: FakeWebSocket, session: Session):
+    """The waiting part of the previous `emit_loop()` and `UnmuteHandler.emit()`."""
+    emit_queue = asyncio.Queue()
+    while True:
+        if (
+            websocket.application_state == WebSocketState.DISCONNECTED
+            or websocket.client_state == WebSocketState.DISCONNECTED
+        ):
+            raise RuntimeError("Disconnected")
+        try:
+            emit_queue.get_nowait()
+        except asyncio.QueueEmpty:
+            # The debug updates are skipped, they need incoming audio anyway.
+            await wait_for_item(session.handler.output_queue)
+
+
+async def run(loop_name: str, n_sessions: int, duration: float):
+    emit_loop = polling_emit_loop if loop_name == "polling" else ws.emit_loop
+    tasks = [
+        asyncio.create_task(emit_loop(FakeWebSocket(), Session(IdleHandler(), "")))  # type: ignore
+        for _ in range(n_sessions)
+    ]
+    # Let every session start waiting before measuring.
+    await asyncio.sleep(0.5)
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    await asyncio.sleep(duration)
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+
+    assert not any(task.done() for task in tasks)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    print(
+        f"{loop_name:<8} sessions={n_sessions:<5} "
+        f"cpu={cpu / wall:.3f} cores, "
+        f"{cpu / wall / n_sessions * 1e6:.1f}us per second per session"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1000, 5000])
+    parser.add_argument("--duration", type=float, default=5.0)
+    args = parser.parse_args()
+
+    logging.getLogger(ws.__name__).setLevel(logging.WARNING)
+    for n_sessions in args.sessions:
+        for loop_name in ["polling", "event"]:
+            asyncio.run(run(loop_name, n_sessions, args.duration))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Benchmark of how long a waiter takes to get a lock after it is released.
+
+A holder keeps the lock of a user for a random time, like a session that ends, and a
+waiter tries to acquire it meanwhile, like the user reopening the app. We measure the
+time from the release to the acquisition, comparing the previous exponential backoff
+polling with `RedisLockManager`, which is woken up by the release.
+
+Uses fakeredis by default, pass `--redis-url redis://localhost:6379` for a real server.
+
+Run with `uv run python benchmarks/bench_lock_reacquire.py --trials 200`.
+"""
+
+import argparse
+import asyncio
+import time
+
+import fakeredis
+import numpy as np
+import redis.asyncio as aioredis
+
+from backend.libs.redis_lock import RedisLockManager
+
+
+async def polling_acquire(client: aioredis.Redis, lock_key: str) -> bool:
+    """How RedisLockManager waited for a lock before, minus the release."""
+    max_retries = 7
+    base_delay = 0.1
+    max_delay = 4.0
+    for attempt in range(max_retries):
+        if await client.set(lock_key, "1", nx=True, ex=30):
+            return True
+        await asyncio.sleep(min(base_delay * (2**attempt), max_delay))
+    return False
+
+
+async def trial(
+    manager: RedisLockManager,
+    mode: str,
+    user_id: str,
+    hold_sec: float,
+    latencies: list[float],
+):
+    released_at = None
+
+    async def hold():
+        nonlocal released_at
+        async with manager.acquire_lock(user_id, "stt"):
+            await asyncio.sleep(hold_sec)
+        released_at = time.perf_counter()
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0.01)
+    if mode == "polling":
+        acquired = await polling_acquire(manager.client, f"stt:lock:{user_id}")
+        assert acquired, "Gave up waiting"
+    else:
+        async with manager.acquire_lock(user_id, "stt"):
+            pass
+    acquired_at = time.perf_counter()
+    await holder
+    assert released_at is not None
+    latencies.append(acquired_at - released_at)
+
+
+async def run(client: aioredis.Redis, mode: str, n_trials: int, max_hold_sec: float):
+    manager = RedisLockManager(client, lock_ttl_seconds=30, acquire_timeout_sec=30)
+    rng = np.random.default_rng(0)
+    latencies: list[float] = []
+    await asyncio.gather(
+        *(
+            trial(
+                manager, mode, f"{mode}-{i}", rng.uniform(0.05, max_hold_sec), latencies
+            )
+            for i in range(n_trials)
+        )
+    )
+    ms = np.array(latencies) * 1000
+    print(
+        f"{mode:<8} trials={n_trials:<4} release->acquire "
+        f"p50={np.percentile(ms, 50):.1f}ms p90={np.percentile(ms, 90):.1f}ms "
+        f"p99={np.percentile(ms, 99):.1f}ms max={ms.max():.1f}ms"
+    )
+
+
+async def main_async(args):
+    if args.redis_url:
+        client = aioredis.from_url(args.redis_url)
+    else:
+        client = fakeredis.FakeAsyncRedis()
+    for mode in ["polling", "notify"]:
+        await run(client, mode, args.trials, args.max_hold)
+    await client.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--trials", type=int, default=200)
+    parser.add_argument("--max-hold", type=float, default=3.0)
+    parser.add_argument("--redis-url", default=None)
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Benchmark of the Opus decoding of the client audio with many concurrent sessions.
+
+Every session receives one Ogg/Opus packet every 20ms, like the frontend sends, and we
+measure the time from reception to decoded PCM, comparing a thread hop per packet
+(`asyncio.to_thread`) with `OpusDecoder`.
+
+Run with `uv run python benchmarks/bench_opus_ingress.py --sessions 100 200`.
+"""
+
+import argparse
+import asyncio
+import time
+
+import numpy as np
+import sphn
+
+from backend.libs.audio_ingress import OpusDecoder
+
+SAMPLE_RATE = 24000
+PACKET_SEC = 0.02
+
+
+def make_packets(duration_sec: float) -> list[bytes]:
+    t = np.arange(int(duration_sec * SAMPLE_RATE)) / SAMPLE_RATE
+    audio = (0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+    writer = sphn.OpusStreamWriter(SAMPLE_RATE)
+    packets = []
+    frame_size = int(PACKET_SEC * SAMPLE_RATE)
+    for i in range(0, len(audio), frame_size):
+        opus_bytes = writer.append_pcm(audio[i : i + frame_size])
+        if opus_bytes:
+            packets.append(opus_bytes)
+    return packets
+
+
+async def session(packets: list[bytes], mode: str, latencies: list[float]):
+    if mode == "to_thread":
+        reader = sphn.OpusStreamReader(SAMPLE_RATE)
+
+        async def decode(opus_bytes: bytes) -> np.ndarray:
+            return await asyncio.to_thread(reader.append_bytes, opus_bytes)
+    else:
+        decode = OpusDecoder(SAMPLE_RATE).decode
+
+    # Spread the sessions over the packet interval, like real clients.
+    await asyncio.sleep(np.random.uniform(0, PACKET_SEC))
+    next_time = time.perf_counter()
+    for opus_bytes in packets:
+        next_time += PACKET_SEC
+        received = time.perf_counter()
+        await decode(opus_bytes)
+        latencies.append(time.perf_counter() - received)
+        await asyncio.sleep(max(0.0, next_time - time.perf_counter()))
+
+
+async def run(n_sessions: int, mode: str, packets: list[bytes]):
+    latencies: list[float] = []
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    await asyncio.gather(
+        *(session(packets, mode, latencies) for _ in range(n_sessions))
+    )
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    ms = np.array(latencies) * 1000
+    print(
+        f"{mode:<10} sessions={n_sessions:<4} "
+        f"latency p50={np.percentile(ms, 50):.3f}ms p99={np.percentile(ms, 99):.3f}ms "
+        f"max={ms.max():.1f}ms cpu={cpu / wall:.2f} cores"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sessions", type=int, nargs="+", default=[100, 200])
+    parser.add_argument("--duration", type=float, default=5.0)
+    args = parser.parse_args()
+
+    packets = make_packets(args.duration)
+    for n_sessions in args.sessions:
+        for mode in ["to_thread", "ingress"]:
+            asyncio.run(run(n_sessions, mode, packets))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Benchmark of the CPU cost of the websocket receive loop, per session.
+
+Feeds a few seconds of client audio events per session to `receive_loop()`, as fast as
+possible, with the JSON fast path, with full pydantic validation of every event, and
+with binary frames. The handler drops the audio, so this is the cost of parsing and
+Opus decoding only. A session sends 50 events per second, so the CPU used per session
+is 50 times the cost per event.
+
+Run with `uv run python benchmarks/bench_receive_loop.py`.
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import logging
+import os
+import tempfile
+import time
+
+import numpy as np
+import sphn
+
+# The backend reads its configuration from the environment at import time.
+os.environ.setdefault("STT_IS_GRADIUM", "false")
+os.environ.setdefault("KYUTAI_STT_URL", "ws://localhost")
+os.environ.setdefault("TTS_IS_GRADIUM", "false")
+os.environ.setdefault("TTS_SERVER", "http://localhost")
+os.environ.setdefault("KYUTAI_LLM_API_KEY", "")
+os.environ.setdefault("KYUTAI_LLM_URL", "http://localhost")
+os.environ.setdefault("KYUTAI_LLM_MODEL", "")
+os.environ.setdefault("KYUTAI_USERS_DATA_PATH", tempfile.mkdtemp())
+
+import backend.libs.websockets as ws  # noqa: E402
+from backend.binary_audio import INPUT_AUDIO  # noqa: E402
+from backend.exceptions import WebSocketClosedError  # noqa: E402
+from backend.libs.sessions import Session  # noqa: E402
+
+SAMPLE_RATE = 24000
+PACKET_SEC = 0.02
+
+
+def make_packets(duration_sec: float) -> list[bytes]:
+    t = np.arange(int(duration_sec * SAMPLE_RATE)) / SAMPLE_RATE
+    audio = (0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+    writer = sphn.OpusStreamWriter(SAMPLE_RATE)
+    packets = []
+    frame_size = int(PACKET_SEC * SAMPLE_RATE)
+    for i in range(0, len(audio), frame_size):
+        opus_bytes = writer.append_pcm(audio[i : i + frame_size])
+        if opus_bytes:
+            packets.append(opus_bytes)
+    return packets
+
+
+class FakeWebSocket:
+    def __init__(self, messages: list[dict]):
+        self.messages = iter(messages)
+
+    async def receive(self) -> dict:
+        return next(self.messages, {"type": "websocket.disconnect", "code": 1000})
+
+
+class FakeHandler:
+    async def receive(self, frame):
+        pass
+
+
+def make_messages(packets: list[bytes], mode: str) -> list[dict]:
+    if mode == "binary":
+        return [
+            {"type": "websocket.receive", "bytes": bytes([INPUT_AUDIO]) + packet}
+            for packet in packets
+        ]
+    return [
+        {
+            "type": "websocket.receive",
+            "text": json.dumps(
+                {
+                    "type": "input_audio_buffer.append",
+                    "audio": base64.b64encode(packet).decode(),
+                }
+            ),
+        }
+        for packet in packets
+    ]
+
+
+async def run_session(messages: list[dict]):
+    try:
+        await ws.receive_loop(FakeWebSocket(messages), Session(FakeHandler(), ""))  # type: ignore
+    except WebSocketClosedError:
+        pass
+
+
+def bench(packets: list[bytes], mode: str, n_sessions: int):
+    parse_audio_append = ws.parse_audio_append
+    if mode == "validate":
+        ws.parse_audio_append = lambda text: None
+    messages = make_messages(packets, mode)
+
+    async def run():
+        await asyncio.gather(*(run_session(messages) for _ in range(n_sessions)))
+
+    start = time.process_time()
+    asyncio.run(run())
+    cpu = time.process_time() - start
+    ws.parse_audio_append = parse_audio_append
+
+    per_event = cpu / (n_sessions * len(messages))
+    print(
+        f"{mode:<10} {per_event * 1e6:6.1f}us per event, "
+        f"{per_event / PACKET_SEC:.2%} of a core per session"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=2.0)
+    args = parser.parse_args()
+
+    # Every session logs its disconnection.
+    logging.getLogger(ws.__name__).setLevel(logging.WARNING)
+    packets = make_packets(args.duration)
+    for mode in ["validate", "fast_path", "binary"]:
+        bench(packets, mode, args.sessions)
+
+
+if __name__ == "__main__":
+    main()
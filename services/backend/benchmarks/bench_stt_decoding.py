@@ -0,0 +1,101 @@
+"""Benchmark of the STT message decoding, in messages decoded per second per core.
+
+Compares the full pydantic validation of every message against the fast path that
+dispatches on the `type` tag first.
+
+Run with `uv run python benchmarks/bench_stt_decoding.py`.
+"""
+
+import json
+import os
+import tempfile
+import time
+
+import msgpack
+
+# The backend reads its configuration from the environment at import time.
+os.environ.setdefault("STT_IS_GRADIUM", "false")
+os.environ.setdefault("KYUTAI_STT_URL", "ws://localhost")
+os.environ.setdefault("TTS_IS_GRADIUM", "false")
+os.environ.setdefault("TTS_SERVER", "http://localhost")
+os.environ.setdefault("KYUTAI_LLM_API_KEY", "")
+os.environ.setdefault("KYUTAI_LLM_URL", "http://localhost")
+os.environ.setdefault("KYUTAI_LLM_MODEL", "")
+os.environ.setdefault("KYUTAI_USERS_DATA_PATH", tempfile.mkdtemp())
+
+from backend.stt.speech_to_text import (  # noqa: E402
+    GradiumSTTMessageAdapter,
+    STTMessageAdapter,
+    decode_gradium_stt_message,
+    decode_kyutai_stt_message,
+)
+
+N_MESSAGES = 200_000
+
+
+def kyutai_messages() -> list[bytes]:
+    # Roughly what one second of speech looks like: 12.5 steps and a few words.
+    step = {"type": "Step", "step_idx": 0, "prs": [0.1, 0.2, 0.3, 0.4]}
+    word = {"type": "Word", "text": "hello", "start_time": 1.23}
+    end_word = {"type": "EndWord", "stop_time": 1.5}
+    messages = [step] * 25 + [word, end_word] * 5
+    return [msgpack.packb(m, use_bin_type=True) for m in messages]  # type: ignore
+
+
+def gradium_messages() -> list[str]:
+    vad = [{"horizon_s": h, "inactivity_prob": 0.1} for h in (0.5, 1.0, 2.0)]
+    step = {
+        "type": "step",
+        "vad": vad,
+        "step_idx": 0,
+        "step_duration_s": 0.08,
+        "total_duration_s": 1.0,
+    }
+    text = {"type": "text", "text": "hello", "start_s": 1.23}
+    end_text = {"type": "end_text", "stop_s": 1.5}
+    messages = [step] * 25 + [text, end_text] * 5
+    return [json.dumps(m) for m in messages]
+
+
+def bench(name: str, raw_messages: list, decode) -> float:
+    n_rounds = N_MESSAGES // len(raw_messages)
+    start = time.process_time()
+    for _ in range(n_rounds):
+        for raw in raw_messages:
+            decode(raw)
+    elapsed = time.process_time() - start
+    rate = n_rounds * len(raw_messages) / elapsed
+    print(f"{name:<24} {rate:>12,.0f} msg/s/core")
+    return rate
+
+
+def main():
+    kyutai = kyutai_messages()
+    slow = bench(
+        "kyutai (pydantic)",
+        kyutai,
+        lambda m: STTMessageAdapter.validate_python(msgpack.unpackb(m)),
+    )
+    fast = bench(
+        "kyutai (fast path)",
+        kyutai,
+        lambda m: decode_kyutai_stt_message(msgpack.unpackb(m)),
+    )
+    print(f"speedup: {fast / slow:.1f}x\n")
+
+    gradium = gradium_messages()
+    slow = bench(
+        "gradium (pydantic)",
+        gradium,
+        lambda m: GradiumSTTMessageAdapter.validate_python(json.loads(m)),
+    )
+    fast = bench(
+        "gradium (fast path)",
+        gradium,
+        lambda m: decode_gradium_stt_message(json.loads(m)),
+    )
+    print(f"speedup: {fast / slow:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Benchmark of the time to first audio of long texts, synthesized whole or in chunks.
+
+A stand-in for the Kyutai TTS server, in a thread, processes the whole text before
+sending audio, `--ms-per-char` per character, then sends a WAV header and 10ms of
+audio per character, faster than real time. We measure when the first and the last
+byte of audio reach the caller, for texts of increasing length, with and without
+prefetching the next chunk.
+
+Run with `uv run python benchmarks/bench_tts_chunking.py`.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+
+PORT = 8767
+
+# The backend reads its configuration from the environment at import time.
+os.environ.setdefault("STT_IS_GRADIUM", "false")
+os.environ.setdefault("KYUTAI_STT_URL", "ws://localhost")
+os.environ["TTS_IS_GRADIUM"] = "false"
+os.environ["TTS_SERVER"] = f"http://127.0.0.1:{PORT}/tts"
+os.environ.setdefault("KYUTAI_API_KEY", "")
+os.environ.setdefault("KYUTAI_LLM_API_KEY", "")
+os.environ.setdefault("KYUTAI_LLM_URL", "http://localhost")
+os.environ.setdefault("KYUTAI_LLM_MODEL", "")
+os.environ.setdefault("KYUTAI_USERS_DATA_PATH", tempfile.mkdtemp())
+
+import backend.tts.text_to_speech as text_to_speech  # noqa: E402
+from backend.libs.http_clients import close_http_clients  # noqa: E402
+from backend.tts.encoding import wav_header  # noqa: E402
+
+SENTENCE = "This is one of the sentences of a rather long message, to be read aloud."
+# 10ms of 24kHz 16-bit audio.
+BYTES_PER_CHAR = 480
+
+
+def start_tts_server(ms_per_char: float):
+    app = FastAPI()
+
+    @app.post("/tts")
+    async def tts(body: dict):
+        text = body["text"]
+
+        async def wav():
+            await asyncio.sleep(len(text) * ms_per_char / 1000)
+            yield wav_header(24000)
+            for _ in range(0, len(text), 10):
+                await asyncio.sleep(0.01)
+                yield b"\0" * BYTES_PER_CHAR * 10
+
+        return StreamingResponse(wav(), media_type="audio/wav")
+
+    server = uvicorn.Server(uvicorn.Config(app, port=PORT, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+
+
+async def run(mode: str, lengths: list[int]):
+    first_chunk_max_chars = text_to_speech.TTS_FIRST_CHUNK_MAX_CHARS
+    if mode == "whole":
+        # A single chunk for all the texts.
+        text_to_speech.TTS_FIRST_CHUNK_MAX_CHARS = 10_000
+    text_to_speech.TTS_PREFETCH_NEXT_CHUNK = mode == "prefetch"
+    results = []
+    for n_sentences in lengths:
+        text = " ".join([SENTENCE] * n_sentences)
+        start = time.perf_counter()
+        audio = await text_to_speech.start_synthesis("kelly", text)
+        first, received = None, []
+        async for chunk in audio:
+            if first is None:
+                first = time.perf_counter() - start
+            received.append(chunk)
+        total = time.perf_counter() - start
+        # A single header, then the samples of all the chunks.
+        data = b"".join(received)
+        assert data.startswith(b"RIFF") and data.count(b"RIFF") == 1
+        results.append(f"{len(text)} chars {first * 1000:.0f}/{total * 1000:.0f}ms")
+    await close_http_clients()
+    text_to_speech.TTS_FIRST_CHUNK_MAX_CHARS = first_chunk_max_chars
+    print(f"{mode:<8} first/last byte: {', '.join(results)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ms-per-char", type=float, default=1.0)
+    parser.add_argument("--sentences", type=int, nargs="+", default=[1, 2, 4, 8, 13])
+    args = parser.parse_args()
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    start_tts_server(args.ms_per_char)
+    for mode in ["whole", "chunked", "prefetch"]:
+        asyncio.run(run(mode, args.sentences))
+
+
+if __name__ == "__main__":
+    main()
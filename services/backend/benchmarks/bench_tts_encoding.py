@@ -0,0 +1,82 @@
+"""Benchmark of the CPU cost of encoding the synthesized audio for the clients.
+
+Streams `--seconds` of synthetic speech-like audio, in chunks of 100ms like the TTS
+sends them, through the conversion of `/v1/tts/` for each output format. Reports the
+CPU time per second of audio and the bitrate sent to the client, then the throughput
+of the encoder pool with `--streams` concurrent streams.
+
+Run with `uv run python benchmarks/bench_tts_encoding.py`.
+"""
+
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+from backend.tts.encoding import encode_audio
+
+
+def speech_like(seconds: float, sample_rate: int) -> bytes:
+    """Harmonics with a syllable-rate envelope and some noise, as 16-bit PCM."""
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    pitch = 140 + 20 * np.sin(2 * np.pi * 0.5 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 8))
+    envelope = np.clip(np.sin(2 * np.pi * 4 * t), 0, None)
+    audio = 0.2 * voiced * envelope + 0.01 * rng.standard_normal(len(t))
+    return (audio * 32767).astype("<i2").tobytes()
+
+
+async def chunks(pcm: bytes, sample_rate: int):
+    chunk_bytes = 2 * sample_rate // 10
+    for i in range(0, len(pcm), chunk_bytes):
+        yield pcm[i : i + chunk_bytes]
+
+
+async def encode(pcm: bytes, output_format: str, sample_rate: int) -> int:
+    size = 0
+    async for chunk in encode_audio(
+        chunks(pcm, sample_rate), "pcm", output_format, sample_rate
+    ):
+        size += len(chunk)
+    return size
+
+
+async def run(args: argparse.Namespace):
+    for sample_rate in [24000, 48000]:
+        pcm = speech_like(args.seconds, sample_rate)
+        for output_format in ["pcm", "wav", "opus"]:
+            cpu_start, start = time.process_time(), time.perf_counter()
+            size = await encode(pcm, output_format, sample_rate)
+            cpu = time.process_time() - cpu_start
+            wall = time.perf_counter() - start
+            print(
+                f"{sample_rate}Hz {output_format:<4} "
+                f"cpu={cpu / args.seconds * 1000:.2f}ms per audio second, "
+                f"wall={wall / args.seconds * 1000:.2f}ms, "
+                f"{size * 8 / args.seconds / 1000:.0f} kbit/s"
+            )
+
+        start = time.perf_counter()
+        await asyncio.gather(
+            *[encode(pcm, "opus", sample_rate) for _ in range(args.streams)]
+        )
+        wall = time.perf_counter() - start
+        print(
+            f"{sample_rate}Hz opus x{args.streams} streams: "
+            f"{args.streams * args.seconds / wall:.0f}x real time in total"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--streams", type=int, default=8)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
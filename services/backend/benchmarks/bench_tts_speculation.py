@@ -0,0 +1,148 @@
+"""Benchmark of the speculative synthesis of the suggested answers.
+
+Simulates turns of a session: the LLM streams `--answers` suggested answers, then the
+user thinks for `--think-time` seconds and picks one of them, or none. The answers are
+synthesized by a stand-in for the Kyutai TTS server, in a thread, that takes
+`--chunks * --chunk-interval` seconds per answer. We measure when the whole audio of the
+picked answer reaches the caller of `/v1/tts/`, with and without speculation, and
+report the hit rate and the wasted-synthesis ratio.
+
+Run with `uv run python benchmarks/bench_tts_speculation.py`.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+import uuid
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+
+PORT = 8766
+
+# The backend reads its configuration from the environment at import time.
+os.environ.setdefault("STT_IS_GRADIUM", "false")
+os.environ.setdefault("KYUTAI_STT_URL", "ws://localhost")
+os.environ["TTS_IS_GRADIUM"] = "false"
+os.environ["TTS_SERVER"] = f"http://127.0.0.1:{PORT}/tts"
+os.environ.setdefault("KYUTAI_API_KEY", "")
+os.environ.setdefault("KYUTAI_LLM_API_KEY", "")
+os.environ.setdefault("KYUTAI_LLM_URL", "http://localhost")
+os.environ.setdefault("KYUTAI_LLM_MODEL", "")
+os.environ.setdefault("KYUTAI_USERS_DATA_PATH", tempfile.mkdtemp())
+os.environ.setdefault("JWT_SECRET_KEY", "bench")
+# Only the speculation can serve an answer without synthesizing it.
+os.environ["TTS_CACHE_MAX_MB"] = "0"
+
+import backend.routes.tts as tts_route  # noqa: E402
+import backend.tts.text_to_speech as text_to_speech  # noqa: E402
+from backend.kyutai_constants import TTS_VOICE_ID  # noqa: E402
+from backend.libs.http_clients import close_http_clients  # noqa: E402
+from backend.storage import UserData  # noqa: E402
+from backend.tts.speculation import SpeculativeTTS  # noqa: E402
+from backend.typing import TTSRequest, UserSettings  # noqa: E402
+
+# Which answer the user picks, the last weight is for none of them.
+PICK_WEIGHTS = [0.4, 0.25, 0.15, 0.1, 0.1]
+
+
+def start_tts_server(n_chunks: int, chunk_interval: float):
+    app = FastAPI()
+
+    @app.post("/tts")
+    async def tts(body: dict):
+        async def wav():
+            yield b"RIFF" + b"\0" * 40
+            for _ in range(n_chunks):
+                await asyncio.sleep(chunk_interval)
+                yield b"\0" * 4800
+
+        return StreamingResponse(wav(), media_type="audio/wav")
+
+    server = uvicorn.Server(uvicorn.Config(app, port=PORT, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+
+
+async def run(top_n: int, args: argparse.Namespace):
+    speculative_tts = SpeculativeTTS(
+        top_n, max_per_session=2, max_global=32, ttl_sec=args.ttl
+    )
+    text_to_speech.speculative_tts = speculative_tts
+    session = speculative_tts.session()
+    user = UserData(
+        user_id=uuid.uuid4(),
+        email="bench@example.com",
+        hashed_password="",
+        google_sub=None,
+        user_settings=UserSettings(
+            name="bench", prompt="", additional_keywords=[], friends=[]
+        ),
+        conversations=[],
+    )
+    rng = random.Random(0)
+    latencies = []
+    for turn in range(args.turns):
+        session.supersede()
+        answers = [f"Answer {i} of turn {turn}." for i in range(args.answers)]
+        for i, answer in enumerate(answers):
+            await asyncio.sleep(args.answer_interval)
+            session.submit(
+                i,
+                text_to_speech.get_cache_key(TTS_VOICE_ID, answer),
+                lambda answer=answer: text_to_speech.synthesize(TTS_VOICE_ID, answer),
+            )
+        await asyncio.sleep(args.think_time)
+
+        weights = PICK_WEIGHTS[: args.answers] + PICK_WEIGHTS[-1:]
+        picked = rng.choices([*answers, None], weights)[0]
+        if picked is None:
+            continue
+        start = time.perf_counter()
+        request = TTSRequest(text=picked, message_id=uuid.uuid4())
+        response = await tts_route.text_to_speech(request, user)
+        async for _ in response.body_iterator:
+            pass
+        latencies.append(time.perf_counter() - start)
+    # The answers never picked are counted as wasted once they expire.
+    await asyncio.sleep(args.ttl)
+    await speculative_tts.take("")
+    await close_http_clients()
+
+    print(
+        f"top_n={top_n}: whole audio p50={np.median(latencies) * 1000:.0f}ms "
+        f"p90={np.percentile(latencies, 90) * 1000:.0f}ms, "
+        f"hit rate={speculative_tts.hit_rate:.0%} of {len(latencies)} picks, "
+        f"wasted={speculative_tts.wasted_ratio:.0%} "
+        f"of {speculative_tts.started} syntheses"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--answers", type=int, default=4)
+    parser.add_argument("--answer-interval", type=float, default=0.1)
+    parser.add_argument("--think-time", type=float, default=1.0)
+    parser.add_argument("--ttl", type=float, default=3.0)
+    parser.add_argument("--chunks", type=int, default=10)
+    parser.add_argument("--chunk-interval", type=float, default=0.05)
+    parser.add_argument("--top-n", type=int, nargs="+", default=[0, 1, 2, 4])
+    args = parser.parse_args()
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    start_tts_server(args.chunks, args.chunk_interval)
+    for top_n in args.top_n:
+        asyncio.run(run(top_n, args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Benchmark of the time to the first audio byte of `/v1/tts/` with the Kyutai TTS.
+
+A stand-in for the TTS server, in a thread, sends a WAV header and then a chunk of
+audio every `--chunk-interval` seconds, like a synthesis faster than real time. We
+measure when the first byte reaches the caller of the route, compared with the
+previous implementation, which buffered the whole response.
+
+Run with `uv run python benchmarks/bench_tts_ttfb.py`.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+import httpx
+import numpy as np
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+
+PORT = 8765
+
+# The backend reads its configuration from the environment at import time.
+os.environ.setdefault("STT_IS_GRADIUM", "false")
+os.environ.setdefault("KYUTAI_STT_URL", "ws://localhost")
+os.environ["TTS_IS_GRADIUM"] = "false"
+os.environ["TTS_SERVER"] = f"http://127.0.0.1:{PORT}/tts"
+os.environ.setdefault("KYUTAI_API_KEY", "")
+os.environ.setdefault("KYUTAI_LLM_API_KEY", "")
+os.environ.setdefault("KYUTAI_LLM_URL", "http://localhost")
+os.environ.setdefault("KYUTAI_LLM_MODEL", "")
+os.environ.setdefault("KYUTAI_USERS_DATA_PATH", tempfile.mkdtemp())
+os.environ.setdefault("JWT_SECRET_KEY", "bench")
+# Every request must reach the TTS server.
+os.environ["TTS_CACHE_MAX_MB"] = "0"
+
+from backend.kyutai_constants import KYUTAI_API_KEY, TTS_SERVER  # noqa: E402
+from backend.routes.tts import text_to_speech  # noqa: E402
+from backend.storage import UserData  # noqa: E402
+from backend.typing import TTSRequest, UserSettings  # noqa: E402
+
+
+def start_tts_server(n_chunks: int, chunk_interval: float):
+    app = FastAPI()
+
+    @app.post("/tts")
+    async def tts(body: dict):
+        async def wav():
+            yield b"RIFF" + b"\0" * 40
+            for _ in range(n_chunks):
+                await asyncio.sleep(chunk_interval)
+                # 100ms of 24kHz 16-bit audio.
+                yield b"\0" * 4800
+
+        return StreamingResponse(wav(), media_type="audio/wav")
+
+    server = uvicorn.Server(uvicorn.Config(app, port=PORT, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+
+
+async def buffered_text_to_speech(request: TTSRequest):
+    """How the route called the Kyutai TTS before, without the voice selection."""
+    query = {"text": request.text, "voice": "kelly", "temperature": 0.8}
+    async with httpx.AsyncClient() as client:
+        response = await client.post(
+            TTS_SERVER, json=query, headers={"kyutai-api-key": KYUTAI_API_KEY}
+        )
+    response.raise_for_status()
+    data = response.content
+
+    async def audio_generator():
+        yield data
+
+    return audio_generator()
+
+
+async def run(mode: str, n_requests: int):
+    user = UserData(
+        user_id=uuid.uuid4(),
+        email="bench@example.com",
+        hashed_password="",
+        google_sub=None,
+        user_settings=UserSettings(
+            name="bench", prompt="", additional_keywords=[], friends=[]
+        ),
+        conversations=[],
+    )
+    ttfb, total = [], []
+    for i in range(n_requests):
+        request = TTSRequest(text=f"Sentence number {i}.", message_id=uuid.uuid4())
+        start = time.perf_counter()
+        if mode == "buffered":
+            audio = await buffered_text_to_speech(request)
+        else:
+            audio = (await text_to_speech(request, user)).body_iterator
+        first = None
+        async for _ in audio:
+            if first is None:
+                first = time.perf_counter() - start
+        ttfb.append(first)
+        total.append(time.perf_counter() - start)
+
+    print(
+        f"{mode:<9} first byte p50={np.median(ttfb) * 1000:.0f}ms "
+        f"max={max(ttfb) * 1000:.0f}ms, "
+        f"whole audio p50={np.median(total) * 1000:.0f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--chunks", type=int, default=10)
+    parser.add_argument("--chunk-interval", type=float, default=0.1)
+    args = parser.parse_args()
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    start_tts_server(args.chunks, args.chunk_interval)
+    for mode in ["buffered", "streamed"]:
+        asyncio.run(run(mode, args.requests))
+
+
+if __name__ == "__main__":
+    main()
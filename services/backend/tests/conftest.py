@@ -0,0 +1,36 @@
+import datetime as dt
+import os
+import tempfile
+import uuid
+
+import pytest
+
+# The backend reads its configuration from the environment at import time.
+os.environ.setdefault("STT_IS_GRADIUM", "false")
+os.environ.setdefault("TTS_IS_GRADIUM", "false")
+os.environ.setdefault("KYUTAI_STT_URL", "ws://localhost")
+os.environ.setdefault("TTS_SERVER", "http://localhost")
+os.environ.setdefault("KYUTAI_LLM_API_KEY", "")
+os.environ.setdefault("KYUTAI_LLM_URL", "http://localhost")
+os.environ.setdefault("KYUTAI_LLM_MODEL", "")
+os.environ.setdefault("KYUTAI_USERS_DATA_PATH", tempfile.mkdtemp())
+
+
+@pytest.fixture
+def handler():
+    """A handler that isn't started, so it connects to neither the STT nor the LLM."""
+    from backend.storage import UserData
+    from backend.typing import UserSettings
+    from backend.unmute_handler import UnmuteHandler
+
+    user_data = UserData(
+        user_id=uuid.uuid4(),
+        email="user@example.com",
+        hashed_password="",
+        google_sub=None,
+        user_settings=UserSettings(
+            name="User", prompt="", additional_keywords=[], friends=[]
+        ),
+        conversations=[],
+    )
+    return UnmuteHandler(user_data, dt.datetime.now())
@@ -0,0 +1,49 @@
+from pydantic import BaseModel
+
+from backend.libs.additional_outputs import AdditionalOutputsTracker
+from backend.libs.debug_telemetry import DebugPlotBuffer
+
+
+class Message(BaseModel):
+    content: str
+
+
+def test_additional_outputs_deltas():
+    tracker = AdditionalOutputsTracker(snapshot_every_n_updates=3)
+    messages = [Message(content="hello")]
+    debug_dict = {"state": "user_speaking", "timing": {"a": 1.0}}
+    plot = DebugPlotBuffer(history_sec=1.0)
+    plot.append(t=0.0, amplitude=0.1, pause_prediction=0.0)
+
+    update = tracker.make_update(messages, debug_dict, plot)
+    assert update.snapshot
+    assert update.chat_history == [{"content": "hello"}]
+    assert update.debug_dict == debug_dict
+    assert len(update.debug_plot_data) == 1
+
+    # The last message grows and a nested debug value is modified in place.
+    messages[-1].content += " world"
+    debug_dict["timing"]["b"] = 2.0
+    plot.append(t=0.02, amplitude=0.2, pause_prediction=0.0)
+    update = tracker.make_update(messages, debug_dict, plot)
+    assert not update.snapshot
+    assert update.chat_history_start == 0
+    assert update.chat_history == [{"content": "hello world"}]
+    assert update.debug_dict == {"timing": {"a": 1.0, "b": 2.0}}
+    assert [d["t"] for d in update.debug_plot_data] == [0.02]
+
+    # Nothing changed except a new message, and a removed debug key.
+    messages.append(Message(content="hi"))
+    del debug_dict["state"]
+    update = tracker.make_update(messages, debug_dict, plot)
+    assert update.chat_history_start == 1
+    assert update.chat_history == [{"content": "hi"}]
+    assert update.debug_dict == {}
+    assert update.removed_debug_keys == ["state"]
+    assert update.debug_plot_data == []
+
+    update = tracker.make_update(messages, debug_dict, None)
+    assert update.snapshot
+    assert update.chat_history_start == 0
+    assert len(update.chat_history) == 2
+    assert update.debug_dict == debug_dict
@@ -0,0 +1,36 @@
+import base64
+import json
+
+import pytest
+
+from backend.binary_audio import INPUT_AUDIO, decode_input_audio
+from backend.libs.audio_ingress import parse_audio_append, starts_ogg_stream
+
+
+def test_parse_audio_append():
+    audio = base64.b64encode(b"OggS\x00\x02").decode()
+    event = {"type": "input_audio_buffer.append", "audio": audio}
+    assert parse_audio_append(json.dumps(event)) == b"OggS\x00\x02"
+    assert parse_audio_append(json.dumps({"event_id": "x", **event})) == b"OggS\x00\x02"
+
+    # Left to the full validation, which reports the errors.
+    assert parse_audio_append('{"type": "input_audio_buffer.append"') is None
+    assert parse_audio_append('{"type": "input_audio_buffer.append"}') is None
+    assert parse_audio_append(json.dumps({**event, "audio": 1})) is None
+    assert (
+        parse_audio_append(json.dumps({"type": "current.keywords", "keywords": None}))
+        is None
+    )
+    assert parse_audio_append(json.dumps([event])) is None
+
+
+def test_starts_ogg_stream():
+    assert starts_ogg_stream(b"OggS\x00\x02")
+    assert not starts_ogg_stream(b"OggS\x00\x00")
+
+    # A valid binary frame, whose audio is too short to be an Ogg page.
+    opus_bytes = decode_input_audio(bytes([INPUT_AUDIO]) + b"Og")
+    with pytest.raises(ValueError):
+        starts_ogg_stream(opus_bytes)
+    with pytest.raises(ValueError):
+        starts_ogg_stream(b"RIFF\x00\x02")
@@ -0,0 +1,25 @@
+import numpy as np
+
+from backend.stt.audio_ring_buffer import AudioRingBuffer
+
+
+def test_audio_ring_buffer():
+    buffer = AudioRingBuffer(capacity=10)
+    assert buffer.read_from(0).size == 0
+
+    buffer.write(np.arange(4, dtype=np.float32))
+    assert buffer.start_index == 0
+    np.testing.assert_array_equal(buffer.read_from(0), [0, 1, 2, 3])
+    np.testing.assert_array_equal(buffer.read_from(2), [2, 3])
+
+    # Wrap around, the first samples are overwritten
+    buffer.write(np.arange(4, 12, dtype=np.float32))
+    assert buffer.start_index == 2
+    np.testing.assert_array_equal(buffer.read_from(0), np.arange(2, 12))
+    np.testing.assert_array_equal(buffer.read_from(9), [9, 10, 11])
+    assert buffer.read_from(12).size == 0
+
+    # Writing more than the capacity at once only keeps the end
+    buffer.write(np.arange(12, 37, dtype=np.float32))
+    assert buffer.total_written == 37
+    np.testing.assert_array_equal(buffer.read_from(0), np.arange(27, 37))
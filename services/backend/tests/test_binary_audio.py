@@ -0,0 +1,24 @@
+import uuid
+
+import pytest
+
+from backend.binary_audio import (
+    INPUT_AUDIO,
+    OUTPUT_AUDIO,
+    decode_input_audio,
+    encode_output_audio,
+)
+
+
+def test_binary_audio_frames():
+    assert decode_input_audio(bytes([INPUT_AUDIO]) + b"OggS") == b"OggS"
+    with pytest.raises(ValueError):
+        decode_input_audio(bytes([OUTPUT_AUDIO]) + b"OggS")
+    with pytest.raises(ValueError):
+        decode_input_audio(bytes([INPUT_AUDIO]))
+
+    response_id = uuid.uuid4()
+    frame = encode_output_audio(response_id, b"OggS")
+    assert frame[0] == OUTPUT_AUDIO
+    assert uuid.UUID(bytes=frame[1:17]) == response_id
+    assert frame[17:] == b"OggS"
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from backend.libs.debug_telemetry import DebugPlotBuffer, rms_amplitude
+
+
+def test_rms_amplitude():
+    assert rms_amplitude(np.full(480, 0.5, dtype=np.float32)) == pytest.approx(0.5)
+    assert rms_amplitude(np.zeros(0, dtype=np.float32)) == 0.0
+
+
+def test_debug_plot_buffer():
+    buffer = DebugPlotBuffer(history_sec=0.1, frame_sec=0.02)
+    assert buffer.to_records() == []
+
+    for i in range(12):
+        buffer.append(t=i * 0.02, amplitude=i, pause_prediction=0.5)
+
+    assert len(buffer) == buffer.capacity == 5
+    records = buffer.to_records()
+    assert [r["amplitude"] for r in records] == [7, 8, 9, 10, 11]
+    assert records[-1] == {
+        "t": pytest.approx(0.22),
+        "amplitude": 11,
+        "pause_prediction": 0.5,
+    }
+
+    # With longer frames than expected, the history is still limited in time.
+    buffer = DebugPlotBuffer(history_sec=0.1, frame_sec=0.02)
+    for i in range(5):
+        buffer.append(t=i * 0.04, amplitude=i, pause_prediction=0.0)
+    assert [r["amplitude"] for r in buffer.to_records()] == [2, 3, 4]
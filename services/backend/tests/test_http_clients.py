@@ -0,0 +1,72 @@
+import pytest
+import pytest_asyncio
+from aiohttp import web
+
+from backend import metrics as mt
+from backend.libs.http_clients import (
+    PooledGradiumClient,
+    close_http_clients,
+    get_aiohttp_session,
+    get_httpx_client,
+)
+
+
+def count(metric, client: str) -> float:
+    return metric.labels(client=client)._value.get()
+
+
+@pytest_asyncio.fixture
+async def server_url():
+    async def voices(request):
+        return web.json_response([{"name": "kelly", "uid": "1"}])
+
+    async def missing(request):
+        return web.json_response({"detail": "No such voice"}, status=404)
+
+    app = web.Application()
+    app.router.add_get("/api/voices/", voices)
+    app.router.add_delete("/api/voices/{uid}", missing)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    yield f"http://127.0.0.1:{port}/api/"
+    await close_http_clients()
+    await runner.cleanup()
+
+
+@pytest.mark.asyncio
+async def test_gradium_client_reuses_connections(server_url):
+    session = get_aiohttp_session(max_connections=10, keepalive_sec=30)
+    assert get_aiohttp_session(max_connections=10, keepalive_sec=30) is session
+    client = PooledGradiumClient(session, server_url, api_key="test")
+
+    requests = count(mt.HTTP_CLIENT_REQUESTS, "gradium")
+    connections = count(mt.HTTP_CLIENT_NEW_CONNECTIONS, "gradium")
+    for _ in range(3):
+        assert await client.get("voices/") == [{"name": "kelly", "uid": "1"}]
+    assert count(mt.HTTP_CLIENT_REQUESTS, "gradium") == requests + 3
+    assert count(mt.HTTP_CLIENT_NEW_CONNECTIONS, "gradium") == connections + 1
+
+    with pytest.raises(Exception, match="No such voice"):
+        await client.delete("voices/1")
+    assert not session.closed
+
+
+@pytest.mark.asyncio
+async def test_httpx_client_reuses_connections(server_url):
+    client = get_httpx_client(max_connections=10, keepalive_sec=30)
+    assert get_httpx_client(max_connections=10, keepalive_sec=30) is client
+
+    requests = count(mt.HTTP_CLIENT_REQUESTS, "httpx")
+    connections = count(mt.HTTP_CLIENT_NEW_CONNECTIONS, "httpx")
+    for _ in range(3):
+        response = await client.get(server_url + "voices/")
+        assert response.json() == [{"name": "kelly", "uid": "1"}]
+    assert count(mt.HTTP_CLIENT_REQUESTS, "httpx") == requests + 3
+    assert count(mt.HTTP_CLIENT_NEW_CONNECTIONS, "httpx") == connections + 1
+
+    await close_http_clients()
+    assert client.is_closed
+    assert get_httpx_client(max_connections=10, keepalive_sec=30) is not client
@@ -0,0 +1,29 @@
+import asyncio
+import time
+
+import pytest
+
+from backend.libs.loop_monitor import LoopMonitor
+
+
+@pytest.mark.asyncio
+async def test_loop_monitor_finds_blocking_coroutine():
+    monitor = LoopMonitor(slow_callback_sec=0.05, sample_interval_sec=0.01)
+    monitor_task = asyncio.create_task(monitor.run())
+    await asyncio.sleep(0.05)
+    assert not monitor.slow_callbacks
+
+    def save_user_data():
+        time.sleep(0.3)
+
+    async def handle_message():
+        save_user_data()
+
+    await asyncio.create_task(handle_message())
+    await asyncio.sleep(0.05)
+    monitor_task.cancel()
+
+    # Attributed to the coroutine of the task, not the function it called.
+    assert list(monitor.slow_callbacks) == [
+        f"{__name__}.test_loop_monitor_finds_blocking_coroutine.<locals>.handle_message"
+    ]
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from backend.stt.pause_detection import (
+    AnyPauseDetector,
+    EnergyPauseDetector,
+    PauseObservation,
+    ServerVADPauseDetector,
+    make_pause_detector,
+)
+from backend.stt.pause_detection_eval import Timeline, evaluate
+
+
+def _observation(audio: np.ndarray, **kwargs) -> PauseObservation:
+    defaults = dict(
+        dt=len(audio) / 24000, time_since_last_word=0.0, pause_prediction=0.0
+    )
+    defaults.update(kwargs)
+    return PauseObservation(
+        rms=float(np.sqrt(np.mean(audio**2))), audio=audio, **defaults
+    )
+
+
+def test_server_vad_pause_detector():
+    detector = ServerVADPauseDetector(silence_timeout=2.5, threshold=0.6)
+    silence = np.zeros(1920, dtype=np.float32)
+    assert not detector.update(_observation(silence, pause_prediction=0.5))
+    assert detector.update(_observation(silence, pause_prediction=0.7))
+    assert detector.update(_observation(silence, time_since_last_word=3.0))
+
+
+def test_energy_pause_detector():
+    detector = EnergyPauseDetector(silence_sec=0.2)
+    t = np.arange(1920) / 24000
+    speech = (0.3 * np.sin(2 * np.pi * 220 * t)).astype(np.float32)
+    noise = np.random.default_rng(0).normal(0, 1e-4, 1920).astype(np.float32)
+
+    assert not detector.update(_observation(speech))
+    assert not detector.update(_observation(noise))  # 80ms of silence
+    assert not detector.update(_observation(noise))
+    assert detector.update(_observation(noise))
+
+    detector.reset()
+    assert not detector.update(_observation(noise))
+
+
+def test_make_pause_detector():
+    detector = make_pause_detector("server_vad", threshold=0.3)
+    assert isinstance(detector, ServerVADPauseDetector)
+    assert detector.threshold == 0.3
+
+    detector = make_pause_detector("server_vad+energy", **{"energy.silence_sec": 0.5})
+    assert isinstance(detector, AnyPauseDetector)
+    assert detector.detectors[1].silence_sec == 0.5  # type: ignore
+
+    with pytest.raises(ValueError):
+        make_pause_detector("nope")
+
+
+def test_evaluate():
+    # 10s of audio at 80ms per frame, the user talks for 1s, and the words arrive
+    # with 2s of delay. The server VAD says "pause" from 5s on.
+    t = np.arange(1, 126) * 0.08
+    word_start_time = np.array([1.0, 1.5, 2.0])
+    timeline = Timeline(
+        t=t,
+        dt=np.full_like(t, 0.08),
+        rms=np.zeros_like(t),
+        pause_prediction=(t >= 5.0).astype(np.float64),
+        word_arrival_t=word_start_time + 2.0,
+        word_start_time=word_start_time,
+    )
+
+    report = evaluate([timeline], "server_vad", threshold=0.6, silence_timeout=100.0)
+    assert report.n_turns == 1
+    assert report.n_missed == 0
+    assert report.n_false_triggers == 0
+    assert report.latencies == [pytest.approx(3.0, abs=0.08)]
+
+    # Way too eager: triggers between the words too.
+    report = evaluate([timeline], "server_vad", threshold=0.6, silence_timeout=0.1)
+    assert report.n_false_triggers == 2
+    assert report.false_trigger_rate == pytest.approx(2 / 3)
@@ -0,0 +1,40 @@
+import asyncio
+
+import pytest
+
+from backend.quest_manager import Quest, QuestManager
+
+
+async def run_route(manager: QuestManager, disconnect: asyncio.Event):
+    """Like `run_route()`, whose task group is cancelled when the client disconnects."""
+
+    async def receive_loop():
+        await disconnect.wait()
+        raise ConnectionError()
+
+    async with asyncio.TaskGroup() as tg:
+        tg.create_task(receive_loop())
+        tg.create_task(manager.wait())
+
+
+@pytest.mark.asyncio
+async def test_quest_errors_after_resume():
+    async with QuestManager() as manager:
+        # The first connection drops, the session is detached.
+        disconnect = asyncio.Event()
+        route = asyncio.create_task(run_route(manager, disconnect))
+        await asyncio.sleep(0)
+        disconnect.set()
+        with pytest.raises(ExceptionGroup):
+            await route
+
+        # Resumed by a new connection, whose route must still see the quest errors.
+        route = asyncio.create_task(run_route(manager, asyncio.Event()))
+
+        async def fail():
+            raise RuntimeError("STT down")
+
+        await manager.add(Quest.from_run_step("stt", fail))
+        with pytest.raises(ExceptionGroup) as exc_info:
+            await asyncio.wait_for(route, 1)
+        assert exc_info.group_contains(RuntimeError, match="STT down")
@@ -0,0 +1,108 @@
+import asyncio
+import time
+
+import fakeredis
+import pytest
+from fastapi import HTTPException
+
+from backend.libs.redis_lock import (
+    LOCK_RETRY_INTERVAL_SEC,
+    InMemoryLockManager,
+    RedisLockManager,
+    make_lock_manager,
+)
+
+
+@pytest.fixture
+def redis_client():
+    return fakeredis.FakeAsyncRedis()
+
+
+def make_manager(backend: str, redis_client, acquire_timeout_sec: float):
+    if backend == "memory":
+        return InMemoryLockManager(acquire_timeout_sec=acquire_timeout_sec)
+    return RedisLockManager(
+        redis_client, lock_ttl_seconds=10, acquire_timeout_sec=acquire_timeout_sec
+    )
+
+
+def test_make_lock_manager():
+    assert isinstance(make_lock_manager(None, 6379, 10, 30), InMemoryLockManager)
+    assert isinstance(make_lock_manager("redis", 6379, 10, 30), RedisLockManager)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend", ["redis", "memory"])
+async def test_lock_is_exclusive(backend, redis_client):
+    manager = make_manager(backend, redis_client, acquire_timeout_sec=0.3)
+
+    async with manager.acquire_lock("user", "tts"):
+        with pytest.raises(HTTPException) as exc_info:
+            async with manager.acquire_lock("user", "tts"):
+                pass
+        assert exc_info.value.status_code == 429
+
+        # Other users and other operations aren't affected.
+        async with manager.acquire_lock("other_user", "tts"):
+            pass
+        async with manager.acquire_lock("user", "stt"):
+            pass
+
+    async with manager.acquire_lock("user", "tts"):
+        pass
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("backend", ["redis", "memory"])
+async def test_lock_waits_for_release(backend, redis_client):
+    manager = make_manager(backend, redis_client, acquire_timeout_sec=2)
+    released_at = None
+
+    async def hold():
+        nonlocal released_at
+        async with manager.acquire_lock("user", "tts"):
+            await asyncio.sleep(0.2)
+        released_at = time.monotonic()
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0.01)
+    async with manager.acquire_lock("user", "tts"):
+        assert released_at is not None
+        # Woken up by the release, rather than at the next retry.
+        assert time.monotonic() - released_at < LOCK_RETRY_INTERVAL_SEC / 2
+    await holder
+
+
+@pytest.mark.asyncio
+async def test_lock_waits_for_expiry(redis_client):
+    manager = RedisLockManager(redis_client, lock_ttl_seconds=10, acquire_timeout_sec=2)
+    # A holder that crashed, its lock expires without notifying anyone.
+    await redis_client.set("stt:lock:user", "crashed", px=300)
+
+    async with manager.acquire_lock("user", "stt"):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_expired_lock_is_not_released_by_previous_holder(redis_client):
+    manager = RedisLockManager(redis_client, lock_ttl_seconds=10)
+
+    async with manager.acquire_lock("user", "stt"):
+        # As if our TTL had expired and someone else had taken the lock.
+        await redis_client.set("stt:lock:user", "someone-else")
+
+    assert await redis_client.get("stt:lock:user") == b"someone-else"
+
+
+@pytest.mark.asyncio
+async def test_held_lock_is_renewed(redis_client):
+    manager = RedisLockManager(
+        redis_client, lock_ttl_seconds=0.3, acquire_timeout_sec=0
+    )
+
+    async with manager.acquire_lock("user", "stt"):
+        # Held for several TTLs.
+        await asyncio.sleep(1.0)
+        with pytest.raises(HTTPException):
+            async with manager.acquire_lock("user", "stt"):
+                pass
@@ -0,0 +1,96 @@
+import asyncio
+import datetime as dt
+import uuid
+
+import numpy as np
+import pytest
+from fastapi import HTTPException
+
+import backend.openai_realtime_api_events as ora
+from backend.libs import sessions
+from backend.libs.redis_lock import InMemoryLockManager
+from backend.libs.sessions import Session, SessionRegistry
+
+
+class Handler:
+    """Stands in for `UnmuteHandler`, which connects to the STT and LLM."""
+
+    def __init__(self):
+        self.output_queue = asyncio.Queue()
+        self.stt_open = True
+
+    async def __aenter__(self):
+        pass
+
+    async def __aexit__(self, *exc):
+        pass
+
+    async def cleanup(self):
+        pass
+
+    async def shutdown_stt(self):
+        self.stt_open = False
+
+    async def emit(self):
+        return await self.output_queue.get()
+
+
+@pytest.mark.asyncio
+async def test_reconnect_to_another_worker():
+    # Shared by the workers, like the Redis locks.
+    locks = InMemoryLockManager(acquire_timeout_sec=0.1)
+    worker_a, worker_b = SessionRegistry(grace_sec=20), SessionRegistry(grace_sec=20)
+
+    session = Session(Handler(), "user@example.com")  # type: ignore[arg-type]
+    await session.attach(locks.acquire_lock("user@example.com", "stt"))
+    await session.enter()
+    await worker_a.detach(session)
+    # Limited by the lock, which is released.
+    assert not session.handler.stt_open
+
+    # The other worker doesn't know the session, and starts a new one right away.
+    assert worker_b.resume(session.resume_token, "user@example.com") is None
+    new_session = Session(Handler(), "user@example.com")  # type: ignore[arg-type]
+    await new_session.attach(locks.acquire_lock("user@example.com", "stt"))
+    await new_session.close()
+
+    # Resumed on the first worker instead, the lock is taken again.
+    assert worker_a.resume(session.resume_token, "user@example.com") is session
+    await session.attach(locks.acquire_lock("user@example.com", "stt"))
+    with pytest.raises(HTTPException):
+        async with locks.acquire_lock("user@example.com", "stt"):
+            pass
+    await session.close()
+    async with locks.acquire_lock("user@example.com", "stt"):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_backlog_of_a_detached_session(monkeypatch):
+    monkeypatch.setattr(sessions, "SESSION_RESUME_MAX_BACKLOG", 3)
+    registry = SessionRegistry(grace_sec=20)
+    handler = Handler()
+    session = Session(handler, "user@example.com")  # type: ignore[arg-type]
+    await session.enter()
+    await registry.detach(session)
+
+    events = [
+        ora.OneKeyword(content=str(i), timestamp=dt.datetime.now(), index=i)
+        for i in range(3)
+    ]
+    for event in events:
+        # The audio is dropped, it belongs to the Opus stream of the connection.
+        handler.output_queue.put_nowait((24000, uuid.uuid4(), np.zeros(480)))
+        handler.output_queue.put_nowait(event)
+    await asyncio.sleep(0.01)
+    assert session.unsent_outputs == events
+    assert registry.resume(session.resume_token, "user@example.com") is session
+
+    # Once the backlog is full, the session can't be resumed anymore.
+    await registry.detach(session)
+    handler.output_queue.put_nowait(
+        ora.OneKeyword(content="3", timestamp=dt.datetime.now(), index=3)
+    )
+    await asyncio.sleep(0.01)
+    assert session.ended and session.closed
+    assert registry.resume(session.resume_token, "user@example.com") is None
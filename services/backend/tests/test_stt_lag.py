@@ -0,0 +1,31 @@
+import pytest
+
+from backend.stt.stt_lag import STTLagMonitor, lagging_sessions_fraction
+
+
+@pytest.mark.asyncio
+async def test_stt_lag_monitor():
+    healthy = STTLagMonitor(sample_rate=1000, alarm_sec=1.0, normal_lag_sec=0.2)
+    lagging = STTLagMonitor(sample_rate=1000, alarm_sec=1.0, normal_lag_sec=0.2)
+
+    healthy.update(sent_samples=1100, processed_samples=1000)
+    assert healthy.lag_sec == pytest.approx(0.1)
+    assert healthy.excess_lag_sec == 0.0
+    assert not healthy.lagging
+
+    lagging.update(sent_samples=3500, processed_samples=1000)
+    assert lagging.lag_sec == pytest.approx(2.5)
+    assert lagging.excess_lag_sec == pytest.approx(2.3)
+    assert lagging.lagging
+    assert lagging_sessions_fraction() == pytest.approx(0.5)
+
+    # Hysteresis: still lagging until under half of the alarm threshold.
+    lagging.update(sent_samples=3500, processed_samples=2800)
+    assert lagging.lagging
+    lagging.update(sent_samples=3500, processed_samples=3100)
+    assert not lagging.lagging
+    assert lagging_sessions_fraction() == 0.0
+
+    healthy.close()
+    lagging.close()
+    assert lagging_sessions_fraction() == 0.0
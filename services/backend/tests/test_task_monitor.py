@@ -0,0 +1,37 @@
+import asyncio
+
+import pytest
+
+from backend.libs.task_monitor import (
+    SESSION_ID,
+    install_task_factory,
+    snapshot_tasks,
+)
+
+
+@pytest.mark.asyncio
+async def test_snapshot_tasks():
+    install_task_factory(asyncio.get_running_loop())
+    stop = asyncio.Event()
+
+    async def session():
+        SESSION_ID.set("abc")
+        async with asyncio.TaskGroup() as tg:
+            tg.create_task(stop.wait(), name="receive_loop()")
+            # Unnamed tasks are grouped by coroutine.
+            tg.create_task(stop.wait())
+
+    task = asyncio.create_task(session(), name="session()")
+    await asyncio.sleep(0.01)
+
+    snapshot = snapshot_tasks()
+    assert snapshot.by_name["receive_loop()"].count == 1
+    assert snapshot.by_name["Event.wait"].count == 1
+    age = snapshot.by_name["session()"].oldest_age_sec
+    assert age is not None and age >= 0.01
+    # The task setting the id and those it created.
+    assert snapshot.by_session == {"abc": 3}
+
+    stop.set()
+    await task
+    assert "receive_loop()" not in snapshot_tasks().by_name
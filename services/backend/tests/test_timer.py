@@ -0,0 +1,20 @@
+import pytest
+
+from backend.timer import PhasesStopwatch
+
+
+def test_phases_stopwatch_partial_phases():
+    phases = PhasesStopwatch(["a", "b", "c", "d"])
+    phases.time_phase_if_not_started("a", t=1.0)
+    phases.time_phase_if_not_started("c", t=3.5, check_previous=False)
+    phases.time_phase_if_not_started("d", t=4.0, check_previous=False)
+
+    assert phases.phase_durations() == {"c": 2.5, "d": 0.5}
+    assert phases.relative_times() == {"a": 0.0, "c": 2.5, "d": 3.0}
+
+    with pytest.raises(RuntimeError):
+        phases.get_time_for_phase("b")
+
+    phases.reset()
+    assert phases.phase_durations() == {}
+    assert phases.relative_times() == {}
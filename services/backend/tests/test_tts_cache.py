@@ -0,0 +1,98 @@
+import asyncio
+import pathlib
+import threading
+
+import pytest
+
+from backend.libs.tts_cache import TTSCache, tts_cache_key
+
+
+async def read(audio) -> bytes:
+    assert audio is not None
+    return b"".join([chunk async for chunk in audio])
+
+
+def make_cache(directory: pathlib.Path, **kwargs) -> TTSCache:
+    return TTSCache(
+        directory,
+        **{
+            "max_bytes": 1000,
+            "max_bytes_per_user": 600,
+            "hot_max_bytes": 100,
+            "hot_max_entry_bytes": 50,
+            **kwargs,
+        },
+    )
+
+
+def test_tts_cache_key():
+    key = tts_cache_key("kelly", "Thank you.", 48000, "pcm")
+    assert key == tts_cache_key("kelly", "  Thank \n you.", 48000, "pcm")
+    assert key != tts_cache_key("kelly", "thank you", 48000, "pcm")
+    assert key != tts_cache_key("other", "Thank you.", 48000, "pcm")
+    assert key != tts_cache_key("kelly", "Thank you.", 24000, "wav")
+
+
+@pytest.mark.asyncio
+async def test_tts_cache_hits(tmp_path):
+    cache = make_cache(tmp_path)
+    assert await cache.get("small") is None
+
+    await cache.put("small", b"s" * 10, "alice")
+    await cache.put("large", b"l" * 200, "alice")
+    assert await read(await cache.get("small")) == b"s" * 10
+    assert await read(await cache.get("large")) == b"l" * 200
+    assert "small" in cache.hot and "large" not in cache.hot
+    assert cache.hits == 2 and cache.misses == 1
+    assert cache.bytes_saved == 210
+
+    # Loaded back from disk by a new process.
+    restarted = make_cache(tmp_path)
+    assert await read(await restarted.get("large")) == b"l" * 200
+    assert restarted.bytes_by_user == {"alice": 210}
+
+
+@pytest.mark.asyncio
+async def test_tts_cache_eviction(tmp_path):
+    cache = make_cache(tmp_path)
+    await cache.put("a1", b"x" * 300, "alice")
+    await cache.put("b1", b"x" * 300, "bob")
+    await cache.put("a2", b"x" * 300, "alice")
+    await cache.put("a3", b"x" * 100, "alice")
+    # Alice is over her quota: her least recently used entry goes, not Bob's.
+    assert list(cache.entries) == ["b1", "a2", "a3"]
+    assert cache.bytes_by_user == {"alice": 400, "bob": 300}
+
+    # Over the total size, the least recently used entry goes, whoever it belongs to.
+    assert await cache.get("b1") is not None
+    await cache.put("c1", b"x" * 400, "carol")
+    assert list(cache.entries) == ["a3", "b1", "c1"]
+    assert cache.total_bytes == 800
+    assert not (tmp_path / "a2.audio").exists()
+
+
+@pytest.mark.asyncio
+async def test_tts_cache_read_error_after_eviction(tmp_path):
+    await make_cache(tmp_path).put("a1", b"x" * 30, "alice")
+    # Not in memory, read from disk.
+    cache = make_cache(tmp_path)
+    await cache._ensure_loaded()
+    audio_path = cache._audio_path
+    evicted = threading.Event()
+
+    class UnreadablePath:
+        def read_bytes(self):
+            evicted.wait(5)
+            raise OSError("Input/output error")
+
+    cache._audio_path = lambda key: UnreadablePath()  # type: ignore[method-assign]
+    get = asyncio.create_task(cache.get("a1"))
+    await asyncio.sleep(0.05)
+    cache._audio_path = audio_path  # type: ignore[method-assign]
+
+    # Evicted while being read, then the read fails: a miss rather than an error.
+    await cache.put("a2", b"x" * 600, "alice")
+    assert "a1" not in cache.entries
+    evicted.set()
+    assert await get is None
+    assert cache.bytes_by_user == {"alice": 600}
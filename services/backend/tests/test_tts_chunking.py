@@ -0,0 +1,149 @@
+import asyncio
+import struct
+
+import pytest
+
+from backend.tts.chunking import (
+    WAV_UNKNOWN_SIZE,
+    split_text,
+    stream_in_order,
+    wav_samples,
+)
+
+
+async def aiter(chunks: list[bytes], delay: float = 0.0):
+    for chunk in chunks:
+        await asyncio.sleep(delay)
+        yield chunk
+
+
+async def read(audio) -> bytes:
+    return b"".join([chunk async for chunk in audio])
+
+
+def wav_header(data_size: int, bits_per_sample: int = 16) -> bytes:
+    fmt = struct.pack("<HHIIHH", 1, 1, 24000, 48000, 2, bits_per_sample)
+    return (
+        b"RIFF"
+        + struct.pack("<I", 4 + 8 + len(fmt) + 8 + data_size)
+        + b"WAVE"
+        + b"fmt "
+        + struct.pack("<I", len(fmt))
+        + fmt
+        + b"data"
+        + struct.pack("<I", data_size)
+    )
+
+
+def test_split_text():
+    assert split_text("  Thank you.  ", 20, 50) == ["Thank you."]
+
+    text = "Yes. I would love to come to the party on Saturday. What should I bring?"
+    chunks = split_text(text, 20, 50)
+    assert chunks == [
+        "Yes.",
+        "I would love to come to the party on Saturday.",
+        "What should I bring?",
+    ]
+    assert " ".join(chunks) == text
+
+    # A long first sentence is split at clauses, then between words.
+    text = "Well, honestly, I think that we should probably leave quite early tomorrow"
+    chunks = split_text(text, 20, 100)
+    assert chunks == [
+        "Well, honestly,",
+        "I think that we should probably leave quite early tomorrow",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_stream_in_order():
+    started = []
+
+    def starter(i: int, delay: float):
+        async def start():
+            started.append(i)
+            return aiter([f"{i}a".encode(), f"{i}b".encode()], delay)
+
+        return start
+
+    # The later chunks finish first, but are streamed after.
+    audio = stream_in_order(
+        aiter([b"0a", b"0b"], 0.03), [starter(1, 0.01), starter(2, 0.0)], 2
+    )
+    chunks = [chunk async for chunk in audio]
+    assert chunks == [b"0a", b"0b", b"1a", b"1b", b"2a", b"2b"]
+    assert started == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_stream_in_order_error():
+    async def fail():
+        raise RuntimeError("TTS down")
+
+    audio = stream_in_order(aiter([b"0"]), [fail], 2)
+    assert await anext(audio) == b"0"
+    with pytest.raises(RuntimeError, match="TTS down"):
+        await anext(audio)
+
+
+@pytest.mark.asyncio
+async def test_stream_in_order_closes_unfinished_chunks():
+    closed = []
+
+    async def endless(i: int):
+        try:
+            while True:
+                await asyncio.sleep(0.001)
+                yield f"{i}".encode()
+        finally:
+            closed.append(i)
+
+    def starter(i: int):
+        async def start():
+            # Like the requests of the other chunks, stripped of their WAV header.
+            return wav_samples(endless(i), keep_header=False)
+
+        return start
+
+    # The consumer stops while the next chunk is prefetched.
+    audio = stream_in_order(endless(0), [starter(1), starter(2)], 2)
+    assert await anext(audio) == b"0"
+    await asyncio.sleep(0.01)
+    await audio.aclose()
+    assert sorted(closed) == [0, 1]
+
+    # A chunk fails while the next one is prefetched.
+    async def fail():
+        raise RuntimeError("TTS down")
+
+    closed.clear()
+    audio = stream_in_order(aiter([b"0"], 0.01), [fail, starter(2)], 2)
+    with pytest.raises(RuntimeError, match="TTS down"):
+        await read(audio)
+    assert closed == [2]
+
+
+@pytest.mark.asyncio
+async def test_wav_samples():
+    samples = bytes(range(100))
+    wav = wav_header(len(samples)) + samples
+    # Split in the middle of the header.
+    parts = [wav[:10], wav[10:30], wav[30:60], wav[60:]]
+
+    assert await read(wav_samples(aiter(parts), keep_header=False)) == samples
+
+    kept = await read(wav_samples(aiter(parts), keep_header=True))
+    assert kept[44:] == samples
+    assert struct.unpack_from("<I", kept, 4)[0] == WAV_UNKNOWN_SIZE
+    assert struct.unpack_from("<I", kept, 40)[0] == WAV_UNKNOWN_SIZE
+    assert kept[8:36] == wav[8:36]
+
+    # Not a WAV, e.g. raw PCM.
+    assert await read(wav_samples(aiter([samples]), keep_header=False)) == samples
+
+    # Only 16-bit samples can be handled.
+    with pytest.raises(ValueError, match="24-bit"):
+        await read(
+            wav_samples(aiter([wav_header(6, 24) + bytes(6)]), keep_header=False)
+        )
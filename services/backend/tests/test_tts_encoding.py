@@ -0,0 +1,88 @@
+import struct
+
+import numpy as np
+import pytest
+import sphn
+
+from backend.tts.encoding import (
+    encode_audio,
+    negotiate_format,
+    pcm_arrays,
+    wav_header,
+)
+
+
+async def aiter(chunks: list[bytes]):
+    for chunk in chunks:
+        yield chunk
+
+
+async def read(audio) -> bytes:
+    return b"".join([chunk async for chunk in audio])
+
+
+def test_negotiate_format():
+    assert negotiate_format(None, None, "wav") == "wav"
+    assert negotiate_format(None, "*/*", "pcm") == "pcm"
+    assert negotiate_format(None, "audio/ogg", "pcm") == "opus"
+    assert negotiate_format(None, "audio/wav;q=0.5, audio/ogg", "pcm") == "opus"
+    assert negotiate_format(None, "audio/ogg;q=0.2, Audio/WAV", "pcm") == "wav"
+    assert negotiate_format(None, "video/mp4, */*;q=0.1", "wav") == "wav"
+    # The request field takes precedence.
+    assert negotiate_format("pcm", "audio/ogg", "wav") == "pcm"
+
+
+@pytest.mark.asyncio
+async def test_encode_pcm_and_wav():
+    samples = struct.pack("<4h", 1, -1, 2, -2)
+    wav = wav_header(24000) + samples
+    assert struct.unpack_from("<I", wav, 24)[0] == 24000
+
+    assert await read(encode_audio(aiter([wav]), "wav", "wav", 24000)) == wav
+    assert await read(
+        encode_audio(aiter([wav[:30], wav[30:]]), "wav", "pcm", 24000)
+    ) == (samples)
+    assert await read(encode_audio(aiter([samples]), "pcm", "wav", 24000)) == wav
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("sample_rate", [24000, 48000])
+async def test_encode_opus(sample_rate):
+    t = np.arange(sample_rate) / sample_rate
+    pcm = (np.sin(2 * np.pi * 440 * t) * 10000).astype("<i2").tobytes()
+    # Chunks that split samples in two.
+    chunks = [pcm[i : i + 4801] for i in range(0, len(pcm), 4801)]
+
+    opus = await read(encode_audio(aiter(chunks), "pcm", "opus", sample_rate))
+    assert opus.startswith(b"OggS")
+    assert len(opus) < len(pcm) / 5
+    decoded, decoded_rate = sphn.read_opus_bytes(opus)
+    # At least the whole second, and the silence flushing the last frame.
+    assert 1.0 <= decoded.shape[-1] / decoded_rate <= 1.1
+
+
+@pytest.mark.asyncio
+async def test_pcm_arrays():
+    samples = np.array([1000, -1000, 2000], dtype="<i2")
+    wav = wav_header(24000) + samples.tobytes()
+    arrays = [
+        a async for a in pcm_arrays(aiter([wav[:45], wav[45:]]), "wav", 24000, 24000)
+    ]
+    np.testing.assert_array_equal(np.concatenate(arrays) * 32768, samples)
+
+    # Downsampled in chunks that split samples: the tone is kept, the high frequency
+    # would alias and is filtered out.
+    t = np.arange(48000) / 48000
+    tone = 0.25 * np.sin(2 * np.pi * 1000 * t)
+    pcm = ((tone + 0.25 * np.sin(2 * np.pi * 18000 * t)) * 32768).astype("<i2")
+    pcm_bytes = pcm.tobytes()
+    chunks = [pcm_bytes[i : i + 4801] for i in range(0, len(pcm_bytes), 4801)]
+    arrays = [a async for a in pcm_arrays(aiter(chunks), "pcm", 48000, 24000)]
+    downsampled = np.concatenate(arrays)
+    assert len(downsampled) == 24000
+    # Delayed by half of the filter.
+    expected = tone[::2][:-16]
+    assert np.abs(downsampled[16 + 100 :] - expected[100:]).max() < 0.01
+
+    with pytest.raises(ValueError):
+        await anext(pcm_arrays(aiter([pcm_bytes]), "pcm", 44100, 24000))
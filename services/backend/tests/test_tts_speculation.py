@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+
+from backend.tts.speculation import SpeculativeTTS
+
+
+def make_speculative_tts(**kwargs) -> SpeculativeTTS:
+    return SpeculativeTTS(
+        **{"top_n": 2, "max_per_session": 2, "max_global": 10, "ttl_sec": 60, **kwargs}
+    )
+
+
+def synthesizer(audio: bytes, delay: float = 0.0, started: list | None = None):
+    async def synthesize() -> bytes:
+        if started is not None:
+            started.append(audio)
+        await asyncio.sleep(delay)
+        return audio
+
+    return synthesize
+
+
+@pytest.mark.asyncio
+async def test_speculation_serves_the_top_answers():
+    tts = make_speculative_tts()
+    session = tts.session()
+    for i, text in enumerate([b"yes", b"no", b"maybe"]):
+        session.submit(i, text.decode(), synthesizer(text))
+    await asyncio.sleep(0.01)
+
+    assert await tts.take("yes") == b"yes"
+    # Only the top 2 answers are synthesized.
+    assert await tts.take("maybe") is None
+    # Taken only once, the route caches it afterwards.
+    assert await tts.take("yes") is None
+    assert tts.hits == 1 and tts.misses == 2
+    assert tts.started == 2 and tts.wasted == 0
+
+
+@pytest.mark.asyncio
+async def test_speculation_waits_for_a_running_synthesis():
+    tts = make_speculative_tts()
+    session = tts.session()
+    session.submit(0, "yes", synthesizer(b"yes", delay=0.05))
+    await asyncio.sleep(0.01)
+
+    take = asyncio.create_task(tts.take("yes"))
+    await asyncio.sleep(0.01)
+    # Picking the answer starts a new generation, which doesn't stop this synthesis.
+    session.supersede()
+    assert await take == b"yes"
+    assert tts.wasted == 0
+
+
+@pytest.mark.asyncio
+async def test_speculation_superseded_and_expired():
+    tts = make_speculative_tts(max_per_session=1, ttl_sec=0.05)
+    session = tts.session()
+    started = []
+    session.submit(0, "yes", synthesizer(b"yes", started=started))
+    session.submit(1, "no", synthesizer(b"no", delay=1.0, started=started))
+    await asyncio.sleep(0.01)
+    assert started == [b"yes", b"no"]
+
+    session.supersede()
+    await asyncio.sleep(0.01)
+    assert await tts.take("no") is None
+    # Still there until it expires.
+    await asyncio.sleep(0.05)
+    assert await tts.take("yes") is None
+    assert tts.started == 2 and tts.wasted == 2
+    assert tts.wasted_ratio == 1.0
+
+
+@pytest.mark.asyncio
+async def test_speculation_budgets():
+    tts = make_speculative_tts(top_n=3, max_per_session=1, max_global=2)
+    started = []
+    first, second = tts.session(), tts.session()
+    for i, text in enumerate([b"a", b"b", b"c"]):
+        first.submit(i, text.decode(), synthesizer(text, 0.05, started))
+    second.submit(0, "d", synthesizer(b"d", 0.05, started))
+    await asyncio.sleep(0.01)
+    # One at a time per session.
+    assert started == [b"a", b"d"]
+
+    # Over the global budget, skipped rather than queued.
+    third = tts.session()
+    third.submit(0, "e", synthesizer(b"e", 0.05, started))
+    await asyncio.sleep(0.01)
+    assert b"e" not in started
+
+    await asyncio.sleep(0.15)
+    assert started == [b"a", b"d", b"b", b"c"]
+    assert await tts.take("c") == b"c"
+
+
+@pytest.mark.asyncio
+async def test_speculation_failure_is_a_miss():
+    tts = make_speculative_tts()
+
+    async def fail() -> bytes:
+        raise RuntimeError("TTS down")
+
+    tts.session().submit(0, "yes", fail)
+    await asyncio.sleep(0.01)
+    assert await tts.take("yes") is None
+    assert tts.misses == 1 and tts.wasted == 1
+
+
+@pytest.mark.asyncio
+async def test_speculation_disabled():
+    tts = make_speculative_tts(top_n=0)
+    started = []
+    tts.session().submit(0, "yes", synthesizer(b"yes", started=started))
+    await asyncio.sleep(0.01)
+    assert started == []
+    assert await tts.take("yes") is None
+    assert tts.misses == 0
@@ -0,0 +1,138 @@
+import asyncio
+import uuid
+
+import numpy as np
+import pytest
+
+import backend.openai_realtime_api_events as ora
+import backend.unmute_handler as unmute_handler
+from backend.kyutai_constants import SAMPLES_PER_FRAME
+from backend.stt.pause_detection_eval import TimelineRecorder
+from backend.timer import get_time
+
+
+class Histogram:
+    """Records the last value observed for each phase."""
+
+    def __init__(self):
+        self.observed: dict[str, float] = {}
+
+    def labels(self, phase: str):
+        return _Child(self.observed, phase)
+
+
+class _Child:
+    def __init__(self, observed: dict[str, float], phase: str):
+        self.observed, self.phase = observed, phase
+
+    def observe(self, value: float):
+        self.observed[self.phase] = value
+
+
+@pytest.mark.asyncio
+async def test_turn_phases_with_a_word_during_the_flush(handler, monkeypatch):
+    histogram = Histogram()
+    monkeypatch.setattr(unmute_handler.mt, "TURN_PHASE_DURATION", histogram)
+
+    handler.last_word_time = get_time()
+    await asyncio.sleep(0.01)
+    handler._start_turn_phases()
+    await asyncio.sleep(0.01)
+    # Transcribed during the flush, after the pause was detected.
+    handler.last_word_time = get_time()
+    await asyncio.sleep(0.01)
+    handler._time_flush_done()
+    for phase in ["llm_request_sent", "llm_first_token", "first_answer"]:
+        await asyncio.sleep(0.01)
+        handler._time_turn_phase(handler.turn_phases, phase)
+    handler._report_turn_phases(handler.turn_phases)
+
+    assert list(histogram.observed) == [
+        "pause_detected",
+        "stt_tail",
+        "flush_done",
+        "llm_request_sent",
+        "llm_first_token",
+        "first_answer",
+    ]
+    assert all(duration >= 0 for duration in histogram.observed.values())
+    assert all(t >= 0 for t in handler.debug_dict["turn_phases"].values())
+
+
+@pytest.mark.asyncio
+async def test_a_tts_request_supersedes_the_previous_one(handler, monkeypatch):
+    async def get_audio(voice_id, text, user_email, lock):
+        async def chunks():
+            for _ in range(3 if text == "second" else 1000):
+                yield b"\0" * 960
+                await asyncio.sleep(0.001)
+
+        return chunks()
+
+    async def pcm_arrays(audio, *args):
+        async for _chunk in audio:
+            yield np.zeros(480, dtype=np.float32)
+
+    async def get_voice_id(voice_name):
+        return "voice"
+
+    monkeypatch.setattr(unmute_handler, "get_audio", get_audio)
+    monkeypatch.setattr(unmute_handler, "pcm_arrays", pcm_arrays)
+    monkeypatch.setattr(handler, "_get_voice_id", get_voice_id)
+
+    first, second = uuid.uuid4(), uuid.uuid4()
+    async with handler:
+        await handler.speak(ora.TTSRequest(text="first", message_id=first))
+        # Some of its audio is queued, not sent yet.
+        await asyncio.sleep(0.05)
+        await handler.speak(ora.TTSRequest(text="second", message_id=second))
+
+        outputs = []
+        while not (
+            outputs
+            and isinstance(outputs[-1], ora.ResponseAudioDone)
+            and outputs[-1].response_id == second
+        ):
+            outputs.append(await asyncio.wait_for(handler.emit(), timeout=1))
+
+    assert isinstance(outputs[0], ora.ResponseAudioDone)
+    assert outputs[0].response_id == first
+    audio = outputs[1:-1]
+    assert len(audio) == 3 + 1  # With the silence flushing the last Opus frame.
+    assert all(response_id == second for _, response_id, _ in audio)
+
+
+class FakeSTT:
+    def __init__(self):
+        self.sent_samples = 0
+        self.pause_prediction = Value(0.0)
+        self.current_time = 0.0
+
+    async def send_audio(self, audio: np.ndarray):
+        self.sent_samples += len(audio)
+        self.pause_prediction = Value(1.0)
+
+
+class Value:
+    def __init__(self, value: float):
+        self.value = value
+
+
+@pytest.mark.asyncio
+async def test_timeline_frames_are_recorded_as_seen_by_the_pause_detector(
+    handler, monkeypatch
+):
+    stt = FakeSTT()
+    monkeypatch.setattr(type(handler), "stt", property(lambda self: stt))
+    handler.timeline_recorder = TimelineRecorder()
+    handler.stt_end_of_flush_time = 1.0  # Flushing, the detector doesn't run.
+
+    frame = np.zeros((1, SAMPLES_PER_FRAME), dtype=np.int16)
+    for _ in range(2):
+        await handler.receive((handler.input_sample_rate, frame))
+
+    frames = handler.timeline_recorder.frames
+    # At the end of each frame, like `replay` assumes.
+    frame_sec = SAMPLES_PER_FRAME / handler.input_sample_rate
+    assert frames["t"] == [frame_sec, 2 * frame_sec]
+    assert frames["pause_prediction"] == [1.0, 1.0]
@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+from fastapi.websockets import WebSocketState
+
+import backend.openai_realtime_api_events as ora
+from backend.libs.sessions import Session
+from backend.libs.websockets import EVENT_BATCH_MAX_DELAY_SEC, emit_loop
+
+
+class Handler:
+    """Stands in for `UnmuteHandler`, only its output queue is used."""
+
+    def __init__(self):
+        self.output_queue: asyncio.Queue = asyncio.Queue()
+
+    async def emit(self):
+        return await self.output_queue.get()
+
+
+class StalledWebSocket:
+    """A client that stopped reading, the sends never complete."""
+
+    application_state = WebSocketState.CONNECTED
+    client_state = WebSocketState.CONNECTED
+
+    def __init__(self):
+        self.sending = asyncio.Event()
+
+    async def send_text(self, data: str):
+        self.sending.set()
+        await asyncio.Event().wait()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("batch_events", [False, True])
+async def test_emit_loop_cancelled_keeps_events(batch_events):
+    handler = Handler()
+    session = Session(handler, "user@example.com")  # type: ignore[arg-type]
+    websocket = StalledWebSocket()
+    events = [ora.InputAudioBufferSpeechStopped() for _ in range(3)]
+    for event in events:
+        handler.output_queue.put_nowait(event)
+
+    emit = asyncio.create_task(
+        emit_loop(websocket, session, batch_events=batch_events)  # type: ignore[arg-type]
+    )
+    await asyncio.wait_for(websocket.sending.wait(), 10 * EVENT_BATCH_MAX_DELAY_SEC)
+    # E.g. the receive loop stopped because the client disconnected.
+    emit.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await emit
+
+    # Sent again if the session is resumed, those being sent included.
+    still_queued = [
+        handler.output_queue.get_nowait() for _ in range(handler.output_queue.qsize())
+    ]
+    assert session.unsent_outputs + still_queued == events
+    assert session.unsent_outputs
@@ -0,0 +1,31 @@
+import { applyDebugDictUpdate } from '../../utils/additionalOutputs';
+
+describe('applyDebugDictUpdate', () => {
+  it('replaces everything with a snapshot', () => {
+    const next = applyDebugDictUpdate(
+      { old: 1 },
+      { snapshot: true, debug_dict: { state: 'user_speaking' } },
+    );
+    expect(next).toEqual({ state: 'user_speaking' });
+  });
+
+  it('merges the changed keys of a delta', () => {
+    const next = applyDebugDictUpdate(
+      { state: 'user_speaking', timing: { a: 1 }, stale: true },
+      {
+        snapshot: false,
+        debug_dict: { timing: { a: 1, b: 2 } },
+        removed_debug_keys: ['stale'],
+      },
+    );
+    expect(next).toEqual({ state: 'user_speaking', timing: { a: 1, b: 2 } });
+  });
+
+  it('uses a delta as is when nothing was received yet', () => {
+    const next = applyDebugDictUpdate(null, {
+      snapshot: false,
+      debug_dict: { state: 'bot_speaking' },
+    });
+    expect(next).toEqual({ state: 'bot_speaking' });
+  });
+});
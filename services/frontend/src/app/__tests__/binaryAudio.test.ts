@@ -0,0 +1,37 @@
+import {
+  decodeOutputAudioFrame,
+  encodeInputAudioFrame,
+  INPUT_AUDIO_FRAME,
+  OUTPUT_AUDIO_FRAME,
+} from '../../utils/binaryAudio';
+
+describe('Binary audio frames', () => {
+  it('prefixes input audio with its frame kind', () => {
+    const frame = encodeInputAudioFrame(new Uint8Array([79, 103, 103, 83]));
+    expect(Array.from(frame)).toEqual([INPUT_AUDIO_FRAME, 79, 103, 103, 83]);
+  });
+
+  it('decodes output audio frames', () => {
+    const frame = new Uint8Array(1 + 16 + 2);
+    frame[0] = OUTPUT_AUDIO_FRAME;
+    frame.set(
+      [
+        0x12, 0x34, 0x56, 0x78, 0x9a, 0xbc, 0x4d, 0xef, 0x81, 0x23, 0x45, 0x67,
+        0x89, 0xab, 0xcd, 0xef,
+      ],
+      1,
+    );
+    frame.set([1, 2], 17);
+
+    const decoded = decodeOutputAudioFrame(frame.buffer);
+    expect(decoded).not.toBeNull();
+    expect(decoded?.responseId).toBe('12345678-9abc-4def-8123-456789abcdef');
+    expect(Array.from(decoded?.opus ?? [])).toEqual([1, 2]);
+  });
+
+  it('rejects frames of another kind', () => {
+    const frame = new Uint8Array(20);
+    frame[0] = INPUT_AUDIO_FRAME;
+    expect(decodeOutputAudioFrame(frame.buffer)).toBeNull();
+  });
+});
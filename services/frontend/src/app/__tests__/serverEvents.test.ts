@@ -0,0 +1,27 @@
+import { parseServerEvents } from '../../utils/serverEvents';
+
+describe('parseServerEvents', () => {
+  it('parses a single event', () => {
+    const events = parseServerEvents(
+      JSON.stringify({ type: 'one.keyword', event_id: 'event_1' }),
+    );
+    expect(events).toEqual([{ type: 'one.keyword', event_id: 'event_1' }]);
+  });
+
+  it('parses a batch of events in order', () => {
+    const events = parseServerEvents(
+      JSON.stringify([
+        { type: 'conversation.item.input_audio_transcription.delta' },
+        { type: 'input_audio_buffer.speech_stopped' },
+      ]),
+    );
+    expect(events.map((event) => event.type)).toEqual([
+      'conversation.item.input_audio_transcription.delta',
+      'input_audio_buffer.speech_stopped',
+    ]);
+  });
+
+  it('throws on invalid JSON', () => {
+    expect(() => parseServerEvents('{')).toThrow();
+  });
+});
@@ -279,6 +279,52 @@ describe('InvincibleVoice Transcription Message Handling Tests', () => {
     );
   });
 
+  test('batched frames handle every event with the state left by the previous one', async () => {
+    render(<InvincibleVoice userId='12345678-1234-4234-8234-123456789012' />);
+
+    await waitFor(() => {
+      expect(screen.getByTitle('Start Conversation')).toBeInTheDocument();
+    });
+
+    // Frames go through the handler given to the websocket, without a render
+    // between the events of a batch.
+    const receiveFrame = async (events: object[]) => {
+      const useWebSocket = require('react-use-websocket').default;
+      const { onMessage } = useWebSocket.mock.calls.at(-1)[1];
+      await act(async () => {
+        onMessage({ data: JSON.stringify(events) });
+      });
+    };
+    const delta = (text: string, eventId: string) => ({
+      type: 'conversation.item.input_audio_transcription.delta',
+      delta: text,
+      event_id: eventId,
+    });
+
+    await receiveFrame([
+      delta('Hello', 'event-1'),
+      delta('there', 'event-2'),
+      {
+        type: 'one.response',
+        content: 'Response option 1',
+        timestamp: new Date().toISOString(),
+        index: 0,
+      },
+    ]);
+    await receiveFrame([delta('Next', 'event-3'), delta('turn', 'event-4')]);
+
+    // The transcript of the first turn moved to the history when the response
+    // arrived, the next words start a new one.
+    await waitFor(
+      () => {
+        expect(screen.getByText('Hello there')).toBeInTheDocument();
+        expect(screen.getByText('Next turn')).toBeInTheDocument();
+      },
+      { timeout: 3000 },
+    );
+    expect(screen.queryByText('Hello there Next turn')).not.toBeInTheDocument();
+  });
+
   test('duplicate messages with same event_id are not processed twice', async () => {
     const { rerender } = render(
       <InvincibleVoice userId='12345678-1234-4234-8234-123456789012' />,
@@ -42,12 +42,18 @@ import { useMobileDetection } from '@/hooks/useMobileDetection';
 import useWakeLock from '@/hooks/useWakeLock';
 import { useTranslations } from '@/i18n';
 import { ChatMessage } from '@/types/chatHistory';
+import { applyDebugDictUpdate } from '@/utils/additionalOutputs';
 import { base64EncodeOpus } from '@/utils/audioUtil';
+import {
+  BINARY_AUDIO_SUBPROTOCOL,
+  encodeInputAudioFrame,
+} from '@/utils/binaryAudio';
 import {
   convertConversationToChat,
   getStaticContextOption,
   getStaticRepeatOption,
 } from '@/utils/conversationUtils';
+import { BATCH_EVENTS_PARAM, parseServerEvents } from '@/utils/serverEvents';
 import { calculateTotalTokens, formatTokenCount } from '@/utils/tokenUtils';
 import { ttsCache } from '@/utils/ttsCache';
 import { playTTSStream } from '@/utils/ttsUtil';
@@ -76,25 +82,35 @@ const InvincibleVoice = () => {
   const [pendingResponses, setPendingResponses] = useState<PendingResponse[]>(
     [],
   );
-  const [responseTimelines, setResponseTimelines] = useState<number[]>([
-    0, 0, 0, 0,
-  ]);
   const hidePanes = false;
   const [pendingKeywords, setPendingKeywords] = useState<PendingKeyword[]>([]);
-  const [keywordTimelines, setKeywordTimelines] = useState<number[]>(
-    Array(10).fill(0),
-  );
-  const [lastProcessedMessageId, setLastProcessedMessageId] = useState<
-    string | null
-  >(null);
   const [currentSpeakerMessage, setCurrentSpeakerMessage] =
     useState<string>('');
   const [currentSpeakerMessageStartTime, setCurrentSpeakerMessageStartTime] =
     useState<number | null>(null);
+  // Read by the websocket handler from refs and not from the state: a batched
+  // frame holds several events, which are all handled before the next render.
+  const responseTimelinesRef = useRef<number[]>([0, 0, 0, 0]);
+  const keywordTimelinesRef = useRef<number[]>(Array(10).fill(0));
+  const lastProcessedMessageIdRef = useRef<string | null>(null);
+  const currentSpeakerMessageRef = useRef<{
+    text: string;
+    startTime: number | null;
+  }>({ text: '', startTime: null });
+  const updateCurrentSpeakerMessage = useCallback(
+    (text: string, startTime: number | null) => {
+      currentSpeakerMessageRef.current = { text, startTime };
+      setCurrentSpeakerMessage(text);
+      setCurrentSpeakerMessageStartTime(startTime);
+    },
+    [],
+  );
   const [textInput, setTextInput] = useState<string>('');
   const [lastSentKeywords, setLastSentKeywords] = useState<string | null>(null);
   const [lastSentText, setLastSentText] = useState<string>('');
   const textInputTimeoutRef = useRef<NodeJS.Timeout | null>(null);
+  // Whether the server accepted to exchange audio as binary frames.
+  const binaryAudioRef = useRef<boolean>(false);
   const [isSettingsOpen, setIsSettingsOpen] = useState<boolean>(false);
   const [settingsBlockedMessage, setSettingsBlockedMessage] = useState<
     string | null
@@ -130,7 +146,7 @@ const InvincibleVoice = () => {
     // Create timezone-aware datetime for local_time parameter
     const localTime = new Date().toISOString();
     const encodedLocalTime = encodeURIComponent(localTime);
-    return `${backendServerUrl.toString()}/v1/user/new-conversation?local_time=${encodedLocalTime}`;
+    return `${backendServerUrl.toString()}/v1/user/new-conversation?local_time=${encodedLocalTime}&${BATCH_EVENTS_PARAM}`;
   }, [backendServerUrl]);
   const handleInComingMessage = useCallback(
     (lastMessage: WebSocketEventMap['message']) => {
@@ -138,153 +154,159 @@ const InvincibleVoice = () => {
         return;
       }
 
-      const data = JSON.parse(lastMessage.data);
-
-      // Prevent processing the same message multiple times
-      if (data.event_id && data.event_id === lastProcessedMessageId) {
+      if (typeof lastMessage.data !== 'string') {
+        // Binary frames only carry the audio of the responses, which this UI
+        // plays from `/v1/tts/`. They are dropped without being decoded.
         return;
       }
-      if (data.event_id) {
-        setLastProcessedMessageId(data.event_id);
-      }
 
-      if (data.type === 'unmute.additional_outputs') {
-        setDebugDict(data.args.debug_dict);
-      } else if (data.type === 'error') {
-        if (data.error.type === 'warning') {
-          console.warn(`Warning from server: ${data.error.message}`, data);
-        } else {
-          console.error(`Error from server: ${data.error.message}`, data);
-          setErrors((prev) => [...prev, makeErrorItem(data.error.message)]);
+      // Batches are handled one event at a time, in order.
+      parseServerEvents(lastMessage.data).forEach((data) => {
+        // Prevent processing the same message multiple times
+        if (
+          data.event_id &&
+          data.event_id === lastProcessedMessageIdRef.current
+        ) {
+          return;
         }
-      } else if (
-        data.type === 'conversation.item.input_audio_transcription.delta'
-      ) {
-        // Real-time transcription of speaker
-        setCurrentSpeakerMessage((prev) => {
-          const newMessage = prev + (prev.length > 0 ? ' ' : '') + data.delta;
-          // Set start time when first transcription arrives
-          if (prev.length === 0) {
-            setCurrentSpeakerMessageStartTime(Date.now());
-          }
-          return newMessage;
-        });
-      } else if (data.type === 'one.response') {
-        // Progressive response handling - responses come one at a time
-        // Only update if this response is newer than what we have
-        // Convert ISO string timestamp to number for comparison
-        const responseTimestamp = new Date(data.timestamp).getTime();
-        if (responseTimestamp >= responseTimelines[data.index]) {
-          // Add speaker message to history on first response if not already added
-          if (
-            data.index === 0 &&
-            currentSpeakerMessage.trim() &&
-            pendingResponses.length === 0
-          ) {
-            setRawChatHistory((prev) => [
-              ...prev,
-              {
-                role: 'user',
-                content: currentSpeakerMessage,
-                timestamp: currentSpeakerMessageStartTime || Date.now(),
-              },
-            ]);
-            setCurrentSpeakerMessage('');
-            setCurrentSpeakerMessageStartTime(null);
+        if (data.event_id) {
+          lastProcessedMessageIdRef.current = data.event_id;
+        }
+
+        if (data.type === 'unmute.additional_outputs') {
+          setDebugDict((prev) => applyDebugDictUpdate(prev, data.args));
+        } else if (data.type === 'error') {
+          if (data.error.type === 'warning') {
+            console.warn(`Warning from server: ${data.error.message}`, data);
+          } else {
+            console.error(`Error from server: ${data.error.message}`, data);
+            setErrors((prev) => [...prev, makeErrorItem(data.error.message)]);
           }
+        } else if (
+          data.type === 'conversation.item.input_audio_transcription.delta'
+        ) {
+          // Real-time transcription of speaker
+          const { text, startTime } = currentSpeakerMessageRef.current;
+          updateCurrentSpeakerMessage(
+            text + (text.length > 0 ? ' ' : '') + data.delta,
+            // Set start time when first transcription arrives
+            text.length === 0 ? Date.now() : startTime,
+          );
+        } else if (data.type === 'one.response') {
+          // Progressive response handling - responses come one at a time
+          // Only update if this response is newer than what we have
+          // Convert ISO string timestamp to number for comparison
+          const responseTimestamp = new Date(data.timestamp).getTime();
+          const responseTimelines = responseTimelinesRef.current;
+          if (responseTimestamp >= responseTimelines[data.index]) {
+            // Add speaker message to history on first response if not already
+            // added, when no response was received since they were cleared.
+            const { text, startTime } = currentSpeakerMessageRef.current;
+            if (
+              data.index === 0 &&
+              text.trim() &&
+              responseTimelines.every((timestamp) => timestamp === 0)
+            ) {
+              setRawChatHistory((prev) => [
+                ...prev,
+                {
+                  role: 'user',
+                  content: text,
+                  timestamp: startTime || Date.now(),
+                },
+              ]);
+              updateCurrentSpeakerMessage('', null);
+            }
 
-          setResponseTimelines((prev) => {
-            const newTimelines = [...prev];
-            newTimelines[data.index] = responseTimestamp;
-            return newTimelines;
-          });
+            responseTimelines[data.index] = responseTimestamp;
 
-          const responseMessageId = crypto.randomUUID();
-          setPendingResponses((prev) => {
-            const newResponses = [...prev];
-            // Ensure we have at least index + 1 responses
-            while (newResponses.length <= data.index) {
-              newResponses.push({
-                id: `response-${newResponses.length}`,
-                text: '',
-                isComplete: false,
-                messageId: crypto.randomUUID(),
-              });
-            }
-            newResponses[data.index] = {
-              id: `response-${data.index}`,
-              text: data.content,
-              isComplete: true,
-              messageId: responseMessageId,
-            };
-            return newResponses;
-          });
-        }
-      } else if (data.type === 'one.keyword') {
-        // Progressive keyword handling - keywords come one at a time
-        // Only update if this keyword is newer than what we have
-        // Convert ISO string timestamp to number for comparison
-        const keywordTimestamp = new Date(data.timestamp).getTime();
-        if (keywordTimestamp >= keywordTimelines[data.index]) {
-          setKeywordTimelines((prev) => {
-            const newTimelines = [...prev];
-            newTimelines[data.index] = keywordTimestamp;
-            return newTimelines;
-          });
-          setPendingKeywords((prev) => {
-            const newKeywords = [...prev];
-            // Ensure we have at least index + 1 keywords
-            while (newKeywords.length <= data.index) {
-              newKeywords.push({
-                id: `keyword-${newKeywords.length}`,
-                text: '',
-                isComplete: false,
-              });
-            }
-            newKeywords[data.index] = {
-              id: `keyword-${data.index}`,
-              text: data.content,
-              isComplete: true,
-            };
-            return newKeywords;
-          });
+            const responseMessageId = crypto.randomUUID();
+            setPendingResponses((prev) => {
+              const newResponses = [...prev];
+              // Ensure we have at least index + 1 responses
+              while (newResponses.length <= data.index) {
+                newResponses.push({
+                  id: `response-${newResponses.length}`,
+                  text: '',
+                  isComplete: false,
+                  messageId: crypto.randomUUID(),
+                });
+              }
+              newResponses[data.index] = {
+                id: `response-${data.index}`,
+                text: data.content,
+                isComplete: true,
+                messageId: responseMessageId,
+              };
+              return newResponses;
+            });
+          }
+        } else if (data.type === 'one.keyword') {
+          // Progressive keyword handling - keywords come one at a time
+          // Only update if this keyword is newer than what we have
+          // Convert ISO string timestamp to number for comparison
+          const keywordTimestamp = new Date(data.timestamp).getTime();
+          if (keywordTimestamp >= keywordTimelinesRef.current[data.index]) {
+            keywordTimelinesRef.current[data.index] = keywordTimestamp;
+            setPendingKeywords((prev) => {
+              const newKeywords = [...prev];
+              // Ensure we have at least index + 1 keywords
+              while (newKeywords.length <= data.index) {
+                newKeywords.push({
+                  id: `keyword-${newKeywords.length}`,
+                  text: '',
+                  isComplete: false,
+                });
+              }
+              newKeywords[data.index] = {
+                id: `keyword-${data.index}`,
+                text: data.content,
+                isComplete: true,
+              };
+              return newKeywords;
+            });
+          }
+        } else if (
+          ![
+            'input_audio_buffer.speech_stopped',
+            'input_audio_buffer.speech_started',
+            'unmute.interrupted_by_vad',
+            'unmute.response.text.delta.ready',
+            'unmute.response.audio.delta.ready',
+            // This UI starts a new conversation on reconnect, no need to resume.
+            'unmute.session.resumable',
+          ].includes(data.type)
+        ) {
+          console.warn('Received unknown message:', data);
         }
-      } else if (
-        ![
-          'input_audio_buffer.speech_stopped',
-          'input_audio_buffer.speech_started',
-          'unmute.interrupted_by_vad',
-          'unmute.response.text.delta.ready',
-          'unmute.response.audio.delta.ready',
-        ].includes(data.type)
-      ) {
-        console.warn('Received unknown message:', data);
-      }
+      });
     },
-    [
-      currentSpeakerMessage,
-      currentSpeakerMessageStartTime,
-      keywordTimelines,
-      lastProcessedMessageId,
-      pendingResponses.length,
-      responseTimelines,
-    ],
+    [updateCurrentSpeakerMessage],
   );
   const { sendMessage, readyState } = useWebSocket(
     newConversationUrl,
     {
-      protocols: ['realtime', `Bearer.${bearerToken}`],
+      protocols: [
+        'realtime',
+        BINARY_AUDIO_SUBPROTOCOL,
+        `Bearer.${bearerToken}`,
+      ],
+      onOpen: (event: WebSocketEventMap['open']) => {
+        const ws = event.target as WebSocket;
+        ws.binaryType = 'arraybuffer';
+        binaryAudioRef.current = ws.protocol === BINARY_AUDIO_SUBPROTOCOL;
+      },
       onMessage: handleInComingMessage,
     },
     shouldConnect,
   );
   const clearResponses = useCallback(() => {
     setPendingResponses([]);
-    setResponseTimelines([0, 0, 0, 0]);
+    responseTimelinesRef.current = [0, 0, 0, 0];
     setPendingKeywords([]);
-    setKeywordTimelines(Array(10).fill(0));
-    setCurrentSpeakerMessageStartTime(null);
-  }, []);
+    keywordTimelinesRef.current = Array(10).fill(0);
+    updateCurrentSpeakerMessage(currentSpeakerMessageRef.current.text, null);
+  }, [updateCurrentSpeakerMessage]);
   const handleFreezeToggle = useCallback(() => {
     setFrozenResponses((prev) => {
       if (prev) {
@@ -300,6 +322,10 @@ const InvincibleVoice = () => {
   }, []);
   const onOpusRecorded = useCallback(
     (opus: Uint8Array) => {
+      if (binaryAudioRef.current) {
+        sendMessage(encodeInputAudioFrame(opus));
+        return;
+      }
       sendMessage(
         JSON.stringify({
           type: 'input_audio_buffer.append',
@@ -362,8 +388,7 @@ const InvincibleVoice = () => {
               timestamp: currentSpeakerMessageStartTime || Date.now(),
             },
           ]);
-          setCurrentSpeakerMessage('');
-          setCurrentSpeakerMessageStartTime(null);
+          updateCurrentSpeakerMessage('', null);
         }
 
         setRawChatHistory((prev) => [
@@ -404,8 +429,7 @@ const InvincibleVoice = () => {
               timestamp: currentSpeakerMessageStartTime || Date.now(),
             },
           ]);
-          setCurrentSpeakerMessage('');
-          setCurrentSpeakerMessageStartTime(null);
+          updateCurrentSpeakerMessage('', null);
         }
 
         setRawChatHistory((prev) => [
@@ -449,6 +473,7 @@ const InvincibleVoice = () => {
       clearResponses,
       currentSpeakerMessage,
       currentSpeakerMessageStartTime,
+      updateCurrentSpeakerMessage,
       t,
     ],
   );
@@ -572,10 +597,9 @@ const InvincibleVoice = () => {
       if (textInputTimeoutRef.current) {
         clearTimeout(textInputTimeoutRef.current);
       }
-      setCurrentSpeakerMessage('');
-      setCurrentSpeakerMessageStartTime(null);
+      updateCurrentSpeakerMessage('', null);
     },
-    [shouldConnect, userData, clearResponses],
+    [shouldConnect, userData, clearResponses, updateCurrentSpeakerMessage],
   );
   const handleNewConversation = useCallback(() => {
     if (shouldConnect) {
@@ -592,9 +616,8 @@ const InvincibleVoice = () => {
     if (textInputTimeoutRef.current) {
       clearTimeout(textInputTimeoutRef.current);
     }
-    setCurrentSpeakerMessage('');
-    setCurrentSpeakerMessageStartTime(null);
-  }, [shouldConnect, clearResponses]);
+    updateCurrentSpeakerMessage('', null);
+  }, [shouldConnect, clearResponses, updateCurrentSpeakerMessage]);
   const handleDeleteConversation = useCallback((conversationIndex: number) => {
     setConversationToDelete(conversationIndex);
     setIsDeleteDialogOpen(true);
@@ -642,8 +665,7 @@ const InvincibleVoice = () => {
         if (textInputTimeoutRef.current) {
           clearTimeout(textInputTimeoutRef.current);
         }
-        setCurrentSpeakerMessage('');
-        setCurrentSpeakerMessageStartTime(null);
+        updateCurrentSpeakerMessage('', null);
       } else if (
         selectedConversationIndex !== null &&
         selectedConversationIndex > conversationToDelete
@@ -667,6 +689,7 @@ const InvincibleVoice = () => {
     userData,
     selectedConversationIndex,
     clearResponses,
+    updateCurrentSpeakerMessage,
   ]);
   const handleSendMessage = useCallback(() => {
     if (!textInput.trim()) {
@@ -1019,9 +1042,8 @@ const InvincibleVoice = () => {
 
     setRawChatHistory([]);
     clearResponses();
-    setCurrentSpeakerMessage('');
-    setCurrentSpeakerMessageStartTime(null);
-  }, [readyState, clearResponses]);
+    updateCurrentSpeakerMessage('', null);
+  }, [readyState, clearResponses, updateCurrentSpeakerMessage]);
 
   // Cleanup temporary TTS cache when component unmounts
   useEffect(() => {
@@ -0,0 +1,21 @@
+// The server sends its debug state about once per second. Most updates only carry the
+// top-level keys that changed, a snapshot regularly replaces everything.
+export interface AdditionalOutputsUpdate {
+  snapshot?: boolean;
+  debug_dict: Record<string, unknown>;
+  removed_debug_keys?: string[];
+}
+
+export const applyDebugDictUpdate = (
+  previous: object | null,
+  update: AdditionalOutputsUpdate,
+): object => {
+  if (update.snapshot !== false || previous === null) {
+    return update.debug_dict;
+  }
+  const next: Record<string, unknown> = { ...previous, ...update.debug_dict };
+  (update.removed_debug_keys ?? []).forEach((key) => {
+    delete next[key];
+  });
+  return next;
+};
@@ -0,0 +1,46 @@
+// Binary websocket frames for audio, must match backend/binary_audio.py
+// Offering this subprotocol asks the server to send audio as binary frames. Audio
+// sent by the client can be binary as soon as the server selected it.
+export const BINARY_AUDIO_SUBPROTOCOL = 'realtime.binary-audio';
+
+export const INPUT_AUDIO_FRAME = 0x01;
+export const OUTPUT_AUDIO_FRAME = 0x02;
+
+const UUID_BYTES = 16;
+
+export const encodeInputAudioFrame = (opusData: Uint8Array): Uint8Array => {
+  const frame = new Uint8Array(opusData.byteLength + 1);
+  frame[0] = INPUT_AUDIO_FRAME;
+  frame.set(opusData, 1);
+  return frame;
+};
+
+export interface OutputAudioFrame {
+  responseId: string;
+  opus: Uint8Array;
+}
+
+const bytesToUuid = (bytes: Uint8Array): string => {
+  const hexBytes = Array.from(bytes, (b) => b.toString(16).padStart(2, '0'));
+  const hex = hexBytes.join('');
+  return [
+    hex.slice(0, 8),
+    hex.slice(8, 12),
+    hex.slice(12, 16),
+    hex.slice(16, 20),
+    hex.slice(20),
+  ].join('-');
+};
+
+export const decodeOutputAudioFrame = (
+  data: ArrayBuffer,
+): OutputAudioFrame | null => {
+  const bytes = new Uint8Array(data);
+  if (bytes.byteLength <= UUID_BYTES + 1 || bytes[0] !== OUTPUT_AUDIO_FRAME) {
+    return null;
+  }
+  return {
+    responseId: bytesToUuid(bytes.subarray(1, UUID_BYTES + 1)),
+    opus: bytes.subarray(UUID_BYTES + 1),
+  };
+};
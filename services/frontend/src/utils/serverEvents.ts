@@ -0,0 +1,8 @@
+// Server events are JSON objects. When the websocket is opened with `batch_events`,
+// the server sends events produced close together in one frame, as a JSON array.
+export const BATCH_EVENTS_PARAM = 'batch_events=true';
+
+export const parseServerEvents = (text: string) => {
+  const parsed = JSON.parse(text);
+  return Array.isArray(parsed) ? parsed : [parsed];
+};